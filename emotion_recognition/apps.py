@@ -4,3 +4,5 @@ from django.apps import AppConfig
 class EmotionRecognitionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'emotion_recognition'
+    # Nothing is loaded here: management commands, tests and scripts set up
+    # Django too. Serving processes warm up in warmup.start_serving().
@@ -1,9 +1,20 @@
 import os
 import numpy as np
-import librosa
 import logging
 import soundfile as sf
 import warnings
+import json
+import hashlib
+import soxr
+from functools import lru_cache
+from types import SimpleNamespace
+
+from . import dsp_numpy
+
+from .feature_cache import get_feature_cache
+from .feature_registry import FeatureRegistry, fallback_values
+from .profiling import stage
+from .utils import get_setting
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,16 +22,387 @@ logger = logging.getLogger(__name__)
 # Suppress non-critical warnings
 warnings.filterwarnings('ignore', category=UserWarning)
 
-def process_audio_file(file_path):
+# STFT parameters shared by every spectral feature (librosa defaults, so the
+# pickled scaler and model keep seeing the same feature distributions)
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MFCC = 13
+N_MELS = 128
+N_CHROMA = 12
+
+# Every signal is resampled to this rate before feature extraction (override
+# with settings.AUDIO_SAMPLE_RATE; None keeps the native rate). Native until a
+# model trained on resampled features ships: the bundled one was not
+DEFAULT_SAMPLE_RATE = None
+RESAMPLE_QUALITY = 'HQ'
+
+# DSP primitives used for feature extraction (override with
+# settings.AUDIO_FEATURE_BACKEND): 'librosa', or 'numpy' for the NumPy-only
+# implementations in dsp_numpy, which skip librosa's import and call overhead
+FEATURE_BACKENDS = ('librosa', 'numpy')
+DEFAULT_FEATURE_BACKEND = 'librosa'
+
+# Floating point type of decoded audio, spectrograms and feature vectors
+# (override with settings.AUDIO_FEATURE_DTYPE). float32 halves the memory
+# traffic of every stage; see feature_dtype() for the accuracy cost.
+FEATURE_DTYPES = ('float32', 'float64')
+DEFAULT_FEATURE_DTYPE = 'float64'
+
+# Feature families in output order, registered with their compute functions
+# after compute_spectrogram. settings.AUDIO_FEATURE_FAMILIES selects a subset.
+FEATURES = FeatureRegistry()
+
+def feature_tag():
+    """
+    Feature layout tag saved with trained models
+    
+    Returns:
+        Dictionary with the feature-set version and the feature names, in vector order
+    """
+    return {'feature_set_version': feature_set_version(), 'feature_names': get_feature_names()}
+
+def feature_set_version(families=None):
+    """
+    Short hash identifying the feature layout and the DSP parameters that
+    change feature values. Models are only served on the feature set they
+    were trained on. The DSP backend and precision are left out: they give the
+    same features within float rounding (see feature_dtype).
+    
+    Args:
+        families: families of the layout (defaults to the active ones)
+    """
+    return _feature_spec_version(FEATURES.spec(families), canonical_sample_rate(), vad_enabled())
+
+def legacy_feature_set_version():
+    """
+    Feature-set version of untagged models: every family at the native rate
+    without voice activity gating, as extracted before models were tagged
+    """
+    return _feature_spec_version(FEATURES.spec(FEATURES.all_families()), None, False)
+
+def feature_cache_version():
+    """feature_set_version plus the DSP backend and precision: cached vectors are only reused bit for bit"""
+    spec = [feature_set_version(), feature_backend(), feature_dtype().name]
+    return hashlib.sha1(json.dumps(spec).encode()).hexdigest()[:12]
+
+def _feature_spec_version(family_spec, sample_rate, vad):
+    spec = {
+        'families': family_spec,
+        'n_fft': N_FFT,
+        'hop_length': HOP_LENGTH,
+        'sample_rate': sample_rate,
+        'vad': [VAD_TOP_DB, VAD_FLOOR_DB, VAD_HANGOVER_FRAMES] if vad else None,
+    }
+    return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+# Energy-based voice activity gating (enable with settings.AUDIO_VAD_ENABLED):
+# frames more than VAD_TOP_DB below the loudest frame, or below VAD_FLOOR_DB
+# full scale, are silence. Speech regions are widened by VAD_HANGOVER_FRAMES
+# on each side so onsets and decays are kept.
+VAD_TOP_DB = 40.0
+VAD_FLOOR_DB = -60.0
+VAD_HANGOVER_FRAMES = 2
+
+# Files longer than this are processed block by block with bounded memory
+STREAMING_THRESHOLD_SECONDS = 60
+STREAM_BLOCK_SECONDS = 10
+
+# Progressive mode: length of the first analysed prefix (doubled every step)
+PROGRESSIVE_START_SECONDS = 2.0
+
+# Timeline mode: window length and hop between window starts
+TIMELINE_WINDOW_SECONDS = 3.0
+TIMELINE_HOP_SECONDS = 1.5
+
+def load_audio(file_path, max_frames=None):
+    """
+    Decode an audio file to a mono time series
+    
+    Args:
+        file_path: Path to the audio file
+        max_frames: Decode at most this many frames from the start (None: all);
+            honoured by the WAV and soundfile readers, the librosa fallback
+            decodes the whole file
+        
+    Returns:
+        Tuple of (audio time series, sample rate)
+    """
+    with stage('decode'):
+        return _load_audio(file_path, max_frames)
+
+def _load_audio(file_path, max_frames=None):
+    # Fast path for plain 16-bit PCM / 32-bit float WAV (browser recordings, RAVDESS, TESS)
+    try:
+        wav = read_wav_mmap(file_path, max_frames)
+        if wav is not None:
+            y, sr = wav
+            y = y.astype(feature_dtype(), copy=False)
+            logger.info(f"Audio loaded from memory-mapped WAV. Duration: {len(y)/sr:.2f}s, Sample rate: {sr}Hz")
+            return y, sr
+    except Exception as wav_error:
+        logger.warning(f"Memory-mapped WAV read failed: {str(wav_error)}, trying soundfile instead")
+    
+    # Then try soundfile which is more reliable for other WAV encodings
+    try:
+        logger.info("Attempting to load audio with soundfile")
+        audio_data, sample_rate = sf.read(file_path, frames=-1 if max_frames is None else max_frames,
+                                          dtype=feature_dtype().name)
+        # Convert to mono if stereo
+        if len(audio_data.shape) > 1 and audio_data.shape[1] > 1:
+            audio_data = np.mean(audio_data, axis=1)
+        y = audio_data
+        sr = sample_rate
+        logger.info(f"Audio loaded with soundfile. Duration: {len(y)/sr:.2f}s, Sample rate: {sr}Hz")
+    except Exception as sf_error:
+        logger.warning(f"Soundfile loading failed: {str(sf_error)}, trying librosa instead")
+        # Use librosa as fallback, decoding straight to the canonical rate
+        import librosa
+        y, sr = librosa.load(file_path, sr=canonical_sample_rate() or 22050, mono=True, dtype=feature_dtype())
+        logger.info(f"Audio loaded with librosa. Duration: {len(y)/sr:.2f}s, Sample rate: {sr}Hz")
+    return y, sr
+
+# WAVE format tags handled by read_wav_mmap
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+def read_wav_mmap(file_path, max_frames=None):
+    """
+    Read a 16-bit PCM or 32-bit float WAV file through a memory map.
+    
+    The RIFF chunks are parsed directly and the data chunk is mapped
+    read-only, so the samples are never copied into an intermediate buffer:
+    the only allocation is the float32 output, produced by one vectorized
+    scale (and channel mean for multi-channel files).
+    
+    Args:
+        file_path: Path to the audio file
+        max_frames: Map and convert at most this many frames from the start (None: all)
+        
+    Returns:
+        Tuple of (float32 mono time series, sample rate), or None if the file
+        is not a WAV encoding handled here (callers fall back to soundfile)
+    """
+    file_size = os.path.getsize(file_path)
+    fmt = None
+    data_offset = data_size = None
+    with open(file_path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            return None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                break
+            chunk_id = chunk_header[:4]
+            chunk_size = int.from_bytes(chunk_header[4:], 'little')
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                if len(fmt) < 16:
+                    return None
+                if chunk_size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                data_offset = f.tell()
+                # Recorders that never finalised the header leave a bogus size
+                data_size = min(chunk_size, file_size - data_offset)
+                break
+            else:
+                # Chunks are word aligned
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    
+    if fmt is None or data_offset is None:
+        return None
+    format_tag = int.from_bytes(fmt[0:2], 'little')
+    channels = int.from_bytes(fmt[2:4], 'little')
+    sr = int.from_bytes(fmt[4:8], 'little')
+    bits = int.from_bytes(fmt[14:16], 'little')
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        # The sub-format GUID starts with the plain format tag
+        format_tag = int.from_bytes(fmt[24:26], 'little')
+    
+    if format_tag == WAVE_FORMAT_PCM and bits == 16:
+        dtype, scale = np.dtype('<i2'), np.float32(1.0 / 32768)
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        dtype, scale = np.dtype('<f4'), None
+    else:
+        return None
+    if channels < 1 or sr <= 0:
+        return None
+    
+    n_frames = data_size // (dtype.itemsize * channels)
+    if max_frames is not None:
+        n_frames = min(n_frames, max_frames)
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32), sr
+    data = np.memmap(file_path, dtype=dtype, mode='r', offset=data_offset, shape=(n_frames, channels))
+    try:
+        if channels > 1:
+            y = data.mean(axis=1, dtype=np.float32)
+            if scale is not None:
+                y *= scale
+        elif scale is not None:
+            y = np.multiply(data[:, 0], scale, dtype=np.float32)
+        else:
+            y = np.array(data[:, 0], dtype=np.float32)
+    finally:
+        # Release the mapping now rather than when the memmap is collected
+        data._mmap.close()
+    return y, sr
+
+def canonical_sample_rate():
+    """Sample rate every signal is converted to before feature extraction (None: native)"""
+    return get_setting('AUDIO_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+
+def resample_to_canonical(y, sr):
+    """
+    Resample a signal to the canonical rate with soxr (polyphase, HQ)
+    
+    Args:
+        y: audio time series
+        sr: sample rate
+        
+    Returns:
+        Tuple of (resampled time series, canonical sample rate)
+    """
+    target_sr = canonical_sample_rate()
+    if not target_sr or sr == target_sr or len(y) == 0:
+        return y, sr
+    with stage('resample'):
+        return soxr.resample(y, sr, target_sr, quality=RESAMPLE_QUALITY), target_sr
+
+def vad_enabled():
+    """Whether silent frames are dropped before feature extraction"""
+    return get_setting('AUDIO_VAD_ENABLED', False)
+
+def feature_dtype():
+    """
+    Configured floating point type (one of FEATURE_DTYPES) as a numpy dtype.
+    
+    With float32 every stage from decoding to the scaler input runs in single
+    precision. On the bundled datasets features stay within 2e-4 relative of
+    the float64 pipeline, except chroma (within 4e-3: its tuning estimate can
+    move by one 0.01 bin step). Predicted probabilities were unchanged, as
+    the forest compares features in float32 either way.
+    """
+    dtype = get_setting('AUDIO_FEATURE_DTYPE', DEFAULT_FEATURE_DTYPE)
+    if dtype not in FEATURE_DTYPES:
+        raise ValueError(f"Unknown AUDIO_FEATURE_DTYPE {dtype!r}, expected one of {FEATURE_DTYPES}")
+    return np.dtype(dtype)
+
+def feature_backend():
+    """Name of the configured DSP backend (one of FEATURE_BACKENDS)"""
+    backend = get_setting('AUDIO_FEATURE_BACKEND', DEFAULT_FEATURE_BACKEND)
+    if backend not in FEATURE_BACKENDS:
+        raise ValueError(f"Unknown AUDIO_FEATURE_BACKEND {backend!r}, expected one of {FEATURE_BACKENDS}")
+    return backend
+
+def get_dsp(backend=None):
+    """
+    DSP primitives of a backend
+    
+    Args:
+        backend: backend name, defaults to the configured one
+        
+    Returns:
+        Namespace with the functions documented in dsp_numpy
+        (stft, zero_crossing_rate, rms, spectral_*, power_to_db,
+        estimate_tuning, mel, chroma)
+    """
+    if (backend or feature_backend()) == 'numpy':
+        return dsp_numpy
+    return _librosa_dsp()
+
+@lru_cache(maxsize=None)
+def _librosa_dsp():
+    # Imported on first use so the NumPy backend never pays for librosa/numba
+    import librosa
+    return SimpleNamespace(
+        stft=librosa.stft,
+        zero_crossing_rate=librosa.feature.zero_crossing_rate,
+        rms=librosa.feature.rms,
+        spectral_centroid=librosa.feature.spectral_centroid,
+        spectral_bandwidth=librosa.feature.spectral_bandwidth,
+        spectral_rolloff=librosa.feature.spectral_rolloff,
+        power_to_db=librosa.power_to_db,
+        estimate_tuning=librosa.estimate_tuning,
+        mel=librosa.filters.mel,
+        chroma=librosa.filters.chroma,
+    )
+
+def mel_basis(sr):
+    """Mel filterbank for sr, built once per process and backend"""
+    return _mel_basis(sr, feature_backend())
+
+@lru_cache(maxsize=None)
+def _mel_basis(sr, backend):
+    basis = get_dsp(backend).mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS)
+    basis.setflags(write=False)
+    return basis
+
+def chroma_basis(sr, tuning):
+    """Chroma filterbank for sr and tuning (estimates are quantised to 0.01 bins)"""
+    return _chroma_basis(sr, tuning, feature_backend())
+
+@lru_cache(maxsize=256)
+def _chroma_basis(sr, tuning, backend):
+    basis = get_dsp(backend).chroma(sr=sr, n_fft=N_FFT, tuning=tuning, n_chroma=N_CHROMA)
+    basis.setflags(write=False)
+    return basis
+
+@lru_cache(maxsize=None)
+def dct_basis(dtype=np.float64):
+    """Orthonormal DCT-II matrix mapping log-mel bands to the first N_MFCC cepstral coefficients"""
+    basis = dsp_numpy.dct(N_MELS, N_MFCC).astype(dtype)
+    basis.setflags(write=False)
+    return basis
+
+def prepare_signal(y, sr):
+    """
+    Pad, sanitise and normalise a decoded signal before feature extraction
+    
+    Args:
+        y: audio time series
+        sr: sample rate
+        
+    Returns:
+        Cleaned audio time series
+    """
+    with stage('normalize'):
+        y = np.asarray(y, dtype=feature_dtype())
+    
+        # Check if audio is too short
+        if len(y) < sr:
+            logger.warning(f"Audio too short ({len(y)/sr:.2f}s), padding with zeros")
+            y = np.pad(y, (0, sr - len(y)))
+    
+        # Check if audio has NaN or Inf values
+        if np.isnan(y).any() or np.isinf(y).any():
+            logger.warning("Audio contains NaN or Inf values, replacing with zeros")
+            y = np.nan_to_num(y)
+    
+        # Normalize audio if needed
+        if np.abs(y).max() > 1.0:
+            logger.info("Normalizing audio amplitude")
+            y = y / np.abs(y).max()
+    
+        return y
+
+def process_audio_file(file_path, stats=None):
     """
     Extract features from an audio file for emotion recognition.
     
     Args:
         file_path: Path to the audio file (WAV format)
+        stats: optional dictionary that receives analysis statistics:
+            'cached', and for extracted files 'frames' and 'frames_dropped'
+            (frames gated out as silence)
         
     Returns:
         numpy array of audio features
     """
+    if stats is None:
+        stats = {}
     try:
         logger.info(f"Processing audio file: {file_path}")
         
@@ -37,59 +419,24 @@ def process_audio_file(file_path):
             logger.error("Audio file is empty (0 bytes)")
             raise ValueError("Audio file is empty (0 bytes)")
         
-        try:
-            # First try with soundfile which is more reliable for WAV files
-            try:
-                logger.info("Attempting to load audio with soundfile")
-                audio_data, sample_rate = sf.read(file_path)
-                # Convert to mono if stereo
-                if len(audio_data.shape) > 1 and audio_data.shape[1] > 1:
-                    audio_data = np.mean(audio_data, axis=1)
-                y = audio_data
-                sr = sample_rate
-                logger.info(f"Audio loaded with soundfile. Duration: {len(y)/sr:.2f}s, Sample rate: {sr}Hz")
-            except Exception as sf_error:
-                logger.warning(f"Soundfile loading failed: {str(sf_error)}, trying librosa instead")
-                # Use librosa as fallback with fixed parameters
-                y, sr = librosa.load(file_path, sr=22050, mono=True)
-                logger.info(f"Audio loaded with librosa. Duration: {len(y)/sr:.2f}s, Sample rate: {sr}Hz")
-        except Exception as load_error:
-            logger.error(f"Error loading audio: {str(load_error)}")
-            # Provide a fallback - return dummy features
-            logger.warning("Audio loading failed completely. Generating fallback audio features")
-            # Create a simple sine wave as fallback audio
-            sr = 22050
-            duration = 3  # seconds
-            y = np.sin(2 * np.pi * 440 * np.linspace(0, duration, int(sr * duration)))
+        # Identical file contents were already analysed under this feature set
+        cache = get_feature_cache()
+        cache_key = None
+        if cache is not None:
+            with stage('cache_lookup'):
+                cache_key = cache.key_for_file(file_path, feature_cache_version())
+                cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Features loaded from cache: {len(cached)} features")
+                stats['cached'] = True
+                return cached
         
-        # Check if audio is too short
-        if len(y) < sr:
-            logger.warning(f"Audio too short ({len(y)/sr:.2f}s), padding with zeros")
-            y = np.pad(y, (0, sr - len(y)))
-        
-        # Check if audio has NaN or Inf values
-        if np.isnan(y).any() or np.isinf(y).any():
-            logger.warning("Audio contains NaN or Inf values, replacing with zeros")
-            y = np.nan_to_num(y)
-        
-        # Normalize audio if needed
-        if np.abs(y).max() > 1.0:
-            logger.info("Normalizing audio amplitude")
-            y = y / np.abs(y).max()
-        
-        # Extract features
-        try:
-            features = extract_features(y, sr)
-            logger.info(f"Features extracted successfully: {len(features)} features")
-            return features
-        except Exception as feature_error:
-            logger.error(f"Error extracting features: {str(feature_error)}")
-            logger.exception("Feature extraction stack trace:")
-            # Return a reasonable set of dummy features
-            # Our feature extraction creates 38 features
-            dummy_features = np.random.uniform(low=0.0, high=1.0, size=38)
-            logger.warning(f"Using fallback features: shape={dummy_features.shape}")
-            return dummy_features
+        stats['cached'] = False
+        features, complete = _extract_file_features(file_path, stats)
+        # Never cache fallback values: the next request should retry the real extraction
+        if cache_key is not None and complete:
+            cache.put(cache_key, features)
+        return features
         
     except FileNotFoundError as e:
         logger.error(f"File not found: {str(e)}")
@@ -102,6 +449,254 @@ def process_audio_file(file_path):
         logger.exception("Stack trace:")
         raise ValueError(f"Failed to process audio: {str(e)}")
 
+def _extract_file_features(file_path, stats=None):
+    """
+    Decode and analyse an audio file (stats as in process_audio_file)
+    
+    Returns:
+        Tuple of (features, complete) where complete is False if any
+        fallback value was used
+    """
+    # Long recordings never get loaded into memory as a whole
+    if _should_stream(file_path):
+        try:
+            features, complete = _extract_features_streaming(file_path, STREAM_BLOCK_SECONDS, stats)
+            logger.info(f"Features extracted by streaming: {len(features)} features")
+            return features, complete
+        except Exception as stream_error:
+            logger.warning(f"Streaming extraction failed: {str(stream_error)}, loading whole file")
+    
+    complete = True
+    try:
+        y, sr = load_audio(file_path)
+    except Exception as load_error:
+        logger.error(f"Error loading audio: {str(load_error)}")
+        # Provide a fallback - return dummy features
+        logger.warning("Audio loading failed completely. Generating fallback audio features")
+        # Create a simple sine wave as fallback audio
+        sr = 22050
+        duration = 3  # seconds
+        y = np.sin(2 * np.pi * 440 * np.linspace(0, duration, int(sr * duration)))
+        complete = False
+    
+    y, sr = resample_to_canonical(y, sr)
+    y = prepare_signal(y, sr)
+    
+    # Extract features
+    try:
+        features, features_complete = _extract_features(y, sr, stats)
+        logger.info(f"Features extracted successfully: {len(features)} features")
+        return features, complete and features_complete
+    except Exception as feature_error:
+        logger.error(f"Error extracting features: {str(feature_error)}")
+        logger.exception("Feature extraction stack trace:")
+        # Return a reasonable set of dummy features
+        dummy_features = np.random.uniform(low=0.0, high=1.0, size=FEATURES.width()).astype(feature_dtype())
+        logger.warning(f"Using fallback features: shape={dummy_features.shape}")
+        return dummy_features, False
+
+def extract_features_progressive(file_path, start_seconds=PROGRESSIVE_START_SECONDS, min_seconds=0.0):
+    """
+    Features of growing prefixes of a recording, for callers that stop as soon
+    as they have seen enough.
+    
+    The first start_seconds are analysed, then twice as much every step, and
+    the last step is the whole file through process_audio_file (streamed when
+    long). Each prefix is analysed like a recording of that length, so a
+    caller that runs to the end does at most about twice the DSP work of
+    process_audio_file; one that stops early does a fraction of it. Only the
+    frames of a prefix are decoded, so memory follows the prefix rather than
+    the file. Prefixes are only cut from files soundfile can read, up to
+    STREAMING_THRESHOLD_SECONDS; other files, and files not longer than
+    min_seconds, go straight to the whole-file step. A prefix whose analysis
+    needed fallback values is not yielded, and a file already in the feature
+    cache yields its cached features at once.
+    
+    Args:
+        file_path: Path to the audio file
+        start_seconds: Length of the first prefix
+        min_seconds: Shortest file worth cutting into prefixes (one the caller
+            cannot stop early on only pays for the extra steps)
+        
+    Yields:
+        Tuples of (seconds, duration, features): the audio analysed and the
+        file duration in seconds (None when unknown) and the feature vector
+    """
+    try:
+        info = sf.info(file_path)
+        duration, native_sr = info.duration, info.samplerate
+    except Exception:
+        duration = native_sr = None
+    
+    # Analysed before: no prefix is worth extracting
+    cache = get_feature_cache()
+    if cache is not None and duration is not None:
+        with stage('cache_lookup'):
+            cached = cache.get(cache.key_for_file(file_path, feature_cache_version()))
+        if cached is not None:
+            yield duration, duration, cached
+            return
+    
+    seconds = start_seconds
+    if duration is not None and duration <= min_seconds:
+        seconds = duration
+    while duration is not None and seconds < duration and seconds <= STREAMING_THRESHOLD_SECONDS:
+        y, sr = load_audio(file_path, max_frames=int(seconds * native_sr))
+        prefix, prefix_sr = resample_to_canonical(y[:int(seconds * sr)], sr)
+        features, complete = _extract_features(prepare_signal(prefix, prefix_sr), prefix_sr)
+        if complete:
+            yield seconds, duration, features
+        seconds *= 2
+    
+    yield duration, duration, process_audio_file(file_path)
+
+def compute_spectrogram(y, sr, S=None):
+    """
+    Compute the intermediates shared by all spectral features
+    
+    Args:
+        y: audio time series
+        sr: sample rate
+        S: optional precomputed magnitude spectrogram of y
+        
+    Returns:
+        Dictionary with the magnitude spectrogram 'S', its square 'power'
+        and the mel spectrogram 'mel' (None when MFCCs are not computed)
+    """
+    # One STFT for everything: each librosa.feature call would otherwise run its own
+    if S is None:
+        with stage('stft'):
+            S = np.abs(get_dsp().stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    with stage('mel'):
+        power = S ** 2
+        mel = mel_basis(sr) @ power if FEATURES.is_active('mfcc') else None
+    return {'S': S, 'power': power, 'mel': mel}
+
+def compute_frame_features(y, sr, spectrogram=None, center=True, zcr_y=None, tuning=None, mel_max=None,
+                           frame_mask=None):
+    """
+    Compute frame-level features for every active feature family
+    
+    Args:
+        y: audio time series
+        sr: sample rate
+        spectrogram: optional precomputed output of compute_spectrogram for y
+        center: whether the time-domain features pad y to centre their frames
+        zcr_y: optional signal for the zero crossing rate (defaults to y)
+        tuning: optional chroma tuning; estimated from the spectrogram if None
+        mel_max: optional peak mel power used as the MFCC dB floor reference
+            (defaults to the peak of this spectrogram)
+        frame_mask: optional boolean mask over the frames of y; the time-domain
+            families keep only these frames (spectrogram must hold exactly them)
+        
+    Returns:
+        Dictionary mapping family name to a (rows, frames) array.
+        Families that could not be computed are left out.
+    """
+    frames = {}
+    
+    if spectrogram is None:
+        try:
+            spectrogram = compute_spectrogram(y, sr)
+        except Exception as e:
+            logger.warning(f"Error computing STFT: {str(e)}")
+            spectrogram = {}
+    
+    # Everything a family's compute function may use; families computed
+    # earlier are visible through ctx.frames
+    ctx = SimpleNamespace(
+        y=y, sr=sr, dsp=get_dsp(), spectrogram=spectrogram, S=spectrogram.get('S'), center=center,
+        zcr_y=zcr_y, tuning=tuning, mel_max=mel_max, frame_mask=frame_mask, frames=frames)
+    for family in FEATURES.families():
+        try:
+            with stage(f'feature.{family.name}'):
+                frames[family.name] = family.compute(ctx)
+        except Exception as e:
+            logger.warning(f"Error computing {family.label}: {str(e)}")
+    
+    return frames
+
+@FEATURES.register('zcr', fallback=(0.1, 0.05), label='ZCR')
+def _zcr_frames(ctx):
+    # Time domain, no spectrogram needed
+    zcr = ctx.dsp.zero_crossing_rate(
+        y=ctx.y if ctx.zcr_y is None else ctx.zcr_y, frame_length=N_FFT, hop_length=HOP_LENGTH, center=ctx.center)
+    return zcr if ctx.frame_mask is None else zcr[:, ctx.frame_mask]
+
+@FEATURES.register('mfcc', rows=N_MFCC, fallback=(0.0, 0.1), label='MFCCs')
+def _mfcc_frames(ctx):
+    mel = _require(ctx.spectrogram.get('mel'), 'STFT')
+    if ctx.mel_max is None:
+        log_mel = ctx.dsp.power_to_db(mel)
+    else:
+        # Same 80 dB floor as power_to_db, relative to an external peak
+        log_mel = np.maximum(ctx.dsp.power_to_db(mel, top_db=None), 10.0 * np.log10(max(ctx.mel_max, 1e-10)) - 80.0)
+    return dct_basis(log_mel.dtype) @ log_mel
+
+@FEATURES.register('rms', fallback=(0.2, 0.05), label='RMS')
+def _rms_frames(ctx):
+    # Time domain: the spectral estimate is window-weighted and would not match the trained scaler
+    rms = ctx.dsp.rms(y=ctx.y, frame_length=N_FFT, hop_length=HOP_LENGTH, center=ctx.center)
+    return rms if ctx.frame_mask is None else rms[:, ctx.frame_mask]
+
+@FEATURES.register('centroid', fallback=(1000.0, 500.0), label='spectral centroid')
+def _centroid_frames(ctx):
+    return ctx.dsp.spectral_centroid(S=_require(ctx.S, 'STFT'), sr=ctx.sr, n_fft=N_FFT)
+
+@FEATURES.register('bandwidth', fallback=(1000.0, 500.0), label='spectral bandwidth')
+def _bandwidth_frames(ctx):
+    # Reuses the centroid when that family was computed
+    return ctx.dsp.spectral_bandwidth(
+        S=_require(ctx.S, 'STFT'), sr=ctx.sr, n_fft=N_FFT, centroid=ctx.frames.get('centroid'))
+
+@FEATURES.register('rolloff', fallback=(2000.0, 1000.0), label='spectral rolloff')
+def _rolloff_frames(ctx):
+    return ctx.dsp.spectral_rolloff(S=_require(ctx.S, 'STFT'), sr=ctx.sr, n_fft=N_FFT)
+
+@FEATURES.register('chroma', rows=N_CHROMA, pooled=True, fallback=(0.3, 0.15))
+def _chroma_frames(ctx):
+    return chroma_from_power(_require(ctx.spectrogram.get('power'), 'STFT'), ctx.sr, ctx.tuning)
+
+def chroma_from_power(power, sr, tuning=None):
+    """
+    Chromagram of a power spectrogram, as librosa.feature.chroma_stft
+    
+    Args:
+        power: power spectrogram
+        sr: sample rate
+        tuning: optional tuning deviation in fractions of a bin; estimated from power if None
+    """
+    if tuning is None:
+        tuning = get_dsp().estimate_tuning(S=power, sr=sr, n_fft=N_FFT, bins_per_octave=N_CHROMA)
+    raw_chroma = chroma_basis(sr, float(tuning)) @ power
+    # Per-frame max normalisation (norm=inf)
+    peak = raw_chroma.max(axis=-2, keepdims=True)
+    peak[peak < np.finfo(peak.dtype).tiny] = 1.0
+    return raw_chroma / peak
+
+def summarize_features(frames):
+    """
+    Reduce frame-level features to the mean/std feature vector
+    
+    Args:
+        frames: output of compute_frame_features
+        
+    Returns:
+        numpy array of FEATURES.width() features, in get_feature_names() order.
+        Missing families are filled with their fallback values.
+    """
+    features = []
+    for family in FEATURES.families():
+        values = frames.get(family.name)
+        if values is None:
+            features.extend(fallback_values(family))
+        elif family.pooled:
+            features.extend([np.mean(values), np.std(values)])
+        else:
+            for row in values:
+                features.extend([np.mean(row), np.std(row)])
+    return np.array(features, dtype=feature_dtype())
+
 def extract_features(y, sr):
     """
     Extract audio features for emotion recognition
@@ -113,138 +708,529 @@ def extract_features(y, sr):
     Returns:
         numpy array of features
     """
+    return _extract_features(y, sr)[0]
+
+def _extract_features(y, sr, stats=None):
+    """extract_features, also reporting whether every family was computed (stats as in process_audio_file)"""
     try:
-        # Feature list to return
-        features = []
-        
         # Make sure we have a valid audio signal
         if len(y) == 0:
             logger.warning("Empty audio signal, using fallback")
             # Create a simple sine wave as fallback
             duration = 3  # seconds
-            y = np.sin(2 * np.pi * 440 * np.linspace(0, duration, int(sr * duration)))
-        
-        # Zero Crossing Rate
-        try:
-            zcr = librosa.feature.zero_crossing_rate(y=y)
-            features.append(np.mean(zcr))
-            features.append(np.std(zcr))
-        except Exception as e:
-            logger.warning(f"Error computing ZCR: {str(e)}")
-            # Add fallback values
-            features.append(0.1)  # mean
-            features.append(0.05)  # std
-        
-        # Mel-frequency cepstral coefficients (MFCCs)
-        try:
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-            for mfcc in mfccs:
-                features.append(np.mean(mfcc))
-                features.append(np.std(mfcc))
-        except Exception as e:
-            logger.warning(f"Error computing MFCCs: {str(e)}")
-            # Add fallback values for 13 MFCCs
-            for _ in range(13):
-                features.append(0.0)  # mean
-                features.append(0.1)  # std
+            y = np.sin(2 * np.pi * 440 * np.linspace(0, duration, int(sr * duration))).astype(feature_dtype())
+            frames = compute_frame_features(y, sr)
+            return summarize_features(frames), False
         
-        # Root Mean Square Energy
-        try:
-            rms = librosa.feature.rms(y=y)
-            features.append(np.mean(rms))
-            features.append(np.std(rms))
-        except Exception as e:
-            logger.warning(f"Error computing RMS: {str(e)}")
-            features.append(0.2)  # mean
-            features.append(0.05)  # std
-        
-        # Spectral Centroid
-        try:
-            centroid = librosa.feature.spectral_centroid(y=y, sr=sr)
-            features.append(np.mean(centroid))
-            features.append(np.std(centroid))
-        except Exception as e:
-            logger.warning(f"Error computing spectral centroid: {str(e)}")
-            features.append(1000.0)  # mean
-            features.append(500.0)  # std
+        frames = compute_speech_frame_features(np.asarray(y, dtype=feature_dtype()), sr, stats)
+        return summarize_features(frames), _is_complete(frames)
+    
+    except Exception as e:
+        logger.error(f"Error in extract_features: {str(e)}")
+        logger.exception("Feature extraction failed:")
+        # Return fallback features with appropriate dimensions
+        return np.random.uniform(low=0.0, high=1.0, size=FEATURES.width()).astype(feature_dtype()), False
+
+def compute_speech_frame_features(y, sr, stats=None):
+    """
+    compute_frame_features restricted to speech frames when VAD is enabled.
+    
+    Only the STFT frames inside speech regions are computed (a centred frame
+    i covers samples [i * HOP_LENGTH, i * HOP_LENGTH + N_FFT) of y padded by
+    N_FFT // 2), so leading/trailing silence and the zero padding added to
+    short clips cost nothing and do not dilute the statistics.
+    
+    Args:
+        y: audio time series
+        sr: sample rate
+        stats: optional dictionary that receives 'frames' and 'frames_dropped'
         
-        # Spectral Bandwidth
-        try:
-            bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)
-            features.append(np.mean(bandwidth))
-            features.append(np.std(bandwidth))
-        except Exception as e:
-            logger.warning(f"Error computing spectral bandwidth: {str(e)}")
-            features.append(1000.0)  # mean
-            features.append(500.0)  # std
+    Returns:
+        Dictionary of frame-level features, as compute_frame_features
+    """
+    return _speech_frame_features(y, sr, stats)[0]
+
+def _speech_frame_features(y, sr, stats=None):
+    """compute_speech_frame_features, also returning the speech mask (None when no frame was dropped)"""
+    n_frames = 1 + len(y) // HOP_LENGTH
+    speech = None
+    if vad_enabled():
+        with stage('vad'):
+            speech = speech_frame_mask(y)
+    if stats is not None:
+        stats['frames'] = n_frames
+        stats['frames_dropped'] = 0 if speech is None else int(n_frames - np.count_nonzero(speech))
+    if speech is None:
+        return compute_frame_features(y, sr), None
+    
+    logger.info(f"Voice activity: {np.count_nonzero(speech)} of {n_frames} frames kept")
+    with stage('stft'):
+        padded = np.pad(y, N_FFT // 2)
+        S = np.concatenate([
+            np.abs(get_dsp().stft(padded[start * HOP_LENGTH:(stop - 1) * HOP_LENGTH + N_FFT],
+                                  n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+            for start, stop in _mask_regions(speech)
+        ], axis=-1)
+    return compute_frame_features(y, sr, spectrogram=compute_spectrogram(y, sr, S=S), frame_mask=speech), speech
+
+def speech_frame_mask(y, center=True, reference=None):
+    """
+    Energy-based voice activity detection on the analysis frames of y
+    
+    Args:
+        y: audio time series
+        center: whether frames are centred, as in compute_frame_features
+        reference: RMS the VAD_TOP_DB threshold is relative to
+            (defaults to the loudest frame of y)
         
-        # Spectral Rolloff
-        try:
-            rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)
-            features.append(np.mean(rolloff))
-            features.append(np.std(rolloff))
-        except Exception as e:
-            logger.warning(f"Error computing spectral rolloff: {str(e)}")
-            features.append(2000.0)  # mean
-            features.append(1000.0)  # std
+    Returns:
+        Boolean mask over the frames, or None when nothing is gated out
+        (every frame is speech, or even the reference is below VAD_FLOOR_DB)
+    """
+    rms = get_dsp().rms(y=y, frame_length=N_FFT, hop_length=HOP_LENGTH, center=center)[0]
+    if reference is None:
+        reference = float(rms.max()) if len(rms) else 0.0
+    floor = 10.0 ** (VAD_FLOOR_DB / 20)
+    if reference <= floor:
+        # Silence (or a very quiet recording) all the way through: keep everything
+        return None
+    speech = rms > max(reference * 10.0 ** (-VAD_TOP_DB / 20), floor)
+    if VAD_HANGOVER_FRAMES:
+        # Full convolution, cut back to the frames: mode='same' returns the
+        # kernel length for masks shorter than the kernel (a short final block)
+        kernel = np.ones(2 * VAD_HANGOVER_FRAMES + 1)
+        speech = np.convolve(speech, kernel)[VAD_HANGOVER_FRAMES:VAD_HANGOVER_FRAMES + len(speech)] > 0
+    return None if speech.all() else speech
+
+def _mask_regions(mask):
+    """(start, stop) frame index pairs of the runs of True in mask"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return list(zip(edges[::2], edges[1::2]))
+
+def _is_complete(frames):
+    """Whether every active feature family was computed (no fallback values)"""
+    return all(family.name in frames for family in FEATURES.families())
+
+def extract_features_batch(items):
+    """
+    Extract features for many clips in one call.
+    
+    Items are analysed one at a time, so only one decoded clip is held in
+    memory. File items go through the same paths as process_audio_file:
+    files longer than STREAMING_THRESHOLD_SECONDS are streamed, the others
+    are decoded whole, so a cached vector does not depend on which of the two
+    functions filled the cache.
+    
+    Args:
+        items: list of file paths or (audio time series, sample rate) tuples
         
-        # Chroma features
+    Returns:
+        Tuple of (features, errors): an (N, FEATURES.width()) array and a boolean
+        mask of length N. Rows of failed items are NaN, never fallback values.
+        File items are looked up in and added to the feature cache.
+    """
+    features = np.full((len(items), FEATURES.width()), np.nan, dtype=feature_dtype())
+    errors = np.zeros(len(items), dtype=bool)
+    cache = get_feature_cache()
+    
+    for i, item in enumerate(items):
+        cache_key = None
         try:
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-            features.append(np.mean(chroma))
-            features.append(np.std(chroma))
+            if isinstance(item, (str, os.PathLike)):
+                # Cached files skip decoding and DSP entirely
+                if cache is not None:
+                    cache_key = cache.key_for_file(item, feature_cache_version())
+                    cached = cache.get(cache_key)
+                    if cached is not None:
+                        features[i] = cached
+                        continue
+                if _should_stream(item):
+                    row, complete = _extract_features_streaming(item, STREAM_BLOCK_SECONDS)
+                else:
+                    row, complete = _extract_signal_features(*load_audio(item))
+            else:
+                row, complete = _extract_signal_features(*item)
         except Exception as e:
-            logger.warning(f"Error computing chroma: {str(e)}")
-            features.append(0.3)  # mean
-            features.append(0.15)  # std
+            logger.error(f"Error extracting features for batch item {i}: {str(e)}")
+            errors[i] = True
+            continue
+        if not complete:
+            logger.error(f"Batch item {i} failed some feature families")
+            errors[i] = True
+            continue
+        features[i] = row
+        if cache_key is not None:
+            cache.put(cache_key, row)
+    
+    return features, errors
+
+def _extract_signal_features(y, sr):
+    """Features of one decoded batch item and whether every family was computed; raises on empty signals"""
+    if len(y) == 0:
+        raise ValueError("Empty audio signal")
+    y, sr = resample_to_canonical(np.asarray(y), sr)
+    frames = compute_speech_frame_features(prepare_signal(y, sr), sr)
+    return summarize_features(frames), _is_complete(frames)
+
+def _should_stream(file_path):
+    """Whether a file is long enough to be processed block by block"""
+    try:
+        info = sf.info(file_path)
+        return info.duration > STREAMING_THRESHOLD_SECONDS
+    except Exception:
+        # Formats soundfile cannot open go through the regular loaders
+        return False
+
+def extract_features_streaming(file_path, block_seconds=STREAM_BLOCK_SECONDS):
+    """
+    Extract features from a long recording with bounded memory.
+    
+    The file is read in blocks with soundfile.blocks and the frame-level
+    features of each block are folded into running mean/std accumulators, so
+    peak memory depends on block_seconds, not on the recording length.
+    
+    Frames are cut exactly as in extract_features, so every statistic matches
+    the in-memory path except chroma, whose tuning is estimated on the first
+    block instead of the whole file. The MFCC 80 dB floor needs the peak mel
+    power of the whole file, so a first pass computes it (with the amplitude
+    peak used for normalisation) before the features are accumulated.
+    
+    Args:
+        file_path: Path to the audio file
+        block_seconds: Length of each block read from disk
         
-        # Verify we have the expected number of features (38)
-        if len(features) != 38:
-            logger.warning(f"Expected 38 features but got {len(features)}. Padding with zeros.")
-            features = features + [0.0] * (38 - len(features))
+    Returns:
+        numpy array of audio features
+    """
+    return _extract_features_streaming(file_path, block_seconds)[0]
+
+def _extract_features_streaming(file_path, block_seconds, stats=None):
+    """extract_features_streaming, also reporting whether every family was computed (stats as in process_audio_file)"""
+    info = sf.info(file_path)
+    if info.frames < info.samplerate:
+        # Too short to stream: the in-memory path pads it to one second
+        y, sr = resample_to_canonical(*load_audio(file_path))
+        return _extract_features(prepare_signal(y, sr), sr, stats)
+    
+    accumulator = FeatureAccumulator()
+    n_frames = 0
+    for frames, block_frames, _ in _stream_frame_blocks(file_path, info, block_seconds):
+        n_frames += block_frames
+        accumulator.update(frames)
+    
+    if stats is not None:
+        stats['frames'] = n_frames
+        stats['frames_dropped'] = n_frames - accumulator.n_frames
+    logger.info(f"Streamed {info.duration:.2f}s of audio, {accumulator.n_frames} of {n_frames} frames kept")
+    return accumulator.features(), accumulator.complete
+
+def _stream_frame_blocks(file_path, info, block_seconds):
+    """
+    Frame-level features of a file, block by block (see extract_features_streaming)
+    
+    Args:
+        file_path: Path to the audio file
+        info: soundfile info of the file
+        block_seconds: Length of each block read from disk
         
-        return np.array(features)
+    Yields:
+        Tuples of (frames, n_frames, speech): the compute_frame_features output
+        for the block, its number of frames before voice activity gating and
+        the speech mask over them (None when every frame was kept)
+    """
+    sr = canonical_sample_rate() or info.samplerate
+    dsp = get_dsp()
     
-    except Exception as e:
-        logger.error(f"Error in extract_features: {str(e)}")
-        logger.exception("Feature extraction failed:")
-        # Return fallback features with appropriate dimensions
-        return np.random.uniform(low=0.0, high=1.0, size=38)
+    # First pass: amplitude, frame RMS and mel power peaks of the whole file
+    peak = 0.0
+    rms_max = 0.0
+    mel_max = 0.0
+    for chunk, in _framed_chunks(_stream_blocks(file_path, info.samplerate, sr, block_seconds),
+                                 _BlockFramer(pad_mode='constant')):
+        if len(chunk) == 0:
+            continue
+        with stage('stream_scan'):
+            peak = max(peak, float(np.abs(chunk).max()))
+            rms_max = max(rms_max, float(dsp.rms(y=chunk, frame_length=N_FFT, hop_length=HOP_LENGTH, center=False).max()))
+            S = np.abs(dsp.stft(chunk, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+            mel_max = max(mel_max, float((mel_basis(sr) @ S ** 2).max()))
+    scale = 1.0
+    if peak > 1.0:
+        logger.info("Normalizing audio amplitude")
+        scale = 1.0 / peak
+        rms_max *= scale
+        mel_max *= scale ** 2
+    
+    # Second pass: frame features of each block. Voice activity is judged
+    # against the loudest frame of the whole file; the hangover does not
+    # reach across block boundaries.
+    tuning = None
+    blocks = _stream_blocks(file_path, info.samplerate, sr, block_seconds, scale)
+    for chunk, zcr_chunk in _framed_chunks(blocks, _BlockFramer(pad_mode='constant'), _BlockFramer(pad_mode='edge')):
+        if len(chunk) == 0:
+            continue
+        with stage('stft'):
+            S = np.abs(dsp.stft(chunk, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False))
+        block_frames = S.shape[-1]
+        speech = None
+        if vad_enabled():
+            with stage('vad'):
+                speech = speech_frame_mask(chunk, center=False, reference=rms_max)
+        if speech is not None:
+            if not speech.any():
+                yield {}, block_frames, speech
+                continue
+            S = S[:, speech]
+        spectrogram = compute_spectrogram(chunk, sr, S=S)
+        if tuning is None and FEATURES.is_active('chroma'):
+            tuning = dsp.estimate_tuning(S=spectrogram['power'], sr=sr, n_fft=N_FFT, bins_per_octave=N_CHROMA)
+        frames = compute_frame_features(
+            chunk, sr, spectrogram=spectrogram, center=False, zcr_y=zcr_chunk,
+            tuning=tuning, mel_max=mel_max, frame_mask=speech)
+        yield frames, block_frames, speech
 
-def get_feature_names():
+def _stream_blocks(file_path, native_sr, sr, block_seconds, scale=1.0):
+    """Read a file block by block as mono blocks at sample rate sr"""
+    dtype = feature_dtype()
+    resampler = None
+    if sr != native_sr:
+        # Stateful resampler: concatenated output equals soxr.resample on the whole signal
+        resampler = soxr.ResampleStream(native_sr, sr, 1, dtype=dtype.name, quality=RESAMPLE_QUALITY)
+    for block in sf.blocks(file_path, blocksize=int(block_seconds * native_sr), dtype=dtype.name, always_2d=True):
+        # Mono mix and the same sanitising as prepare_signal
+        block = np.nan_to_num(np.mean(block, axis=1))
+        if resampler is not None:
+            block = resampler.resample_chunk(block)
+        yield block * scale
+    if resampler is not None:
+        yield resampler.resample_chunk(np.zeros(0, dtype=dtype), last=True) * scale
+
+def _framed_chunks(blocks, *framers):
+    """Feed every block to each _BlockFramer and yield the chunks they cut"""
+    for block in blocks:
+        yield tuple(framer.feed(block) for framer in framers)
+    yield tuple(framer.finish() for framer in framers)
+
+class _BlockFramer:
+    """
+    Turns a stream of sample blocks into chunks that, framed with center=False,
+    give exactly the frames a centred librosa call would produce on the whole
+    signal (n_fft // 2 padding at both ends, hop HOP_LENGTH).
     """
-    Returns a list of feature names used in the feature extraction
     
-    Returns:
-        List of feature names
+    def __init__(self, pad_mode='constant', frame_length=N_FFT, hop_length=HOP_LENGTH):
+        self.pad_mode = pad_mode
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.buffer = None
+    
+    def _pad(self, value, dtype):
+        fill = value if self.pad_mode == 'edge' else 0.0
+        return np.full(self.frame_length // 2, fill, dtype=dtype)
+    
+    def _take_frames(self):
+        n_frames = 0
+        if len(self.buffer) >= self.frame_length:
+            n_frames = (len(self.buffer) - self.frame_length) // self.hop_length + 1
+        if n_frames == 0:
+            return self.buffer[:0]
+        chunk = self.buffer[:(n_frames - 1) * self.hop_length + self.frame_length]
+        # Keep the overlap needed by the next frame; copy so the old block can be freed
+        self.buffer = self.buffer[n_frames * self.hop_length:].copy()
+        return chunk
+    
+    def feed(self, block):
+        if len(block) == 0:
+            return np.zeros(0)
+        if self.buffer is None:
+            self.buffer = self._pad(block[0], block.dtype)
+        self.buffer = np.concatenate([self.buffer, block])
+        return self._take_frames()
+    
+    def finish(self):
+        if self.buffer is None:
+            return np.zeros(0)
+        last = self.buffer[-1] if len(self.buffer) else 0.0
+        self.buffer = np.concatenate([self.buffer, self._pad(last, self.buffer.dtype)])
+        return self._take_frames()
+
+class FeatureAccumulator:
+    """
+    Running per-row mean/std of frame-level features, merged block by block
+    with the parallel variance formula (Chan et al.) so long streams stay
+    numerically stable.
     """
-    feature_names = []
     
-    # Zero Crossing Rate
-    feature_names.extend(['zcr_mean', 'zcr_std'])
+    def __init__(self):
+        self.stats = {}
+        self.n_frames = 0
     
-    # MFCCs (13 coefficients)
-    for i in range(13):
-        feature_names.extend([f'mfcc{i+1}_mean', f'mfcc{i+1}_std'])
+    def update(self, frames):
+        for family in FEATURES.families():
+            name = family.name
+            values = frames.get(name)
+            if values is None or values.shape[-1] == 0:
+                continue
+            values = np.asarray(values, dtype=np.float64)
+            if family.pooled:
+                values = values.reshape(1, -1)
+            count = values.shape[-1]
+            mean = values.mean(axis=-1)
+            m2 = ((values - mean[:, None]) ** 2).sum(axis=-1)
+            if name not in self.stats:
+                self.stats[name] = [count, mean, m2]
+                continue
+            total, old_mean, old_m2 = self.stats[name]
+            delta = mean - old_mean
+            new_total = total + count
+            self.stats[name] = [
+                new_total,
+                old_mean + delta * count / new_total,
+                old_m2 + m2 + delta ** 2 * total * count / new_total,
+            ]
+        if frames:
+            self.n_frames += next(iter(frames.values())).shape[-1]
     
-    # RMS Energy
-    feature_names.extend(['rms_mean', 'rms_std'])
+    @property
+    def complete(self):
+        """Whether every active feature family received at least one frame"""
+        return all(family.name in self.stats for family in FEATURES.families())
     
-    # Spectral Centroid
-    feature_names.extend(['centroid_mean', 'centroid_std'])
+    def features(self):
+        """Feature vector in get_feature_names() order, with family fallbacks"""
+        features = []
+        for family in FEATURES.families():
+            if family.name not in self.stats:
+                features.extend(fallback_values(family))
+                continue
+            count, mean, m2 = self.stats[family.name]
+            std = np.sqrt(m2 / count)
+            for row_mean, row_std in zip(mean, std):
+                features.extend([row_mean, row_std])
+        return np.array(features, dtype=feature_dtype())
+
+def extract_timeline_features(file_path, window_seconds=TIMELINE_WINDOW_SECONDS, hop_seconds=TIMELINE_HOP_SECONDS):
+    """
+    Feature vectors of overlapping windows of a recording.
     
-    # Spectral Bandwidth
-    feature_names.extend(['bandwidth_mean', 'bandwidth_std'])
+    Frame features are computed once for the whole file (block by block for
+    long files) and the mean/std of every window come from cumulative sums
+    over the frames, so overlapping windows cost almost nothing extra.
+    Amplitude normalisation, the MFCC dB floor and chroma tuning are
+    file-wide, so a window's features differ slightly from extract_features
+    on the cut-out window.
     
-    # Spectral Rolloff
-    feature_names.extend(['rolloff_mean', 'rolloff_std'])
+    Args:
+        file_path: Path to the audio file
+        window_seconds: Length of each window
+        hop_seconds: Time between the starts of consecutive windows
+        
+    Returns:
+        Tuple of (features, segments, voiced): a (windows, FEATURES.width())
+        array, a (windows, 2) array of start/end times in seconds and a boolean
+        mask of the windows holding speech frames (the other rows are NaN)
+    """
+    if window_seconds <= 0 or hop_seconds <= 0:
+        raise ValueError("Window and hop lengths must be positive")
+    
+    info = None
+    if _should_stream(file_path):
+        info = sf.info(file_path)
+    if info is not None:
+        sr = canonical_sample_rate() or info.samplerate
+        blocks = _stream_frame_blocks(file_path, info, STREAM_BLOCK_SECONDS)
+    else:
+        y, sr = resample_to_canonical(*load_audio(file_path))
+        y = prepare_signal(y, sr)
+        frames, speech = _speech_frame_features(y, sr)
+        blocks = [(frames, 1 + len(y) // HOP_LENGTH, speech)]
+    
+    # Frame matrices aligned on the time axis: gated-out frames are zero with weight 0
+    parts = {family.name: [] for family in FEATURES.families()}
+    weights = []
+    for frames, n_frames, speech in blocks:
+        weights.append(np.ones(n_frames) if speech is None else speech.astype(np.float64))
+        for family in FEATURES.families():
+            parts[family.name].append(_aligned_frames(frames, family, n_frames, speech))
+    weights = np.concatenate(weights)
     
-    # Chroma
-    feature_names.extend(['chroma_mean', 'chroma_std'])
+    n_total = len(weights)
+    window = max(1, int(round(window_seconds * sr / HOP_LENGTH)))
+    hop = max(1, int(round(hop_seconds * sr / HOP_LENGTH)))
+    starts = np.arange(0, max(n_total - window, 0) + 1, hop)
+    if starts[-1] + window < n_total:
+        # One more window flush with the end so the tail is covered
+        starts = np.append(starts, n_total - window)
+    stops = np.minimum(starts + window, n_total)
+    
+    with stage('timeline'):
+        counts = _window_sums(weights[None, :], starts, stops)[0]
+        voiced = counts > 0
+        columns = []
+        for family in FEATURES.families():
+            if any(part is None for part in parts[family.name]):
+                logger.warning(f"No {family.label} frames for the timeline, using fallback values")
+                columns.append(np.tile(fallback_values(family), (len(starts), 1)))
+                continue
+            values = np.concatenate(parts[family.name], axis=-1).astype(np.float64)
+            # Shifting by the overall mean keeps the sum-of-squares variance accurate
+            shift = (values * weights).sum(axis=-1, keepdims=True) / max(weights.sum(), 1.0)
+            if family.pooled:
+                shift = np.full_like(shift, shift.mean())
+            values = (values - shift) * weights
+            sums = _window_sums(values, starts, stops)
+            squares = _window_sums(values ** 2, starts, stops)
+            n = counts
+            if family.pooled:
+                # One statistic over every row of the family
+                sums, squares, shift = sums.sum(axis=0, keepdims=True), squares.sum(axis=0, keepdims=True), shift[:1]
+                n = counts * family.rows
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = sums / n
+                std = np.sqrt(np.maximum(squares / n - mean ** 2, 0.0))
+            # (rows, windows) mean/std pairs interleaved per row, as summarize_features
+            columns.append(np.stack([mean + shift, std], axis=-1).transpose(1, 0, 2).reshape(len(starts), -1))
+        features = np.concatenate(columns, axis=1)
+    features[~voiced] = np.nan
+    
+    segments = np.stack([starts, stops], axis=1) * HOP_LENGTH / sr
+    logger.info(f"Timeline of {len(starts)} windows, {np.count_nonzero(voiced)} with speech")
+    return features.astype(feature_dtype()), segments, voiced
+
+def _aligned_frames(frames, family, n_frames, speech):
+    """A block's frames of one family spread over all n_frames frames (None if it was not computed)"""
+    values = frames.get(family.name)
+    if speech is None:
+        return values
+    if values is None:
+        # A block without speech has no frames to compute
+        return None if speech.any() else np.zeros((family.rows, n_frames))
+    aligned = np.zeros((values.shape[0], n_frames), dtype=values.dtype)
+    aligned[:, speech] = values
+    return aligned
+
+def _window_sums(values, starts, stops):
+    """Sums of values[:, start:stop] for every window, from one cumulative sum"""
+    cumulative = np.zeros((values.shape[0], values.shape[1] + 1))
+    np.cumsum(values, axis=-1, out=cumulative[:, 1:])
+    return cumulative[:, stops] - cumulative[:, starts]
+
+def _require(value, name):
+    """Raise if a shared intermediate (e.g. the STFT) could not be computed"""
+    if value is None:
+        raise ValueError(f"{name} is not available")
+    return value
+
+def get_feature_names():
+    """
+    Returns a list of feature names used in the feature extraction
     
-    return feature_names
+    Returns:
+        List of feature names of the active feature families, in vector order
+    """
+    return FEATURES.feature_names()
 
-def visualize_audio(y, sr, feature_type=None):
+def visualize_audio(y, sr, feature_type=None, width=None):
     """
     Create a visualization of audio features
     
@@ -252,25 +1238,38 @@ def visualize_audio(y, sr, feature_type=None):
         y: audio time series
         sr: sample rate
         feature_type: type of feature to visualize (waveform, mel, chroma, etc.)
+        width: target width in pixel columns (defaults to visualization.DEFAULT_WIDTH)
         
     Returns:
-        Visualization data for the requested feature type
+        Visualization data for the requested feature type: a min/max envelope
+        for waveforms, uint8 quantized matrices (see visualization.encode_matrix)
+        for spectrograms
     """
+    from . import visualization
+    if width is None:
+        width = visualization.DEFAULT_WIDTH
+    
     try:
         if feature_type == 'waveform':
-            # Simple waveform visualization data
-            return {'data': y.tolist(), 'sr': sr, 'type': 'waveform'}
-        
-        elif feature_type == 'mel':
-            # Mel spectrogram
-            S = librosa.feature.melspectrogram(y=y, sr=sr, n_mels=128)
-            S_dB = librosa.power_to_db(S, ref=np.max)
-            return {'data': S_dB.tolist(), 'type': 'mel'}
+            # One min/max pair per pixel column instead of every sample
+            mins, maxs = visualization.waveform_envelope(np.asarray(y), width)
+            return {
+                'type': 'waveform', 'sr': sr, 'duration': len(y) / sr,
+                'min': np.round(mins, 4).tolist(), 'max': np.round(maxs, 4).tolist(),
+            }
         
-        elif feature_type == 'chroma':
-            # Chroma features
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-            return {'data': chroma.tolist(), 'type': 'chroma'}
+        if feature_type in ('mel', 'chroma'):
+            # Same STFT and cached filterbanks as feature extraction
+            with stage('stft'):
+                power = np.abs(get_dsp().stft(np.asarray(y, dtype=feature_dtype()), n_fft=N_FFT, hop_length=HOP_LENGTH)) ** 2
+            if feature_type == 'mel':
+                mel = mel_basis(sr) @ power
+                S_dB = get_dsp().power_to_db(mel, ref=max(float(mel.max()), 1e-10), top_db=visualization.MEL_DB_RANGE)
+                payload = visualization.encode_matrix(S_dB, -visualization.MEL_DB_RANGE, 0.0, width)
+            else:
+                payload = visualization.encode_matrix(chroma_from_power(power, sr), 0.0, 1.0, width)
+            payload.update({'type': feature_type, 'sr': sr, 'duration': len(y) / sr})
+            return payload
         
         # Default to basic stats if no visualization type specified
         stats = {
@@ -285,4 +1284,4 @@ def visualize_audio(y, sr, feature_type=None):
         
     except Exception as e:
         logger.error(f"Error visualizing audio: {str(e)}")
-        return {'error': str(e)}
\ No newline at end of file
+        return {'error': str(e)}
@@ -0,0 +1,118 @@
+"""
+Micro-batching of concurrent model calls.
+
+Request threads hand their feature vector to a MicroBatcher and block on a
+future. A dispatcher thread collects vectors until max_batch_size are queued
+or max_wait_ms passed since the first one, scores them with a single batch
+call, and hands every caller its own row. The per-call overhead of the model
+is then paid once per batch instead of once per request, for at most
+max_wait_ms of added latency. The dispatcher only waits while requests are
+concurrent (the previous batch held several rows, or rows are already
+queued), so a lone request is scored at once.
+
+This only pays off when one process serves concurrent requests (threaded
+workers); with one request per process every batch holds a single row.
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Collects rows from concurrent callers into batches for predict_batch
+    """
+
+    def __init__(self, predict_batch, max_batch_size=32, max_wait_ms=2.0):
+        """
+        Args:
+            predict_batch: function mapping a (rows, features) array to an array
+                with one result row per input row
+            max_batch_size: rows that trigger an immediate flush
+            max_wait_ms: longest time the first row of a batch waits for others
+        """
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+
+    def predict(self, row, timeout=None):
+        """
+        Result row for one feature vector, computed in a shared batch
+
+        Args:
+            row: 1-D feature vector
+            timeout: seconds to wait for the result (None waits indefinitely)
+
+        Raises:
+            Whatever predict_batch raised for this row
+        """
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((np.asarray(row).reshape(-1), future))
+        return future.result(timeout)
+
+    def stats(self):
+        """Number of batches and rows scored, and the mean batch size"""
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': round(self.rows / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='model-batcher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        concurrent = False
+        while True:
+            batch = [self._queue.get()]
+            # Rows that queued up meanwhile join without waiting
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            concurrent = concurrent or len(batch) > 1
+            deadline = time.perf_counter() + (self.max_wait_ms / 1000 if concurrent else 0.0)
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            concurrent = len(batch) > 1
+            self._flush(batch)
+
+    def _flush(self, batch):
+        self.batches += 1
+        self.rows += len(batch)
+        try:
+            results = self.predict_batch(np.stack([row for row, _ in batch]))
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # One bad row must not fail its neighbours: score them one by one
+            logger.warning(f"Batch of {len(batch)} failed ({str(e)}), scoring its rows separately")
+            for row, future in batch:
+                try:
+                    future.set_result(self.predict_batch(row[np.newaxis])[0])
+                except Exception as row_error:
+                    future.set_exception(row_error)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
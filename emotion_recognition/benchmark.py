@@ -0,0 +1,526 @@
+"""
+Script to benchmark the audio analysis pipeline on the bundled sample datasets.
+Run from the project root, e.g. `python emotion_recognition/benchmark.py features`.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import glob
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import soundfile as sf
+from django.conf import settings
+
+from emotion_recognition.audio_processor import (
+    extract_features, extract_features_batch, extract_features_streaming, extract_timeline_features, load_audio,
+    prepare_signal, process_audio_file, resample_to_canonical
+)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASETS_DIR = os.path.join(BASE_DIR, 'datasets')
+
+def dataset_files(limit=None):
+    files = sorted(glob.glob(os.path.join(DATASETS_DIR, '**', '*.wav'), recursive=True))
+    return files[:limit] if limit else files
+
+def load_signals(files):
+    signals = []
+    for file_path in files:
+        y, sr = sf.read(file_path)
+        if y.ndim > 1:
+            y = np.mean(y, axis=1)
+        signals.append((y, sr))
+    return signals
+
+def bench_features(args):
+    """Time extract_features per file on decoded signals"""
+    signals = load_signals(dataset_files(args.limit))
+    # Warm up numba/FFT caches so the first file does not skew the numbers
+    extract_features(*signals[0])
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for y, sr in signals:
+            extract_features(y, sr)
+    elapsed = time.perf_counter() - start
+    per_file = elapsed / (args.repeat * len(signals)) * 1000
+    print(f"extract_features: {len(signals)} files x {args.repeat} runs, {per_file:.1f} ms/file")
+
+def bench_batch(args):
+    """Compare extract_features_batch against a per-file extract_features loop"""
+    signals = load_signals(dataset_files(args.limit))
+    extract_features(*signals[0])
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for y, sr in signals:
+            extract_features(y, sr)
+    looped = (time.perf_counter() - start) / (args.repeat * len(signals)) * 1000
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        extract_features_batch(signals)
+    batched = (time.perf_counter() - start) / (args.repeat * len(signals)) * 1000
+    print(f"per-file loop: {looped:.1f} ms/file, extract_features_batch: {batched:.1f} ms/file")
+
+def bench_streaming(args):
+    """Peak traced memory of in-memory vs streaming extraction on a long recording"""
+    signals = [(y, sr) for y, sr in load_signals(dataset_files(args.limit)) if sr == 48000]
+    long_signal = np.concatenate([y for y, _ in signals])
+    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
+        path = f.name
+    try:
+        for repeats in (1, 3):
+            sf.write(path, np.tile(long_signal, repeats), 48000, subtype='PCM_16')
+            duration = repeats * len(long_signal) / 48000
+            for name, run in (('in-memory', lambda: extract_features(*_prepared(path))),
+                              ('streaming', lambda: extract_features_streaming(path))):
+                tracemalloc.start()
+                start = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1] / 1e6
+                tracemalloc.stop()
+                print(f"{duration:.0f}s recording, {name}: {elapsed:.2f}s, peak {peak:.0f} MB")
+    finally:
+        os.unlink(path)
+
+def bench_resample(args):
+    """Per-file time at the native rate vs resampling to the canonical rate first"""
+    signals = load_signals(dataset_files(args.limit))
+    extract_features(*signals[0])
+    for name, run in (('native rate', lambda y, sr: extract_features(y, sr)),
+                      ('canonical rate', lambda y, sr: extract_features(*resample_to_canonical(y, sr)))):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for y, sr in signals:
+                run(y, sr)
+        per_file = (time.perf_counter() - start) / (args.repeat * len(signals)) * 1000
+        print(f"{name}: {per_file:.1f} ms/file")
+
+COLD_START_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+from django.conf import settings
+settings.configure(AUDIO_FEATURE_BACKEND=sys.argv[1], FEATURE_CACHE_ENABLED=False)
+import numpy as np
+from emotion_recognition.audio_processor import extract_features
+extract_features(np.random.default_rng(0).uniform(-0.5, 0.5, 32000), 16000)
+print(time.perf_counter() - start)
+'''
+
+def bench_backends(args):
+    """Cold start (fresh interpreter, import + first call) and steady state per feature backend"""
+    signals = [resample_to_canonical(y, sr) for y, sr in load_signals(dataset_files(args.limit))]
+    for backend in ('librosa', 'numpy'):
+        cold = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT, backend], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True)
+        settings.AUDIO_FEATURE_BACKEND = backend
+        extract_features(*signals[0])
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for y, sr in signals:
+                extract_features(y, sr)
+        per_file = (time.perf_counter() - start) / (args.repeat * len(signals)) * 1000
+        print(f"{backend}: cold start {float(cold.stdout):.2f}s, {per_file:.1f} ms/file")
+
+STARTUP_SCRIPT = '''
+import os, sys, django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'speech_emotion_recognition.settings')
+django.setup()
+import speech_emotion_recognition.urls
+print('--- first analysis ---', file=sys.stderr, flush=True)
+from emotion_recognition.warmup import warm_up
+warm_up()
+'''
+
+def bench_imports(args):
+    """Import time added by each package at worker start-up and on the first analysis"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT], cwd=BASE_DIR,
+                            capture_output=True, text=True, check=True)
+    phases = {'start-up': {}, 'first analysis': {}}
+    phase = 'start-up'
+    for line in result.stderr.splitlines():
+        if line.startswith('--- first analysis'):
+            phase = 'first analysis'
+            continue
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        module = module.strip()
+        # Attribute each module's own import time to its top-level package
+        # (the app's modules are listed individually)
+        package = module if module.startswith('emotion_recognition') else module.split('.')[0]
+        phases[phase][package] = phases[phase].get(package, 0) + int(self_us)
+    for phase, packages in phases.items():
+        total = sum(packages.values()) / 1e6
+        print(f"{phase}: {total:.2f}s of imports")
+        for package, us in sorted(packages.items(), key=lambda item: -item[1])[:args.limit or 15]:
+            print(f"  {us / 1e6:7.3f}s  {package}")
+
+def bench_dtype(args):
+    """Time and peak traced memory of process_audio_file in float64 and float32 mode"""
+    files = dataset_files(args.limit)
+    signals = [(y, sr) for y, sr in load_signals(files) if sr == 48000]
+    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
+        path = f.name
+    try:
+        # Just under the streaming threshold, so the whole file is processed in memory
+        long_signal = np.concatenate([y for y, _ in signals])[:50 * 48000]
+        sf.write(path, long_signal, 48000, subtype='PCM_16')
+        for dtype in ('float64', 'float32'):
+            settings.AUDIO_FEATURE_DTYPE = dtype
+            process_audio_file(files[0])
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for file_path in files:
+                    process_audio_file(file_path)
+            per_file = (time.perf_counter() - start) / (args.repeat * len(files)) * 1000
+            tracemalloc.start()
+            process_audio_file(path)
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            print(f"{dtype}: {per_file:.1f} ms/file, peak {peak:.0f} MB on a {len(long_signal) / 48000:.0f}s file")
+    finally:
+        os.unlink(path)
+
+def bench_vad(args):
+    """process_audio_file time with and without voice activity gating, and the share of frames dropped"""
+    files = dataset_files(args.limit)
+    for enabled in (False, True):
+        settings.AUDIO_VAD_ENABLED = enabled
+        process_audio_file(files[0])
+        frames = dropped = 0
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for file_path in files:
+                stats = {}
+                process_audio_file(file_path, stats)
+                frames += stats['frames']
+                dropped += stats['frames_dropped']
+        per_file = (time.perf_counter() - start) / (args.repeat * len(files)) * 1000
+        print(f"VAD {'on' if enabled else 'off'}: {per_file:.1f} ms/file, {dropped / frames:.0%} of frames dropped")
+
+def bench_timeline(args):
+    """extract_timeline_features against extracting every window separately"""
+    signals = [resample_to_canonical(*load_audio(path)) for path in dataset_files(args.limit)]
+    sr = signals[0][1]
+    long_signal = np.concatenate([y for y, _ in signals])
+    extract_features(*signals[0])
+    with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
+        path = f.name
+    try:
+        sf.write(path, long_signal, sr)
+        for hop_seconds in (1.5, 0.5):
+            start = time.perf_counter()
+            features, segments, _ = extract_timeline_features(path, 3.0, hop_seconds)
+            one_pass = time.perf_counter() - start
+            start = time.perf_counter()
+            for window_start, window_end in segments:
+                extract_features(prepare_signal(long_signal[int(window_start * sr):int(window_end * sr)], sr), sr)
+            per_window = time.perf_counter() - start
+            print(f"3s windows, {hop_seconds}s hop: {len(segments)} windows of a {len(long_signal) / sr:.0f}s file, "
+                  f"one pass {one_pass:.2f}s, per window {per_window:.2f}s")
+    finally:
+        os.unlink(path)
+
+def bench_predict(args):
+    """predict_emotion per feature vector against one predict_emotion_batch call"""
+    from emotion_recognition.ml_model import get_model, predict_emotion, predict_emotion_batch
+    features, errors = extract_features_batch(dataset_files(args.limit))
+    features = features[~errors]
+    get_model()
+    predict_emotion(features[0])
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for row in features:
+            predict_emotion(row)
+    looped = (time.perf_counter() - start) / (args.repeat * len(features)) * 1000
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        predict_emotion_batch(features)
+    batched = (time.perf_counter() - start) / (args.repeat * len(features)) * 1000
+    print(f"{len(features)} vectors: predict_emotion loop {looped:.2f} ms/vector, predict_emotion_batch {batched:.3f} ms/vector")
+
+def bench_compiled(args):
+    """sklearn scaler + predict_proba against the compiled forest, one vector and a whole batch"""
+    from emotion_recognition.compiled_forest import compile_forest
+    from emotion_recognition.ml_model import get_model
+    features, errors = extract_features_batch(dataset_files(args.limit))
+    features = features[~errors]
+    model, scaler = get_model()
+    start = time.perf_counter()
+    compiled = compile_forest(model, scaler)
+    print(f"compile {time.perf_counter() - start:.2f}s")
+    same = np.array_equal(model.predict_proba(scaler.transform(features)), compiled.predict_proba(features))
+    print(f"{len(features)} vectors, identical probabilities: {same}")
+    for name, predict in [('sklearn', lambda X: model.predict_proba(scaler.transform(X))),
+                          ('compiled', compiled.predict_proba)]:
+        predict(features[:1])
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for i in range(len(features)):
+                predict(features[i:i + 1])
+        single = (time.perf_counter() - start) / (args.repeat * len(features)) * 1000
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            predict(features)
+        batched = (time.perf_counter() - start) / (args.repeat * len(features)) * 1000
+        print(f"{name:8s}: batch of 1 {single:.3f} ms/vector, batch of {len(features)} {batched:.3f} ms/vector")
+
+def bench_cache(args):
+    """predict_emotion on vectors seen before (cache hits) against new ones (misses)"""
+    from emotion_recognition import prediction_cache
+    from emotion_recognition.ml_model import get_model, predict_emotion
+    features, errors = extract_features_batch(dataset_files(args.limit))
+    features = features[~errors]
+    get_model()
+    settings.PREDICTION_CACHE_ENABLED = True
+    for compiled in (False, True):
+        settings.MODEL_COMPILED_INFERENCE = compiled
+        prediction_cache.clear_prediction_cache()
+        timings = {}
+        for phase in ('miss', 'hit'):
+            start = time.perf_counter()
+            for row in features:
+                predict_emotion(row)
+            timings[phase] = (time.perf_counter() - start) / len(features) * 1000
+        print(f"{'compiled' if compiled else 'sklearn '}: miss {timings['miss']:.3f} ms/prediction, "
+              f"hit {timings['hit']:.3f} ms/prediction ({prediction_cache.get_prediction_cache().stats()})")
+
+def bench_variants(args):
+    """Reduced forests: agreement with the full forest on dataset files, p50/p99 latency and size"""
+    import tempfile
+    from emotion_recognition.compiled_forest import compile_forest, save_compiled
+    from emotion_recognition.ml_model import _read_model_pickles
+    from emotion_recognition.model_registry import measure_latency, variant_name
+    features, errors = extract_features_batch(dataset_files(args.limit))
+    features = features[~errors]
+    compiled = compile_forest(*_read_model_pickles())
+    full = np.argmax(compiled.predict_proba(features), axis=1)
+    with tempfile.TemporaryDirectory() as directory:
+        for n_trees in (None, 100, 50, 25):
+            for max_depth in (None, 6, 4):
+                reduced = compiled.reduced(n_trees, max_depth)
+                path = os.path.join(directory, 'variant.forest')
+                save_compiled(reduced, path)
+                agreement = np.mean(np.argmax(reduced.predict_proba(features), axis=1) == full)
+                latency = measure_latency(reduced)
+                print(f"{variant_name(n_trees, max_depth):<8} agreement {agreement:.3f}  p50 {latency['p50_ms']:.3f} ms"
+                      f"  p99 {latency['p99_ms']:.3f} ms  {os.path.getsize(path) / 1024:.0f} KB")
+
+def bench_cascade(args):
+    """Cascade (logistic regression first stage) against the forest alone, fitted on half the dataset files"""
+    from emotion_recognition.cascade import train_cascade
+    from emotion_recognition.compiled_forest import compile_forest
+    from emotion_recognition.create_model import EMOTIONS, get_emotion_from_path
+    from emotion_recognition.ml_model import get_model
+    files = [path for path in dataset_files(args.limit) if get_emotion_from_path(path) is not None]
+    features, errors = extract_features_batch(files)
+    features = features[~errors]
+    y = np.array([EMOTIONS.index(get_emotion_from_path(path)) for path in files])[~errors]
+    model, scaler = get_model()
+    compiled = compile_forest(model, scaler)
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(features))
+    fit, held_out = order[:len(order) // 2], order[len(order) // 2:]
+    X_scaled = scaler.transform(features)
+    cascade = train_cascade(X_scaled[fit], y[fit], X_scaled[held_out], y[held_out],
+                            compiled.predict_proba(features[held_out]), model.classes_, scaler=scaler)
+    print(f"threshold {cascade.threshold:.4f}, calibration {cascade.metrics}")
+    for name, predict in [('forest', compiled.predict_proba),
+                          ('cascade', lambda X: cascade.predict_proba(X, compiled.predict_proba))]:
+        predict(features[:1])
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for i in held_out:
+                predict(features[i:i + 1])
+        single = (time.perf_counter() - start) / (args.repeat * len(held_out)) * 1000
+        accuracy = np.mean(model.classes_[np.argmax(predict(features[held_out]), axis=1)] == y[held_out])
+        print(f"{name:8s}: batch of 1 {single:.3f} ms/vector, held-out accuracy {accuracy:.3f}")
+    print(f"first stage answered {cascade.stats()['first_stage_rate']:.1%} of the rows")
+
+def bench_early_exit(args):
+    """Trees evaluated and single-vector time with early exit, against the full compiled forest"""
+    from emotion_recognition.compiled_forest import compile_forest
+    from emotion_recognition.ml_model import get_model
+    features, errors = extract_features_batch(dataset_files(args.limit))
+    features = features[~errors]
+    compiled = compile_forest(*get_model())
+    labels = np.argmax(compiled.predict_proba(features), axis=1)
+    runs = [('full', None, None)] + [(f'chunk {chunk}', chunk, None) for chunk in (10, 25, 50)]
+    runs += [(f'chunk 10, confidence {confidence}', 10, confidence) for confidence in (0.99, 0.9)]
+    for name, chunk, confidence in runs:
+        if chunk is None:
+            predict = lambda X: (compiled.predict_proba(X), np.full(len(X), compiled.n_trees))
+        else:
+            predict = lambda X: compiled.predict_proba_early_exit(X, chunk_size=chunk, confidence=confidence)
+        probabilities, trees = predict(features)
+        same = np.mean(np.argmax(probabilities, axis=1) == labels)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for i in range(len(features)):
+                predict(features[i:i + 1])
+        single = (time.perf_counter() - start) / (args.repeat * len(features)) * 1000
+        print(f"{name:26s}: {trees.mean():6.1f} trees on average, same label {same:.3f}, "
+              f"batch of 1 {single:.3f} ms/vector")
+
+def bench_progressive(args):
+    """Progressive-duration prediction against whole-file analysis, on recordings joined from 8 dataset clips"""
+    from emotion_recognition.ml_model import predict_emotion, predict_emotion_progressive
+    files = dataset_files(args.limit)
+    with tempfile.TemporaryDirectory() as directory:
+        recordings = []
+        for start in range(0, len(files) - 7, 8):
+            signals = load_signals(files[start:start + 8])
+            sr = signals[0][1]
+            path = os.path.join(directory, f'joined_{start}.wav')
+            sf.write(path, np.concatenate([resample_to_canonical(y, s)[0] if s != sr else y for y, s in signals]), sr)
+            recordings.append(path)
+        predict_emotion(process_audio_file(recordings[0]))
+        timings = {'full': 0.0, 'progressive': 0.0}
+        consumed = total = same = 0.0
+        for path in recordings:
+            start = time.perf_counter()
+            full = predict_emotion(process_audio_file(path))[0]
+            timings['full'] += time.perf_counter() - start
+            stats = {}
+            start = time.perf_counter()
+            progressive = predict_emotion_progressive(path, stats)[0]
+            timings['progressive'] += time.perf_counter() - start
+            consumed += stats['audio_seconds']
+            total += stats['duration']
+            same += progressive == full
+        print(f"{len(recordings)} recordings, {total / len(recordings):.1f}s on average")
+        for name, seconds in timings.items():
+            print(f"{name:12s}: {seconds / len(recordings) * 1000:.1f} ms/recording")
+        print(f"audio analysed {consumed / total:.1%}, same emotion as whole-file analysis {same / len(recordings):.1%}")
+
+def bench_microbatch(args):
+    """Throughput and latency of concurrent predict_emotion callers, with and without micro-batching"""
+    import threading
+    from emotion_recognition import ml_model
+    from emotion_recognition.batching import MicroBatcher
+    features, errors = extract_features_batch(dataset_files(args.limit))
+    features = features[~errors]
+    model, scaler = ml_model.get_model()
+    calls_per_thread = max(1, 2 * len(features) // args.workers)
+    for compiled in (False, True):
+        settings.MODEL_COMPILED_INFERENCE = compiled
+        ml_model._predict_proba(model, scaler, features[:1])
+        batcher = MicroBatcher(lambda X: ml_model._predict_proba(model, scaler, X), max_wait_ms=args.max_wait_ms)
+        for name, predict in [('direct', lambda row: ml_model._predict_proba(model, scaler, row[np.newaxis])[0]),
+                              ('batched', batcher.predict)]:
+            latencies = []
+
+            def caller(offset):
+                for i in range(calls_per_thread):
+                    start = time.perf_counter()
+                    predict(features[(offset + i) % len(features)])
+                    latencies.append(time.perf_counter() - start)
+
+            threads = [threading.Thread(target=caller, args=(k,)) for k in range(args.workers)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            latencies = np.array(latencies) * 1000
+            print(f"{'compiled' if compiled else 'sklearn '} {name:7s}: {args.workers} threads, "
+                  f"{len(latencies) / elapsed:7.1f} predictions/s, latency p50 {np.percentile(latencies, 50):.2f} ms, "
+                  f"p99 {np.percentile(latencies, 99):.2f} ms"
+                  + (f", mean batch {batcher.stats()['mean_batch_size']}" if name == 'batched' else ""))
+
+WORKER_SCRIPT = '''
+import sys
+sys.path.insert(0, {base_dir!r})
+from django.conf import settings
+settings.configure(MODEL_DIR={model_dir!r}, MODEL_COMPILED_INFERENCE=True, MODEL_ARTIFACT_MMAP={mmap!r})
+import numpy as np
+from emotion_recognition.ml_model import get_model, predict_emotion_batch
+model, _ = get_model()
+predict_emotion_batch(np.zeros((1, {n_features})))
+print(type(model).__name__, 'sklearn' in sys.modules, flush=True)
+sys.stdin.read()
+'''
+
+def _memory_kb(pid):
+    """Rss, Pss and private (unshared) memory of a process in kB, from /proc/<pid>/smaps_rollup"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[parts[0][:-1]] = int(parts[1])
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+def bench_rss(args):
+    """Memory of N concurrent worker processes serving the model from the pickles and from the mapped artifact"""
+    import shutil
+    from emotion_recognition.ml_model import MODEL_ARTIFACT_PATH, MODEL_PATH, SCALER_PATH, export_model_artifact, get_model
+    model_dir = tempfile.mkdtemp()
+    try:
+        # Copies of the pickles, so their digest matches the artifact exported from the originals
+        for path in (MODEL_PATH, SCALER_PATH):
+            shutil.copy(path, model_dir)
+        export_model_artifact(os.path.join(model_dir, os.path.basename(MODEL_ARTIFACT_PATH)))
+        n_features = get_model()[0].n_features_in_
+        for mmap in (False, True):
+            script = WORKER_SCRIPT.format(base_dir=BASE_DIR, model_dir=model_dir, mmap=mmap, n_features=n_features)
+            workers = [subprocess.Popen([sys.executable, '-c', script], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True) for _ in range(args.workers)]
+            try:
+                # Every worker has loaded the model before any is measured
+                model_type, imported_sklearn = [worker.stdout.readline().split() for worker in workers][0]
+                usage = np.array([_memory_kb(worker.pid) for worker in workers]) / 1024
+            finally:
+                for worker in workers:
+                    worker.communicate('')
+            rss, pss, private = usage.mean(axis=0)
+            print(f"{'artifact' if mmap else 'pickles '} ({model_type}, sklearn imported: {imported_sklearn}): "
+                  f"{args.workers} workers, per worker RSS {rss:.1f} MB, PSS {pss:.1f} MB, private {private:.1f} MB")
+    finally:
+        shutil.rmtree(model_dir)
+
+def _prepared(path):
+    y, sr = load_audio(path)
+    return prepare_signal(y, sr), sr
+
+BENCHMARKS = {
+    'features': bench_features,
+    'batch': bench_batch,
+    'streaming': bench_streaming,
+    'resample': bench_resample,
+    'backends': bench_backends,
+    'imports': bench_imports,
+    'dtype': bench_dtype,
+    'vad': bench_vad,
+    'timeline': bench_timeline,
+    'predict': bench_predict,
+    'compiled': bench_compiled,
+    'rss': bench_rss,
+    'microbatch': bench_microbatch,
+    'cache': bench_cache,
+    'variants': bench_variants,
+    'cascade': bench_cascade,
+    'early_exit': bench_early_exit,
+    'progressive': bench_progressive,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--limit', type=int, default=None, help='Maximum number of dataset files')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed passes')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes (rss) or threads (microbatch)')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0, help='Micro-batching flush delay')
+    args = parser.parse_args()
+    # Library defaults, without the feature cache so every run does the full work
+    settings.configure(FEATURE_CACHE_ENABLED=False, MODEL_DIR=os.path.join(BASE_DIR, 'model'))
+    BENCHMARKS[args.benchmark](args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""
+Flat-array RandomForest inference.
+
+compile_forest() turns a fitted RandomForestClassifier (and the StandardScaler
+in front of it) into contiguous NumPy arrays: split feature, threshold, left
+and right child of every node of every tree, plus the normalised class
+distribution of every leaf. CompiledForest.predict_proba walks all trees at
+once, vectorized over trees and rows, with none of sklearn's per-call input
+validation, joblib dispatch or per-tree Python calls.
+
+The scaler is folded into the thresholds. sklearn tests
+float32(scaler.transform(x)[f]) <= t, which is monotone in x, so for each
+input dtype there is a largest raw value x* with the same outcome and
+x <= x* is an exact replacement. The boundaries are found by searching the
+representable values around the algebraic inverse t * scale + mean against
+the scaler itself, so probabilities match sklearn bit for bit.
+
+save_compiled()/load_compiled() store a compiled forest as a single flat file
+that is opened as a read-only memory map: worker processes serving the same
+file share its pages instead of each holding an unpickled copy of the model.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Input dtypes with folded thresholds; other inputs are converted to float64
+INPUT_DTYPES = (np.float32, np.float64)
+
+# sklearn trees mark leaves with this child index
+TREE_LEAF = -1
+
+# Artifact layout: magic, 8-byte little-endian header length, JSON header,
+# then every array at an offset aligned to ARTIFACT_ALIGNMENT bytes
+ARTIFACT_MAGIC = b'EMOFOREST1\n'
+ARTIFACT_ALIGNMENT = 64
+
+# Trees evaluated between early-exit checks (see predict_proba_early_exit)
+DEFAULT_EXIT_CHUNK = 25
+# Slack for float summation order when deciding that a lead is unassailable
+LEAD_EPSILON = 1e-9
+
+class CompiledForest:
+    """
+    Flat arrays of a fitted forest. Node i of tree k is node roots[k] + i; a
+    leaf's children point at itself so every row can take the same number of steps.
+    """
+
+    def __init__(self, feature, thresholds, left, right, leaf_values, roots, depth, n_features,
+                 nan_left=None, feature_importances=None):
+        self.feature = feature
+        self.thresholds = thresholds
+        self.left = left
+        self.right = right
+        self.leaf_values = leaf_values
+        self.roots = roots
+        self.depth = depth
+        self.n_features = n_features
+        # Direction of NaN inputs, which sklearn's callers zero after scaling
+        self.nan_left = nan_left
+        self.feature_importances_ = feature_importances
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_estimators(self):
+        return self.n_trees
+
+    def apply(self, X, trees=None):
+        """
+        Leaf reached by every row in every tree
+
+        Args:
+            X: (rows, features) array of raw (unscaled) feature vectors
+            trees: slice of the trees to evaluate (all when None)
+
+        Returns:
+            (trees, rows) array of global node indices
+
+        Raises:
+            ValueError: X has the wrong shape or contains infinity
+        """
+        X = np.asarray(X)
+        if X.dtype.type not in INPUT_DTYPES:
+            X = X.astype(np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected (rows, {self.n_features}) features, got shape {X.shape}")
+        thresholds = self.thresholds[X.dtype.type]
+        rows = np.arange(X.shape[0])
+        roots = self.roots if trees is None else self.roots[trees]
+        nodes = np.repeat(roots[:, None], X.shape[0], axis=1)
+        # The scaler rejects infinities; NaNs pass it and are zeroed after scaling
+        if np.isinf(X).any():
+            raise ValueError("Input contains infinity")
+        nans = np.isnan(X) if self.nan_left is not None and np.isnan(X).any() else None
+        for _ in range(self.depth):
+            features = self.feature[nodes]
+            go_left = X[rows, features] <= thresholds[nodes]
+            if nans is not None:
+                go_left |= nans[rows, features] & self.nan_left[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        """
+        Class probabilities, identical to the sklearn forest on the scaled input
+
+        Args:
+            X: (rows, features) array of raw (unscaled) feature vectors; NaNs are
+                treated as zero after scaling, as ml_model does before sklearn
+
+        Returns:
+            (rows, classes) array of probabilities
+        """
+        leaves = self.apply(X)
+        # Trees are summed in order, as sklearn's single-job accumulation
+        proba = np.zeros((leaves.shape[1], self.leaf_values.shape[1]))
+        for tree_leaves in leaves:
+            proba += self.leaf_values[tree_leaves]
+        proba /= self.n_trees
+        return proba
+
+    def predict_proba_early_exit(self, X, chunk_size=DEFAULT_EXIT_CHUNK, confidence=None):
+        """
+        Class probabilities, evaluating trees in chunks and stopping for a row
+        once the remaining trees cannot change its top class
+
+        Every tree adds a distribution summing to one, so a lead of the top
+        class over the runner-up larger than the number of remaining trees is
+        final: rows that stop early get the full forest's label, and the mean
+        over the trees evaluated as probabilities. Rows that never stop get
+        exactly predict_proba's probabilities.
+
+        Args:
+            X: (rows, features) array of raw (unscaled) feature vectors
+            chunk_size: trees evaluated between checks
+            confidence: also stop once a Hoeffding bound puts the chance that
+                the remaining trees overturn the lead below 1 - confidence.
+                This stops sooner but no longer guarantees the full forest's
+                label; None uses the exact rule only
+
+        Returns:
+            Tuple of (probabilities, trees evaluated per row)
+        """
+        X = np.asarray(X)
+        totals = np.zeros((len(X), self.leaf_values.shape[1]))
+        evaluated = np.zeros(len(X), dtype=np.intp)
+        active = np.arange(len(X))
+        for start in range(0, self.n_trees, chunk_size):
+            stop = min(start + chunk_size, self.n_trees)
+            sums = totals[active]
+            # Same per-tree summation order as predict_proba
+            for tree_leaves in self.apply(X[active], slice(start, stop)):
+                sums += self.leaf_values[tree_leaves]
+            totals[active] = sums
+            evaluated[active] = stop
+            remaining = self.n_trees - stop
+            if remaining == 0:
+                break
+            top_two = np.partition(sums, -2, axis=1)[:, -2:]
+            lead = top_two[:, 1] - top_two[:, 0]
+            done = lead > remaining + LEAD_EPSILON
+            if confidence is not None:
+                done |= _overturn_bound(lead, stop, remaining) <= 1.0 - confidence
+            active = active[~done]
+            if len(active) == 0:
+                break
+        return totals / np.maximum(evaluated, 1)[:, np.newaxis], evaluated
+
+    def node_depths(self):
+        """Depth of every node below its tree's root"""
+        depths = np.full(len(self.feature), -1, dtype=np.intp)
+        depths[self.roots] = 0
+        frontier = self.roots
+        for depth in range(1, self.depth + 1):
+            internal = frontier[self.left[frontier] != frontier]
+            frontier = np.concatenate([self.left[internal], self.right[internal]])
+            depths[frontier] = depth
+        return depths
+
+    def reduced(self, n_trees=None, max_depth=None):
+        """
+        Smaller forest: the first n_trees trees, cut at max_depth
+
+        Nodes at max_depth become leaves predicting the class distribution of
+        the training samples that reached them (sklearn stores it for every
+        node), and nodes below are dropped.
+
+        Args:
+            n_trees: trees to keep (all when None)
+            max_depth: depth limit (none when None)
+
+        Returns:
+            New CompiledForest
+        """
+        n_trees = self.n_trees if n_trees is None else min(n_trees, self.n_trees)
+        max_depth = self.depth if max_depth is None else min(max_depth, self.depth)
+        end = self.roots[n_trees] if n_trees < self.n_trees else len(self.feature)
+        depths = self.node_depths()[:end]
+        keep = (depths >= 0) & (depths <= max_depth)
+        new_index = np.cumsum(keep) - 1
+
+        nodes = np.flatnonzero(keep)
+        cut = depths[nodes] == max_depth
+        left = np.where(cut, nodes, self.left[nodes])
+        right = np.where(cut, nodes, self.right[nodes])
+        feature = np.where(cut, 0, self.feature[nodes])
+        thresholds = {dtype: np.where(cut, np.inf, thresholds[nodes]).astype(dtype)
+                      for dtype, thresholds in self.thresholds.items()}
+        nan_left = None if self.nan_left is None else np.where(cut, True, self.nan_left[nodes])
+        return CompiledForest(
+            feature, thresholds, new_index[left], new_index[right], self.leaf_values[nodes],
+            new_index[self.roots[:n_trees]], max_depth, self.n_features, nan_left=nan_left,
+        )
+
+def compile_forest(model, scaler=None):
+    """
+    Compile a fitted RandomForestClassifier, optionally folding in the scaler applied before it
+
+    Args:
+        model: fitted single-output RandomForestClassifier
+        scaler: fitted StandardScaler whose output the model was trained on, or None
+
+    Returns:
+        CompiledForest
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    n_classes = int(np.atleast_1d(model.n_classes_)[0])
+    if any(tree.n_outputs != 1 for tree in trees):
+        raise ValueError("Only single-output forests can be compiled")
+
+    sizes = np.array([tree.node_count for tree in trees])
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    feature = np.concatenate([tree.feature for tree in trees]).astype(np.intp)
+    threshold = np.concatenate([tree.threshold for tree in trees]).astype(np.float64)
+    left = np.concatenate([np.where(tree.children_left == TREE_LEAF, np.arange(tree.node_count), tree.children_left) + root
+                           for tree, root in zip(trees, roots)]).astype(np.intp)
+    right = np.concatenate([np.where(tree.children_right == TREE_LEAF, np.arange(tree.node_count), tree.children_right) + root
+                            for tree, root in zip(trees, roots)]).astype(np.intp)
+    is_leaf = left == np.arange(len(left))
+    # Leaves test feature 0 against +inf: a no-op step that keeps them in place
+    feature[is_leaf] = 0
+
+    # Leaf distributions normalised exactly as DecisionTreeClassifier.predict_proba
+    values = np.concatenate([tree.value[:, 0, :n_classes] for tree in trees])
+    normalizer = values.sum(axis=1)
+    normalizer[normalizer == 0.0] = 1.0
+    leaf_values = values / normalizer[:, np.newaxis]
+
+    # Scaled NaNs are zeroed before sklearn sees them
+    nan_left = np.float32(0.0) <= threshold
+    nan_left[is_leaf] = True
+
+    thresholds = {}
+    for dtype in INPUT_DTYPES:
+        folded = np.full(len(threshold), np.inf, dtype=dtype)
+        folded[~is_leaf] = _raw_thresholds(feature[~is_leaf], threshold[~is_leaf], scaler, dtype, model.n_features_in_)
+        thresholds[dtype] = folded
+
+    depth = max(tree.max_depth for tree in trees)
+    logger.info(f"Compiled forest: {len(trees)} trees, {len(feature)} nodes, depth {depth}")
+    return CompiledForest(feature, thresholds, left, right, leaf_values, roots, depth, model.n_features_in_,
+                          nan_left=nan_left, feature_importances=getattr(model, 'feature_importances_', None))
+
+def save_compiled(compiled, path, metadata=None):
+    """
+    Write a compiled forest as a memory-mappable artifact (atomically replacing path)
+
+    Args:
+        compiled: CompiledForest to save
+        path: artifact file path
+        metadata: optional JSON-serialisable dictionary stored in the header
+    """
+    arrays = {
+        'feature': compiled.feature,
+        'threshold_float32': compiled.thresholds[np.float32],
+        'threshold_float64': compiled.thresholds[np.float64],
+        'left': compiled.left,
+        'right': compiled.right,
+        'leaf_values': compiled.leaf_values,
+        'roots': compiled.roots,
+        'nan_left': compiled.nan_left,
+        'feature_importances': compiled.feature_importances_,
+    }
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items() if array is not None}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ARTIFACT_ALIGNMENT) * ARTIFACT_ALIGNMENT
+    header = json.dumps({
+        'depth': int(compiled.depth),
+        'n_features': int(compiled.n_features),
+        'arrays': layout,
+        'metadata': metadata or {},
+    }).encode('utf-8')
+    data_start = -(-(len(ARTIFACT_MAGIC) + 8 + len(header)) // ARTIFACT_ALIGNMENT) * ARTIFACT_ALIGNMENT
+
+    # Readers that already mapped the old file keep their pages until they reopen it
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.forest-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(ARTIFACT_MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name]['offset'])
+                f.write(array.tobytes())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def source_digest(*paths):
+    """SHA-256 over the files an artifact is exported from, stored as its 'source' metadata"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def read_artifact_metadata(path):
+    """Metadata dictionary stored by save_compiled, without mapping the arrays"""
+    return _read_header(path)[0]['metadata']
+
+def load_compiled(path):
+    """
+    Open an artifact written by save_compiled as a read-only memory map
+
+    Returns:
+        CompiledForest whose arrays are views of the shared file pages
+    """
+    header, data_start = _read_header(path)
+    mapped = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        start = data_start + spec['offset']
+        arrays[name] = mapped[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+    return CompiledForest(
+        arrays['feature'],
+        {np.float32: arrays['threshold_float32'], np.float64: arrays['threshold_float64']},
+        arrays['left'], arrays['right'], arrays['leaf_values'], arrays['roots'],
+        header['depth'], header['n_features'],
+        nan_left=arrays.get('nan_left'), feature_importances=arrays.get('feature_importances'),
+    )
+
+def _read_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(ARTIFACT_MAGIC)) != ARTIFACT_MAGIC:
+            raise ValueError(f"{path} is not a compiled forest artifact")
+        length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(length).decode('utf-8'))
+    data_start = -(-(len(ARTIFACT_MAGIC) + 8 + length) // ARTIFACT_ALIGNMENT) * ARTIFACT_ALIGNMENT
+    return header, data_start
+
+def _raw_thresholds(feature, threshold, scaler, dtype, n_features):
+    """Largest raw input of each split that still goes left, for inputs of dtype"""
+    def goes_left(ordinals):
+        # Exactly what sklearn compares: the scaled value, cast to the tree's float32
+        x = _from_ordinal(ordinals, dtype)
+        return _scaled(x, feature, scaler, n_features).astype(np.float32) <= threshold
+
+    if scaler is not None:
+        mean = np.zeros(n_features) if scaler.mean_ is None else scaler.mean_
+        scale = np.ones(n_features) if scaler.scale_ is None else scaler.scale_
+        estimate = threshold * scale[feature] + mean[feature]
+    else:
+        estimate = threshold
+    limit = _to_ordinal(np.array([np.finfo(dtype).max], dtype=dtype))[0]
+    with np.errstate(over='ignore'):
+        start = np.clip(_to_ordinal(estimate.astype(dtype)), -limit, limit)
+
+    # Bracket the boundary around the algebraic estimate with doubling steps
+    # (the float32 cast can move it far from the estimate in float64 ulps)...
+    low, high = start.copy(), start + 1
+    step = np.ones_like(start)
+    while True:
+        wrong = ~goes_left(low) & (low > -limit)
+        if not wrong.any():
+            break
+        low[wrong] = np.maximum(low[wrong] - step[wrong], -limit)
+        step[wrong] *= 2
+    step = np.ones_like(start)
+    while True:
+        further = goes_left(high) & (high < limit)
+        if not further.any():
+            break
+        low[further] = high[further]
+        high[further] = np.minimum(high[further] + step[further], limit)
+        step[further] *= 2
+
+    # ... then bisect over the representable values in between
+    while True:
+        open_ = high - low > 1
+        if not open_.any():
+            break
+        middle = low + (high - low) // 2
+        left = goes_left(middle)
+        low = np.where(open_ & left, middle, low)
+        high = np.where(open_ & ~left, middle, high)
+    return _from_ordinal(low, dtype)
+
+def _to_ordinal(x):
+    """Integers ordered like the floats x (adjacent floats differ by one)"""
+    bits = x.view(np.int32 if x.dtype == np.float32 else np.int64).astype(np.int64)
+    sign_mask = np.int64(0x7FFFFFFF if x.dtype == np.float32 else 0x7FFFFFFFFFFFFFFF)
+    return np.where(bits < 0, -(bits & sign_mask), bits)
+
+def _from_ordinal(ordinals, dtype):
+    """Inverse of _to_ordinal"""
+    int_type = np.int32 if dtype == np.float32 else np.int64
+    sign_bit = np.int64(-0x80000000) if dtype == np.float32 else np.int64(-0x8000000000000000)
+    bits = np.where(ordinals < 0, (-ordinals) | sign_bit, ordinals)
+    return bits.astype(int_type).view(dtype)
+
+def _scaled(x, feature, scaler, n_features):
+    """Scaler output for value x[i] of feature feature[i], computed by the scaler itself"""
+    if scaler is None:
+        return x
+    # The scaler works column by column, so a row per value with zeros elsewhere is exact
+    X = np.zeros((len(x), n_features), dtype=x.dtype)
+    rows = np.arange(len(x))
+    X[rows, feature] = x
+    return scaler.transform(X)[rows, feature]
+
+def _overturn_bound(lead, evaluated, remaining):
+    """
+    Hoeffding bound on the chance that the remaining trees overturn a lead,
+    taking each tree's lead (in [-1, 1]) as a draw around the mean seen so far
+    """
+    mean = lead / evaluated
+    gap = mean + lead / remaining
+    return np.where(lead > 0, np.exp(-remaining * gap ** 2 / 2), 1.0)
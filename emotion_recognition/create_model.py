@@ -1,24 +1,49 @@
 """
 Script to train a real emotion recognition model using RAVDESS, EMOVO, and TESS datasets.
-Extracts features from each audio file and saves a trained model to model/emotion_model.pkl.
+Extracts features from each audio file with the project's feature settings
+(speech_emotion_recognition/settings.py, or DJANGO_SETTINGS_MODULE) and
+registers the trained model as a new version in the model registry
+(model/registry); pass --activate to serve it right away.
+With --variants, reduced forests (fewer trees, capped depth) are stored alongside
+and a report of their held-out accuracy, p50/p99 latency and size is printed.
+A logistic-regression first stage is fitted as well, with its confidence
+threshold calibrated on a split of the training data the forest does not see
+(see emotion_recognition/cascade.py); forest, variant and cascade accuracy are
+all reported on the untouched test split.
 """
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-import pickle
+import argparse
 import numpy as np
 from tqdm import tqdm
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
+from sklearn.metrics import accuracy_score, classification_report, f1_score
 from sklearn.preprocessing import StandardScaler
 from sklearn.utils.class_weight import compute_class_weight
 from sklearn.model_selection import GridSearchCV
 from collections import Counter
 
+# Features are extracted with the project's settings (sample rate, voice
+# activity gating, families), so the model matches what the server extracts
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'speech_emotion_recognition.settings')
+import django
 from django.conf import settings
-from emotion_recognition.audio_processor import process_audio_file
+django.setup()
+
+from emotion_recognition.audio_processor import extract_features_batch, feature_tag
+from emotion_recognition.cascade import DEFAULT_TOLERANCE, train_cascade
+from emotion_recognition.compiled_forest import compile_forest
+from emotion_recognition.model_registry import ModelRegistry
+
+# Share of the training samples held out to calibrate the cascade threshold
+CALIBRATION_SIZE = 0.2
+
+# Reduced variants built with --variants: (number of trees, depth cap)
+VARIANT_TREES = (100, 50, 25)
+VARIANT_DEPTHS = (None, 6, 4)
 
 # Emotion mapping for each dataset (update as needed)
 EMOTION_MAP = {
@@ -32,6 +57,9 @@ EMOTION_MAP = {
 }
 EMOTIONS = list(EMOTION_MAP.keys())
 
+# Number of files decoded and processed per extract_features_batch call
+BATCH_SIZE = 64
+
 # Helper to map a filename or folder to a standard emotion label
 def get_emotion_from_path(path):
     lower = path.lower()
@@ -42,7 +70,7 @@ def get_emotion_from_path(path):
     return None
 
 def collect_data(dataset_dirs):
-    X, y = [], []
+    paths, y = [], []
     for dataset_dir in dataset_dirs:
         for root, _, files in os.walk(dataset_dir):
             for file in files:
@@ -51,16 +79,93 @@ def collect_data(dataset_dirs):
                     emotion = get_emotion_from_path(file_path)
                     if emotion is None:
                         continue
-                    try:
-                        features = process_audio_file(file_path)
-                        if features is not None and len(features) == 38:
-                            X.append(features)
-                            y.append(EMOTIONS.index(emotion))
-                    except Exception as e:
-                        print(f"Error processing {file_path}: {e}")
-    return np.array(X), np.array(y)
+                    paths.append(file_path)
+                    y.append(EMOTIONS.index(emotion))
+    if not paths:
+        return np.array([]), np.array([])
+    
+    # Extract features in batches (bounded memory); failed files are dropped
+    # rather than trained on fallback values
+    X, errors = [], []
+    for start in tqdm(range(0, len(paths), BATCH_SIZE), desc="Extracting features"):
+        batch_X, batch_errors = extract_features_batch(paths[start:start + BATCH_SIZE])
+        X.append(batch_X)
+        errors.append(batch_errors)
+    X, errors = np.vstack(X), np.concatenate(errors)
+    for file_path in np.array(paths)[errors]:
+        print(f"Error processing {file_path}")
+    return X[~errors], np.array(y)[~errors]
+
+def variant_specs(model, X_test, y_test):
+    """
+    Reduced variants of the trained forest with their held-out accuracy
+    
+    Args:
+        model: trained RandomForestClassifier
+        X_test, y_test: scaled held-out samples and labels
+    """
+    # The scaler is not folded in: X_test is already scaled
+    compiled = compile_forest(model)
+    specs = []
+    for n_trees in (model.n_estimators,) + VARIANT_TREES:
+        for max_depth in VARIANT_DEPTHS:
+            if n_trees == model.n_estimators and max_depth is None:
+                continue  # the full forest itself
+            reduced = compiled.reduced(n_trees, max_depth)
+            y_pred = model.classes_[np.argmax(reduced.predict_proba(X_test), axis=1)]
+            specs.append({
+                'n_trees': n_trees,
+                'max_depth': max_depth,
+                'accuracy': float(accuracy_score(y_test, y_pred)),
+                'macro_f1': float(f1_score(y_test, y_pred, average='macro')),
+            })
+    return specs
+
+def held_out_split(X, y, size):
+    """
+    train_test_split of `size` samples (at least one per class), stratified
+    when every class has two samples
+    """
+    class_counts = Counter(y)
+    n_classes = len(class_counts)
+    size = max(n_classes, int(size * len(X)))
+    if min(class_counts.values()) < 2 or len(X) < n_classes * 2:
+        print("Not enough samples for stratified split, using random split without stratify.")
+        return train_test_split(X, y, test_size=size, random_state=42, stratify=None)
+    return train_test_split(X, y, test_size=size, random_state=42, stratify=y)
+
+def cascade_test_metrics(cascade, model, scaler, X_test, y_test):
+    """
+    Accuracy of the cascade on the scaled test samples and the share its first stage answered
+    """
+    # The first stage takes raw features (the scaler is folded in)
+    probabilities = cascade.predict_proba(scaler.inverse_transform(X_test),
+                                          lambda rows: model.predict_proba(scaler.transform(rows)))
+    answered = cascade.answered
+    cascade.answered = cascade.escalated = 0
+    y_pred = model.classes_[np.argmax(probabilities, axis=1)]
+    return {
+        'test_accuracy': round(float(accuracy_score(y_test, y_pred)), 4),
+        'test_first_stage_rate': round(answered / len(X_test), 4),
+    }
+
+def print_variant_report(manifest):
+    print(f"{'variant':<12}{'accuracy':>10}{'p50 ms':>10}{'p99 ms':>10}{'size KB':>10}")
+    rows = [dict(manifest['latency'], name='full', accuracy=manifest['metrics']['accuracy'],
+                 size_bytes=manifest['size_bytes'])] + manifest['variants']
+    for row in rows:
+        print(f"{row['name']:<12}{row['accuracy']:>10.3f}{row['p50_ms']:>10.3f}{row['p99_ms']:>10.3f}"
+              f"{row['size_bytes'] / 1024:>10.1f}")
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--activate', action='store_true', help='Serve the new version once registered')
+    parser.add_argument('--variants', action='store_true',
+                        help='Also store reduced variants and report their accuracy, latency and size')
+    parser.add_argument('--cascade-tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Held-out accuracy the cascade first stage may lose against the forest')
+    args = parser.parse_args()
+
     # Paths to datasets
     base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     dataset_dirs = [
@@ -83,16 +188,11 @@ def main():
     class_weights = compute_class_weight('balanced', classes=np.unique(y), y=y)
     class_weight_dict = {i: w for i, w in enumerate(class_weights)}
 
-    # Fix for small datasets: check if stratified split is possible
-    class_counts = Counter(y)
-    min_class_count = min(class_counts.values())
-    n_classes = len(class_counts)
-    test_size = max(n_classes, int(0.15 * len(X)))
-    if min_class_count < 2 or len(X) < n_classes * 2:
-        print("Not enough samples for stratified split, using random split without stratify.")
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42, stratify=None)
-    else:
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42, stratify=y)
+    # Fix for small datasets: stratified only when possible
+    X_train, X_test, y_train, y_test = held_out_split(X, y, 0.15)
+    # The cascade threshold is calibrated on samples neither the forest nor
+    # the test report sees
+    X_train, X_calibration, y_train, y_calibration = held_out_split(X_train, y_train, CALIBRATION_SIZE)
 
     # Hyperparameter tuning (optional, can be commented for speed)
     # param_grid = {
@@ -117,17 +217,37 @@ def main():
     if hasattr(model, 'feature_importances_'):
         print("Feature importances:", model.feature_importances_)
 
-    # Save model and scaler
-    model_dir = os.path.join(base, 'model')
-    os.makedirs(model_dir, exist_ok=True)
-    model_path = os.path.join(model_dir, 'emotion_model.pkl')
-    scaler_path = os.path.join(model_dir, 'scaler.pkl')
-    with open(model_path, 'wb') as f:
-        pickle.dump(model, f)
-    with open(scaler_path, 'wb') as f:
-        pickle.dump(scaler, f)
-    print(f"Model saved to {model_path}")
-    print(f"Scaler saved to {scaler_path}")
+    # Register model and scaler as a new version (the served version only changes with --activate)
+    registry = ModelRegistry(os.path.join(base, 'model', 'registry'))
+    metrics = {
+        'accuracy': float(accuracy_score(y_test, y_pred)),
+        'macro_f1': float(f1_score(y_test, y_pred, average='macro')),
+        'train_samples': int(len(X_train)),
+        'calibration_samples': int(len(X_calibration)),
+        'test_samples': int(len(X_test)),
+    }
+    variants = variant_specs(model, X_test, y_test) if args.variants else None
+
+    # Cheap first stage answering the requests it is sure about
+    print("Training cascade first stage...")
+    cascade = train_cascade(X_train, y_train, X_calibration, y_calibration, model.predict_proba(X_calibration),
+                            model.classes_, scaler=scaler, tolerance=args.cascade_tolerance)
+    cascade.metrics.update(cascade_test_metrics(cascade, model, scaler, X_test, y_test))
+    print(f"Cascade threshold {cascade.threshold:.4f}: first stage answers "
+          f"{cascade.metrics['test_first_stage_rate']:.1%} of test samples, accuracy "
+          f"{cascade.metrics['test_accuracy']:.3f} (forest {metrics['accuracy']:.3f})")
+
+    version = registry.register(model, scaler, tag=feature_tag(), metrics=metrics, activate=args.activate,
+                                variants=variants, cascade=cascade)
+    print(f"Registered model version {version} in {registry.root} "
+          f"(feature set {feature_tag()['feature_set_version']}, accuracy {metrics['accuracy']:.3f})")
+    if variants:
+        print_variant_report(registry.manifest(version))
+        print("Serve the most accurate variant within a latency budget with settings.MODEL_LATENCY_BUDGET_MS")
+    if args.activate:
+        print(f"Version {version} is now active")
+    else:
+        print(f"Activate it with: python manage.py model_registry activate {version}")
 
 if __name__ == "__main__":
     main()
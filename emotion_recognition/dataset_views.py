@@ -20,11 +20,12 @@ from .datasets import (
     get_dataset_list, get_dataset_samples, get_sample_metadata,
     count_samples_by_emotion, DATASETS, DATASETS_DIR
 )
-from .audio_processor import process_audio_file
-from .ml_model import predict_emotion
 
 logger = logging.getLogger(__name__)
 
+# Number of dataset samples decoded and processed per extract_features_batch call
+ANALYSIS_BATCH_SIZE = 16
+
 @login_required
 def sample_datasets(request):
     """View to list all available sample datasets."""
@@ -212,6 +213,10 @@ def analyze_sample(request):
         return JsonResponse({'success': False, 'error': 'Sample not found or not allowed'}, status=404)
 
     try:
+        # The DSP and ML stack is imported on the first analysis, not at worker start
+        from .audio_processor import process_audio_file
+        from .ml_model import predict_emotion
+        
         # Process the audio file
         features = process_audio_file(sample_path)
         emotion, confidence, all_predictions = predict_emotion(features)
@@ -234,6 +239,9 @@ def analyze_dataset_samples(dataset):
     Args:
         dataset: The SampleDataset model object
     """
+    from .audio_processor import extract_features_batch
+    from .ml_model import predict_emotion_batch
+    
     # Get all samples for this dataset
     all_samples = get_dataset_samples(dataset.dataset_id, limit=1000)
     
@@ -256,66 +264,77 @@ def analyze_dataset_samples(dataset):
     # Sample results
     sample_results = []
     
-    # Process each sample
-    for i, sample_path in enumerate(all_samples):
+    # Keep only samples with a known true emotion for this dataset
+    labelled_samples = []
+    for sample_path in all_samples:
+        metadata = get_sample_metadata(sample_path)
+        true_emotion = metadata.get('emotion')
+        if true_emotion and true_emotion in emotions:
+            labelled_samples.append((sample_path, true_emotion))
+    
+    # Process the samples in batches: one feature extraction call per batch...
+    for start in range(0, len(labelled_samples), ANALYSIS_BATCH_SIZE):
+        batch = labelled_samples[start:start + ANALYSIS_BATCH_SIZE]
+        batch_features, batch_errors = extract_features_batch([path for path, _ in batch])
+        for (sample_path, _), failed in zip(batch, batch_errors):
+            if failed:
+                logger.error(f"Error analyzing sample {sample_path}: feature extraction failed")
+        batch = [sample for sample, failed in zip(batch, batch_errors) if not failed]
+        
+        # ... and one scaler/model call for the samples that were extracted
         try:
-            # Get sample metadata
-            metadata = get_sample_metadata(sample_path)
-            true_emotion = metadata.get('emotion')
-            
-            # Skip if no true emotion
-            if not true_emotion or true_emotion not in emotions:
-                continue
-            
-            # Process the audio file
-            features = process_audio_file(sample_path)
-            predicted_emotion, confidence, all_predictions = predict_emotion(features)
-            
-            # Update counters
-            emotion_total[true_emotion] = emotion_total.get(true_emotion, 0) + 1
-            
-            # Check if prediction is correct
-            is_correct = predicted_emotion == true_emotion
-            if is_correct:
-                correct_count += 1
-                emotion_correct[true_emotion] = emotion_correct.get(true_emotion, 0) + 1
-            
-            # Update confusion matrix
-            true_idx = emotions.index(true_emotion)
-            pred_idx = emotions.index(predicted_emotion) if predicted_emotion in emotions else -1
-            
-            if pred_idx >= 0:
-                confusion_matrix['matrix'][true_idx][pred_idx] += 1
-            
-            # Add to sample results
-            sample_results.append({
-                'sample_name': os.path.basename(sample_path),
-                'true_emotion': true_emotion,
-                'predicted_emotion': predicted_emotion,
-                'confidence': confidence,
-                'confidence_percent': int(confidence * 100),
-                'is_correct': is_correct
-            })
-            
-            # Update progress
-            completed_count += 1
-            progress = int((completed_count / total_count) * 100) if total_count > 0 else 0
-            
-            # Update dataset metadata
-            with transaction.atomic():
-                # Reload dataset to avoid race conditions
-                current_dataset = SampleDataset.objects.get(id=dataset.id)
-                current_metadata = current_dataset.metadata
-                current_metadata.setdefault('analysis', {})
-                current_metadata['analysis']['progress'] = progress
-                current_metadata['analysis']['completed_count'] = completed_count
-                current_metadata['analysis']['total_count'] = total_count
-                current_dataset.metadata = current_metadata
-                current_dataset.save()
-            
+            labels, confidences, _ = predict_emotion_batch(batch_features[~batch_errors])
         except Exception as e:
-            logger.error(f"Error analyzing sample {sample_path}: {str(e)}")
-            # Continue with next sample
+            logger.error(f"Error predicting emotions for {len(batch)} samples: {str(e)}")
+            labels, confidences = [], []
+        
+        for (sample_path, true_emotion), predicted_emotion, confidence in zip(batch, labels, confidences):
+            try:
+                confidence = float(confidence)
+                
+                # Update counters
+                emotion_total[true_emotion] = emotion_total.get(true_emotion, 0) + 1
+                
+                # Check if prediction is correct
+                is_correct = predicted_emotion == true_emotion
+                if is_correct:
+                    correct_count += 1
+                    emotion_correct[true_emotion] = emotion_correct.get(true_emotion, 0) + 1
+                
+                # Update confusion matrix
+                true_idx = emotions.index(true_emotion)
+                pred_idx = emotions.index(predicted_emotion) if predicted_emotion in emotions else -1
+                
+                if pred_idx >= 0:
+                    confusion_matrix['matrix'][true_idx][pred_idx] += 1
+                
+                # Add to sample results
+                sample_results.append({
+                    'sample_name': os.path.basename(sample_path),
+                    'true_emotion': true_emotion,
+                    'predicted_emotion': predicted_emotion,
+                    'confidence': confidence,
+                    'confidence_percent': int(confidence * 100),
+                    'is_correct': is_correct
+                })
+                
+                completed_count += 1
+            except Exception as e:
+                logger.error(f"Error analyzing sample {sample_path}: {str(e)}")
+                # Continue with next sample
+        
+        # Update progress once per batch
+        progress = int((completed_count / total_count) * 100) if total_count > 0 else 0
+        with transaction.atomic():
+            # Reload dataset to avoid race conditions
+            current_dataset = SampleDataset.objects.get(id=dataset.id)
+            current_metadata = current_dataset.metadata
+            current_metadata.setdefault('analysis', {})
+            current_metadata['analysis']['progress'] = progress
+            current_metadata['analysis']['completed_count'] = completed_count
+            current_metadata['analysis']['total_count'] = total_count
+            current_dataset.metadata = current_metadata
+            current_dataset.save()
     
     # Calculate overall accuracy
     overall_accuracy = int((correct_count / completed_count) * 100) if completed_count > 0 else 0
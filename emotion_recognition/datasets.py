@@ -12,17 +12,10 @@ from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
-# Path to the datasets directory
+# Path to the datasets directory. It is not created on import: readers treat a
+# missing directory as empty and create_sample_dataset_directory creates it on demand
 DATASETS_DIR = os.path.join(settings.BASE_DIR, 'datasets')
 
-# Make sure the datasets directory exists
-if not os.path.exists(DATASETS_DIR):
-    try:
-        os.makedirs(DATASETS_DIR)
-        logger.info(f"Created datasets directory at {DATASETS_DIR}")
-    except Exception as e:
-        logger.error(f"Failed to create datasets directory: {str(e)}")
-
 # Dataset metadata structure
 DATASETS = {
     'ravdess': {
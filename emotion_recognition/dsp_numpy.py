@@ -0,0 +1,251 @@
+"""
+NumPy-only implementations of the librosa primitives used for feature extraction.
+
+Each function mirrors the librosa function of the same name for the arguments
+audio_processor passes (librosa defaults otherwise), so the two backends are
+interchangeable and produce the same features up to float rounding. Importing
+this module costs nothing beyond NumPy: no numba JIT, no scipy, and no
+per-call argument validation. Outputs keep the floating point type of the
+input, so a float32 signal is processed in float32 throughout.
+"""
+
+import numpy as np
+
+def frame(y, frame_length, hop_length):
+    """
+    Strided view of y split into frames along its last axis; no samples are copied
+
+    Args:
+        y: time series (or stack of time series), at least frame_length samples long
+        frame_length: samples per frame
+        hop_length: samples between frame starts
+
+    Returns:
+        Read-only array view of shape (..., 1 + (n - frame_length) // hop_length, frame_length)
+    """
+    if y.shape[-1] < frame_length:
+        raise ValueError(f"Input is too short (n={y.shape[-1]}) for frame_length={frame_length}")
+    return np.lib.stride_tricks.sliding_window_view(y, frame_length, axis=-1)[..., ::hop_length, :]
+
+def _center(y, n_fft, pad_mode):
+    padding = [(0, 0)] * (y.ndim - 1) + [(n_fft // 2, n_fft // 2)]
+    return np.pad(y, padding, mode=pad_mode)
+
+def fft_frequencies(*, sr, n_fft):
+    """Centre frequency of each rfft bin"""
+    return np.fft.rfftfreq(n=n_fft, d=1.0 / sr)
+
+def stft(y, *, n_fft=2048, hop_length=None, center=True, pad_mode='constant'):
+    """
+    Short-time Fourier transform with a periodic Hann window (librosa.stft)
+
+    Returns:
+        Complex array of shape (..., 1 + n_fft // 2, frames)
+    """
+    hop_length = n_fft // 4 if hop_length is None else hop_length
+    if center:
+        y = _center(y, n_fft, pad_mode)
+    window = 0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(n_fft) / n_fft)
+    frames = frame(y, n_fft, hop_length) * window.astype(y.dtype, copy=False)
+    return np.swapaxes(np.fft.rfft(frames, axis=-1), -1, -2)
+
+def zero_crossing_rate(*, y, frame_length=2048, hop_length=512, center=True, threshold=1e-10):
+    """
+    Fraction of sign changes per frame (librosa.feature.zero_crossing_rate).
+    Samples within +-threshold count as positive, and the first sample of a
+    frame never counts as a crossing.
+
+    Returns:
+        Array of shape (1, frames)
+    """
+    if center:
+        y = _center(y, frame_length, 'edge')
+    negative = np.signbit(np.where(np.abs(y) <= threshold, 0.0, y))
+    crossings = np.concatenate(([0], np.cumsum(negative[1:] != negative[:-1])))
+    starts = np.arange(0, len(y) - frame_length + 1, hop_length)
+    counts = crossings[starts + frame_length - 1] - crossings[starts]
+    return (counts / frame_length).astype(y.dtype)[np.newaxis, :]
+
+def rms(*, y, frame_length=2048, hop_length=512, center=True, pad_mode='constant'):
+    """
+    Root-mean-square energy per frame (librosa.feature.rms)
+
+    Returns:
+        Array of shape (1, frames)
+    """
+    if center:
+        y = _center(y, frame_length, pad_mode)
+    power = np.mean(frame(np.abs(y) ** 2, frame_length, hop_length), axis=-1)
+    return np.sqrt(power)[np.newaxis, :]
+
+def _normalize_columns(S):
+    """Scale each column to unit L1 norm, leaving all-zero columns untouched"""
+    length = np.sum(np.abs(S), axis=-2, keepdims=True)
+    length[length < np.finfo(length.dtype).tiny] = 1.0
+    return S / length
+
+def spectral_centroid(*, S, sr, n_fft=2048):
+    """Magnitude-weighted mean frequency per frame (librosa.feature.spectral_centroid)"""
+    freq = fft_frequencies(sr=sr, n_fft=n_fft).astype(S.dtype)[:, np.newaxis]
+    return np.sum(freq * _normalize_columns(S), axis=-2, keepdims=True)
+
+def spectral_bandwidth(*, S, sr, n_fft=2048, centroid=None, p=2):
+    """Magnitude-weighted p-th order deviation around the centroid (librosa.feature.spectral_bandwidth)"""
+    if centroid is None:
+        centroid = spectral_centroid(S=S, sr=sr, n_fft=n_fft)
+    freq = fft_frequencies(sr=sr, n_fft=n_fft).astype(S.dtype)[:, np.newaxis]
+    deviation = np.abs(freq - centroid)
+    return np.sum(_normalize_columns(S) * deviation ** p, axis=-2, keepdims=True) ** (1.0 / p)
+
+def spectral_rolloff(*, S, sr, n_fft=2048, roll_percent=0.85):
+    """Lowest frequency below which roll_percent of the magnitude lies (librosa.feature.spectral_rolloff)"""
+    freq = fft_frequencies(sr=sr, n_fft=n_fft).astype(S.dtype)
+    total_energy = np.cumsum(S, axis=-2)
+    threshold = roll_percent * total_energy[-1]
+    # First bin whose cumulative energy reaches the threshold
+    index = np.argmax(total_energy >= threshold, axis=-2)
+    return freq[index][np.newaxis, :]
+
+def power_to_db(S, *, ref=1.0, amin=1e-10, top_db=80.0):
+    """Power spectrogram to decibels, floored top_db below the peak (librosa.power_to_db)"""
+    log_spec = 10.0 * np.log10(np.maximum(amin, S))
+    log_spec -= 10.0 * np.log10(np.maximum(amin, np.abs(ref)))
+    if top_db is not None:
+        log_spec = np.maximum(log_spec, log_spec.max() - top_db)
+    return log_spec
+
+def hz_to_mel(frequencies):
+    """Slaney mel scale: linear below 1 kHz, logarithmic above"""
+    frequencies = np.asanyarray(frequencies, dtype=float)
+    f_sp = 200.0 / 3
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    return np.where(
+        frequencies >= min_log_hz,
+        min_log_mel + np.log(np.maximum(frequencies, min_log_hz) / min_log_hz) / logstep,
+        frequencies / f_sp,
+    )
+
+def mel_to_hz(mels):
+    """Inverse of hz_to_mel"""
+    mels = np.asanyarray(mels, dtype=float)
+    f_sp = 200.0 / 3
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    return np.where(
+        mels >= min_log_mel,
+        min_log_hz * np.exp(logstep * (mels - min_log_mel)),
+        f_sp * mels,
+    )
+
+def mel(*, sr, n_fft, n_mels=128, dtype=np.float32):
+    """
+    Slaney-normalised triangular mel filterbank from 0 Hz to sr / 2 (librosa.filters.mel)
+
+    Returns:
+        Array of shape (n_mels, 1 + n_fft // 2)
+    """
+    fftfreqs = fft_frequencies(sr=sr, n_fft=n_fft)
+    mel_f = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sr / 2.0), n_mels + 2))
+    fdiff = np.diff(mel_f)
+    ramps = np.subtract.outer(mel_f, fftfreqs)
+    lower = -ramps[:-2] / fdiff[:-1, np.newaxis]
+    upper = ramps[2:] / fdiff[1:, np.newaxis]
+    weights = np.maximum(0, np.minimum(lower, upper))
+    # Approximately constant energy per channel
+    weights *= (2.0 / (mel_f[2:] - mel_f[:-2]))[:, np.newaxis]
+    return weights.astype(dtype)
+
+def chroma(*, sr, n_fft, tuning=0.0, n_chroma=12, ctroct=5.0, octwidth=2, dtype=np.float32):
+    """
+    Chroma filterbank: Gaussian bumps around each pitch class, weighted by a
+    Gaussian over octaves centred on ctroct and starting at C (librosa.filters.chroma)
+
+    Returns:
+        Array of shape (n_chroma, 1 + n_fft // 2)
+    """
+    frequencies = np.linspace(0, sr, n_fft, endpoint=False)[1:]
+    a440 = 440.0 * 2.0 ** (tuning / n_chroma)
+    frqbins = n_chroma * np.log2(frequencies / (a440 / 16))
+    # The 0 Hz bin is placed 1.5 octaves below bin 1
+    frqbins = np.concatenate(([frqbins[0] - 1.5 * n_chroma], frqbins))
+    binwidthbins = np.concatenate((np.maximum(frqbins[1:] - frqbins[:-1], 1.0), [1]))
+
+    n_chroma2 = np.round(float(n_chroma) / 2)
+    D = np.subtract.outer(frqbins, np.arange(0, n_chroma, dtype='d')).T
+    D = np.remainder(D + n_chroma2 + 10 * n_chroma, n_chroma) - n_chroma2
+    wts = np.exp(-0.5 * (2 * D / binwidthbins) ** 2)
+    wts /= np.linalg.norm(wts, axis=0, keepdims=True)
+    wts *= np.exp(-0.5 * ((frqbins / n_chroma - ctroct) / octwidth) ** 2)
+    wts = np.roll(wts, -3 * (n_chroma // 12), axis=0)
+    return np.ascontiguousarray(wts[:, :int(1 + n_fft / 2)], dtype=dtype)
+
+def dct(n_input, n_output):
+    """
+    Orthonormal DCT-II as an (n_output, n_input) matrix
+
+    Args:
+        n_input: length of the transformed axis (mel bands)
+        n_output: number of leading coefficients kept
+    """
+    k = np.arange(n_output)[:, np.newaxis]
+    n = np.arange(n_input)[np.newaxis, :]
+    basis = np.sqrt(2.0 / n_input) * np.cos(np.pi * k * (2 * n + 1) / (2 * n_input))
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+def _localmax(S):
+    """Bins strictly above the bin below and not below the bin above (librosa.util.localmax)"""
+    peaks = np.zeros(S.shape, dtype=bool)
+    peaks[1:-1] = (S[1:-1] > S[:-2]) & (S[1:-1] >= S[2:])
+    peaks[-1] = S[-1] > S[-2]
+    return peaks
+
+def piptrack(*, S, sr, n_fft=2048, fmin=150.0, fmax=4000.0, threshold=0.1):
+    """
+    Pitch candidates from parabolic interpolation of spectral peaks (librosa.piptrack)
+
+    Returns:
+        Tuple of (pitches, magnitudes), each shaped like S and zero off-peak
+    """
+    fmax = min(fmax, float(sr) / 2)
+    fft_freqs = fft_frequencies(sr=sr, n_fft=n_fft)
+
+    avg = np.gradient(S, axis=-2)
+    # Parabolic vertex offset around each bin; 0 at the edges and where it exceeds a bin
+    a = S[2:] + S[:-2] - 2 * S[1:-1]
+    b = (S[2:] - S[:-2]) / 2
+    shift = np.zeros_like(S)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shift[1:-1] = np.where(np.abs(b) >= np.abs(a), 0.0, -b / a)
+    dskew = 0.5 * avg * shift
+
+    freq_mask = ((fmin <= fft_freqs) & (fft_freqs < fmax))[:, np.newaxis]
+    ref_value = threshold * np.max(S, axis=-2, keepdims=True)
+    idx = np.nonzero(freq_mask & _localmax(S * (S > ref_value)))
+    pitches = np.zeros_like(S)
+    mags = np.zeros_like(S)
+    pitches[idx] = (idx[-2] + shift[idx]) * float(sr) / n_fft
+    mags[idx] = S[idx] + dskew[idx]
+    return pitches, mags
+
+def estimate_tuning(*, S, sr, n_fft=2048, resolution=0.01, bins_per_octave=12):
+    """
+    Deviation of the dominant pitches from A440 equal temperament, as a
+    fraction of a bin (librosa.estimate_tuning)
+    """
+    pitch, mag = piptrack(S=S, sr=sr, n_fft=n_fft)
+    pitch_mask = pitch > 0
+    threshold = np.median(mag[pitch_mask]) if pitch_mask.any() else 0.0
+    frequencies = pitch[(mag >= threshold) & pitch_mask]
+    if not frequencies.size:
+        return 0.0
+
+    # Residual relative to the nearest bin, in [-0.5, 0.5)
+    residual = np.mod(bins_per_octave * np.log2(frequencies / (440.0 / 16)), 1.0)
+    residual[residual >= 0.5] -= 1.0
+    bins = np.linspace(-0.5, 0.5, int(np.ceil(1.0 / resolution)) + 1)
+    counts, tuning = np.histogram(residual, bins)
+    return float(tuning[np.argmax(counts)])
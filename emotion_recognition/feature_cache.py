@@ -0,0 +1,137 @@
+"""
+Persistent, content-addressed cache of extracted audio features.
+
+Entries are keyed by the SHA-256 of the audio file bytes plus the feature-set
+version, so renamed or re-uploaded copies of a file hit the same entry and a
+change to the feature pipeline never returns stale vectors. The cache lives in
+its own SQLite file (not the Django database) and is bounded by LRU eviction.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+
+from .utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Defaults, overridable from Django settings
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, 'cache', 'features.sqlite3')
+DEFAULT_MAX_ENTRIES = 20000
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's bytes, read in chunks
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class FeatureCache:
+    """
+    SQLite-backed feature cache with size-bounded LRU eviction
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS features ("
+                "key TEXT PRIMARY KEY, dtype TEXT NOT NULL, data BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS features_last_used ON features (last_used)")
+
+    def _connection(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key_for_file(file_path, version):
+        """Cache key for an audio file under a feature-set version"""
+        return f"{version}:{file_digest(file_path)}"
+
+    def get(self, key):
+        """Return the cached feature vector for key, or None"""
+        try:
+            with self._connection() as conn:
+                row = conn.execute("SELECT dtype, data FROM features WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE features SET last_used = ? WHERE key = ?", (time.time(), key))
+            return np.frombuffer(row[1], dtype=row[0]).copy()
+        except sqlite3.Error as e:
+            logger.warning(f"Feature cache lookup failed: {str(e)}")
+            return None
+
+    def put(self, key, features):
+        """Store a feature vector and evict the least recently used entries"""
+        features = np.ascontiguousarray(features)
+        try:
+            with self._connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO features (key, dtype, data, last_used) VALUES (?, ?, ?, ?)",
+                    (key, features.dtype.str, features.tobytes(), time.time())
+                )
+                conn.execute(
+                    "DELETE FROM features WHERE key IN "
+                    "(SELECT key FROM features ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Feature cache store failed: {str(e)}")
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM features")
+
+    def __len__(self):
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+
+# Process-wide cache instance (lazy)
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_feature_cache():
+    """
+    Get the process-wide feature cache
+
+    Returns:
+        FeatureCache instance, or None when caching is disabled or unavailable
+    """
+    global _CACHE
+    if not get_setting('FEATURE_CACHE_ENABLED', True):
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            try:
+                _CACHE = FeatureCache(
+                    get_setting('FEATURE_CACHE_PATH', DEFAULT_CACHE_PATH),
+                    get_setting('FEATURE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+                )
+            except Exception as e:
+                logger.error(f"Feature cache unavailable: {str(e)}")
+                return None
+        return _CACHE
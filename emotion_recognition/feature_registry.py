@@ -0,0 +1,111 @@
+"""
+Declarative registry of the feature families that make up the feature vector.
+
+Each family is registered with the number of rows it produces per frame and
+the function computing them. The feature names, vector width, column slices
+and the layout part of the feature-set version are all derived from the
+registrations, so nothing downstream hard-codes the layout.
+
+settings.AUDIO_FEATURE_FAMILIES selects a subset of the registered families
+(e.g. without chroma for low-latency deployments). The feature-set version
+changes with the subset, so cached features and model tags never mix layouts.
+"""
+
+from collections import namedtuple
+
+from .utils import get_setting
+
+# compute(ctx) returns a (rows, frames) array; see audio_processor.compute_frame_features
+# for the fields of ctx. Bump version when a family's computation changes.
+FeatureFamily = namedtuple('FeatureFamily', ['name', 'rows', 'pooled', 'fallback', 'compute', 'version', 'label'])
+
+class FeatureRegistry:
+    """
+    Ordered collection of feature families.
+    Pooled families are summarised over the whole matrix, the others per row.
+    """
+
+    def __init__(self):
+        self._families = {}
+
+    def register(self, name, rows=1, pooled=False, fallback=(0.0, 1.0), version=1, label=None):
+        """
+        Decorator registering a compute function as feature family `name`
+
+        Args:
+            name: family name, also the prefix of its feature names
+            rows: rows per frame produced by the compute function
+            pooled: whether the family is summarised as a single mean/std pair
+            fallback: (mean, std) used when the family cannot be computed
+            version: version of the computation, part of the feature-set version
+            label: human readable name for log messages (defaults to name)
+        """
+        def decorator(compute):
+            if name in self._families:
+                raise ValueError(f"Feature family '{name}' is already registered")
+            self._families[name] = FeatureFamily(name, rows, pooled, tuple(fallback), compute, version, label or name)
+            return compute
+        return decorator
+
+    def all_families(self):
+        """Every registered family, in output order"""
+        return list(self._families.values())
+
+    def families(self, names=None):
+        """
+        Active families, in output order
+
+        Args:
+            names: family names to select (defaults to settings.AUDIO_FEATURE_FAMILIES,
+                where None means every family)
+        """
+        if names is None:
+            names = get_setting('AUDIO_FEATURE_FAMILIES', None)
+        if names is None:
+            return self.all_families()
+        unknown = set(names) - set(self._families)
+        if unknown:
+            raise ValueError(f"Unknown feature families: {', '.join(sorted(unknown))}")
+        return [family for family in self._families.values() if family.name in names]
+
+    def is_active(self, name):
+        return any(family.name == name for family in self.families())
+
+    def width(self, families=None):
+        """Length of the feature vector"""
+        return sum(family_width(family) for family in self._resolve(families))
+
+    def feature_names(self, families=None):
+        """Names of the features, in vector order"""
+        names = []
+        for family in self._resolve(families):
+            if family.pooled or family.rows == 1:
+                names.extend([f'{family.name}_mean', f'{family.name}_std'])
+            else:
+                for i in range(family.rows):
+                    names.extend([f'{family.name}{i+1}_mean', f'{family.name}{i+1}_std'])
+        return names
+
+    def slices(self, families=None):
+        """Dictionary mapping family name to its columns in the feature vector"""
+        slices = {}
+        start = 0
+        for family in self._resolve(families):
+            slices[family.name] = slice(start, start + family_width(family))
+            start += family_width(family)
+        return slices
+
+    def spec(self, families=None):
+        """JSON-serialisable description of the layout, hashed into the feature-set version"""
+        return [[family.name, family.rows, family.pooled, family.version] for family in self._resolve(families)]
+
+    def _resolve(self, families):
+        return self.families() if families is None else families
+
+def family_width(family):
+    """Number of features a family contributes (a mean and a std per summarised row)"""
+    return 2 if family.pooled else 2 * family.rows
+
+def fallback_values(family):
+    """Feature values substituted when a family could not be computed"""
+    return list(family.fallback) * (1 if family.pooled else family.rows)
@@ -0,0 +1,17 @@
+"""
+Compile the model and scaler pickles into the memory-mapped artifact that
+worker processes share: `python manage.py export_model_artifact`.
+"""
+from django.core.management.base import BaseCommand
+
+class Command(BaseCommand):
+    help = "Export the model and scaler as a memory-mapped compiled forest (see settings.MODEL_ARTIFACT_MMAP)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Artifact path (defaults to the model directory)')
+
+    def handle(self, *args, **options):
+        from emotion_recognition.ml_model import export_model_artifact
+
+        path = export_model_artifact(options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Exported model artifact to {path}"))
@@ -0,0 +1,57 @@
+"""
+Inspect and manage the versioned model registry (see emotion_recognition/model_registry.py):
+`python manage.py model_registry list|activate VERSION|register`.
+"""
+import pickle
+
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = "List, register and activate model versions"
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='action', required=True)
+        subcommands.add_parser('list', help='Registered versions and their variants with metrics and latency')
+        activate = subcommands.add_parser('activate', help='Serve a version (workers hot reload it)')
+        activate.add_argument('version')
+        register = subcommands.add_parser('register', help='Register a model/scaler pickle pair as a new version')
+        register.add_argument('--model', help='Model pickle (defaults to the fixed model file)')
+        register.add_argument('--scaler', help='Scaler pickle (defaults to the fixed scaler file)')
+        register.add_argument('--tag', help='Feature tag JSON (defaults to the fixed tag file, when present)')
+        register.add_argument('--activate', action='store_true', help='Serve the new version')
+
+    def handle(self, *args, **options):
+        from emotion_recognition import ml_model
+
+        registry = ml_model.REGISTRY
+        if options['action'] == 'list':
+            active = registry.active_version()
+            if not registry.versions():
+                self.stdout.write(f"No registered versions in {registry.root}")
+            for version in registry.versions():
+                manifest = registry.manifest(version)
+                metrics = ', '.join(f"{name} {value}" for name, value in manifest.get('metrics', {}).items())
+                latency = manifest.get('latency', {})
+                self.stdout.write(
+                    f"{'*' if version == active else ' '} {version}  feature set {manifest.get('feature_set_version')}"
+                    f"  p50 {latency.get('p50_ms')} / p99 {latency.get('p99_ms')} ms/row  {metrics}"
+                )
+                for variant in manifest.get('variants', []):
+                    self.stdout.write(
+                        f"      {variant['name']:<10} accuracy {variant.get('accuracy')}"
+                        f"  p50 {variant['p50_ms']} / p99 {variant['p99_ms']} ms/row  {variant['size_bytes']} bytes"
+                    )
+        elif options['action'] == 'activate':
+            try:
+                registry.activate(options['version'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Activated {options['version']}"))
+        else:
+            with open(options['model'] or ml_model.MODEL_PATH, 'rb') as f:
+                model = pickle.load(f)
+            with open(options['scaler'] or ml_model.SCALER_PATH, 'rb') as f:
+                scaler = pickle.load(f)
+            tag = ml_model.load_model_tag(options['tag'] or ml_model.MODEL_TAG_PATH)
+            version = registry.register(model, scaler, tag=tag, activate=options['activate'])
+            self.stdout.write(self.style.SUCCESS(f"Registered {version}" + (" (active)" if options['activate'] else "")))
@@ -0,0 +1,65 @@
+"""
+Re-run emotion analysis on stored recordings, e.g. after the model or the
+feature set changed: `python manage.py reanalyze_recordings [--user NAME]`.
+
+Recordings are analysed by extract_features_batch, which decodes one at a
+time and streams the long ones, so a batch of long uploads is never held in
+memory. Recordings that cannot be analysed are listed on stderr.
+"""
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from emotion_recognition.models import AudioRecord, EmotionResult
+
+class Command(BaseCommand):
+    help = "Re-extract features and re-predict the emotion of stored recordings in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only recordings of this username')
+        parser.add_argument('--batch-size', type=int, default=64, help='Recordings per extraction/prediction batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without saving them')
+
+    def handle(self, *args, **options):
+        from emotion_recognition.audio_processor import extract_features_batch
+        from emotion_recognition.ml_model import EMOTIONS, predict_emotion_batch
+
+        records = AudioRecord.objects.filter(is_sample=False).select_related('emotion_result').order_by('id')
+        if options['user']:
+            records = records.filter(user__username=options['user'])
+
+        updated = changed = failed = 0
+        iterator = records.iterator(chunk_size=options['batch_size'])
+        while True:
+            batch = list(islice(iterator, options['batch_size']))
+            if not batch:
+                break
+            # One feature extraction call and one model call per batch
+            features, errors = extract_features_batch([record.file_path for record in batch])
+            for record in (record for record, error in zip(batch, errors) if error):
+                self.stderr.write(f"Recording {record.id} ({record.file_path}) could not be analysed")
+                failed += 1
+            batch = [record for record, error in zip(batch, errors) if not error]
+            labels, confidences, probabilities = predict_emotion_batch(features[~errors])
+
+            with transaction.atomic():
+                for record, label, confidence, row in zip(batch, labels, confidences, probabilities):
+                    previous = getattr(record, 'emotion_result', None)
+                    if previous is not None and previous.emotion != label:
+                        changed += 1
+                    if not options['dry_run']:
+                        EmotionResult.objects.update_or_create(
+                            audio_record=record,
+                            defaults={
+                                'emotion': label,
+                                'confidence': float(confidence),
+                                'full_results': {emotion: float(prob) for emotion, prob in zip(EMOTIONS, row)},
+                            },
+                        )
+                    updated += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-analysed {updated} recordings ({changed} changed emotion), {failed} could not be analysed"
+            + (" [dry run]" if options['dry_run'] else "")
+        ))
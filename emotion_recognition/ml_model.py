@@ -1,12 +1,28 @@
 import os
+import json
+import time
 import pickle
+import weakref
+import threading
 import numpy as np
 from django.conf import settings
 import logging
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
 import warnings
 
+from .compiled_forest import (
+    DEFAULT_EXIT_CHUNK, CompiledForest, compile_forest, load_compiled, read_artifact_metadata, save_compiled,
+    source_digest
+)
+from .batching import MicroBatcher
+from .cascade import Cascade
+from .model_registry import ModelRegistry, ShadowEvaluator, select_variant
+from .prediction_cache import clear_prediction_cache, get_prediction_cache
+from .profiling import stage
+from .utils import get_setting
+
+# scikit-learn is not imported here: unpickling the model pulls it in on the
+# first prediction, so importing this module stays cheap for worker start-up
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -20,26 +36,212 @@ EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprised']
 MODEL_PATH = os.path.join(settings.MODEL_DIR, 'emotion_model.pkl')
 SCALER_PATH = os.path.join(settings.MODEL_DIR, 'scaler.pkl')
 
+# Feature tag written next to the model when it is trained (see
+# audio_processor.feature_tag); models without one predate the feature
+# registry and use the full default layout
+MODEL_TAG_PATH = os.path.join(settings.MODEL_DIR, 'emotion_model.json')
+
+# Memory-mapped compiled forest with the scaler folded in (see
+# export_model_artifact); used instead of the pickles when it was exported
+# from them and settings.MODEL_ARTIFACT_MMAP is set. Generated, never committed:
+# the first load builds it when it is missing or the pickles changed
+MODEL_ARTIFACT_PATH = os.path.join(settings.MODEL_DIR, 'emotion_model.forest')
+
+# Linear first stage answering confident requests before the forest (see
+# cascade.py); used when present and settings.MODEL_CASCADE is set
+MODEL_CASCADE_PATH = os.path.join(settings.MODEL_DIR, 'cascade.json')
+
+# Versioned bundles (see model_registry.py); while a version is active it is
+# served instead of the fixed files above
+REGISTRY = ModelRegistry(os.path.join(settings.MODEL_DIR, 'registry'))
+
+def model_files():
+    """
+    Files of the model to serve: the active registry version, else the fixed files
+    
+    Returns:
+        Dictionary with 'model', 'scaler', 'tag', 'artifact' and 'cascade' paths, the
+        'version' name (None for the fixed files) and the reduced 'variant'
+        picked for settings.MODEL_LATENCY_BUDGET_MS (None for the full forest),
+        whose artifact then replaces the full one
+    """
+    version = REGISTRY.active_version()
+    if version is None:
+        return {'model': MODEL_PATH, 'scaler': SCALER_PATH, 'tag': MODEL_TAG_PATH,
+                'artifact': MODEL_ARTIFACT_PATH, 'cascade': MODEL_CASCADE_PATH, 'version': None, 'variant': None}
+    files = REGISTRY.paths(version)
+    budget_ms = get_setting('MODEL_LATENCY_BUDGET_MS', None)
+    if budget_ms is not None:
+        try:
+            variant = select_variant(REGISTRY.manifest(version), budget_ms)
+        except Exception as e:
+            logger.warning(f"Cannot read the variants of {version}, serving the full model: {str(e)}")
+            variant = None
+        if variant is not None:
+            files['artifact'] = REGISTRY.variant_path(version, variant['name'])
+            files['variant'] = variant['name']
+    return files
+
 def load_model():
     """
     Load the trained model and scaler from disk
     """
     try:
-        with open(MODEL_PATH, 'rb') as f:
-            model = pickle.load(f)
-        with open(SCALER_PATH, 'rb') as f:
-            scaler = pickle.load(f)
-        return model, scaler
+        return _read_model_files()
     except Exception as e:
         logger.error(f"Failed to load model or scaler: {str(e)}")
-        # Fallback: create dummy model and identity scaler
-        model = RandomForestClassifier()
-        scaler = StandardScaler()
-        return model, scaler
+        return _fallback_model()
+
+def _model_source_digest(files=None):
+    files = files or model_files()
+    return source_digest(files['model'], files['scaler'])
+
+def export_model_artifact(path=None):
+    """
+    Compile the served model and scaler pickles into the memory-mapped artifact
+    
+    Args:
+        path: artifact path (defaults to the artifact path of the served files)
+        
+    Returns:
+        Path of the written artifact
+    """
+    files = model_files()
+    path = path or files['artifact']
+    model, scaler = _read_model_pickles(files)
+    save_compiled(compile_forest(model, scaler), path, metadata={'source': _model_source_digest(files)})
+    logger.info(f"Exported model artifact to {path}")
+    return path
+
+def _fallback_model():
+    """Dummy model and identity scaler used when the model files cannot be loaded"""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+    model = RandomForestClassifier()
+    scaler = StandardScaler()
+    return model, scaler
+
+def _read_model_files(files=None):
+    """
+    Model and scaler from disk: the memory-mapped artifact when enabled
+    (returned as (CompiledForest, None)), else the pickles. A missing or stale
+    artifact is exported from the pickles first; when it cannot be written the
+    pickles are served. A reduced variant only exists as an artifact, so it is
+    mapped regardless of the setting.
+    
+    Args:
+        files: paths as returned by model_files() (defaults to the served files)
+    """
+    files = files or model_files()
+    artifact = files['artifact']
+    mmap = get_setting('MODEL_ARTIFACT_MMAP', False)
+    if (mmap or files.get('variant')) and os.path.exists(artifact):
+        try:
+            if read_artifact_metadata(artifact).get('source') == _model_source_digest(files):
+                return load_compiled(artifact), None
+            logger.warning(f"{artifact} was exported from other model files")
+        except Exception as e:
+            logger.warning(f"Cannot map {artifact}: {str(e)}")
+    model, scaler = _read_model_pickles(files)
+    if mmap and not files.get('variant'):
+        try:
+            # Atomic replace: concurrent workers building it at once are harmless
+            save_compiled(compile_forest(model, scaler), artifact, metadata={'source': _model_source_digest(files)})
+            logger.info(f"Exported model artifact to {artifact}")
+            return load_compiled(artifact), None
+        except Exception as e:
+            logger.warning(f"Cannot export {artifact}, serving the pickles: {str(e)}")
+    return model, scaler
+
+def _read_model_pickles(files=None):
+    files = files or model_files()
+    with open(files['model'], 'rb') as f:
+        model = pickle.load(f)
+    with open(files['scaler'], 'rb') as f:
+        scaler = pickle.load(f)
+    return model, scaler
+
+def load_model_tag(path=None):
+    """
+    Load the feature tag saved with the model
+    
+    Args:
+        path: tag file (defaults to the tag of the served files)
+    
+    Returns:
+        Dictionary with 'feature_set_version' and 'feature_names', or None for untagged models
+    """
+    try:
+        with open(path or model_files()['tag']) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Failed to load model tag: {str(e)}")
+        return None
+
+def load_cascade(path=None):
+    """
+    Load the cascade first stage saved with the model
+    
+    Args:
+        path: cascade file (defaults to the cascade of the served files)
+    
+    Returns:
+        Cascade, or None when the model has none
+    """
+    try:
+        return Cascade.load(path or model_files()['cascade'])
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Failed to load model cascade: {str(e)}")
+        return None
+
+def save_model_tag(path=MODEL_TAG_PATH):
+    """
+    Tag a freshly trained model with the active feature layout
+    """
+    from .audio_processor import feature_tag
+    with open(path, 'w') as f:
+        json.dump(feature_tag(), f, indent=2)
 
-# Global model and scaler instance (lazy loading)
+# Global model and scaler instance (lazy loading). Loads and hot reloads
+# replace them together under _MODEL_LOCK; readers take the (model, scaler)
+# pair from _LOADED in one read, so they never see a model with the other's scaler
 MODEL = None
 SCALER = None
+MODEL_TAG = None
+_LOADED = None
+_MODEL_LOCK = threading.Lock()
+
+# Load bookkeeping for hot reload and the readiness endpoint (see model_status)
+_LOADED_MTIMES = None
+_PENDING_MTIMES = None
+_LOAD_STATUS = {'loaded_at': None, 'reloads': 0, 'error': None, 'version': None, 'variant': None, 'model_path': None}
+
+# Incremented with every installed model; part of the prediction cache keys
+_GENERATION = 0
+_WATCHER = None
+
+# Shadow model scoring sampled predictions (see get_shadow_evaluator)
+_SHADOW = None
+
+# Dispatcher batching concurrent predict_emotion calls (see get_batcher)
+_BATCHER = None
+
+# Model feature columns per active feature layout, with the model tag they
+# were derived from (see get_feature_columns)
+_FEATURE_COLUMNS = {}
+
+# Compiled form of each loaded model and its scaler (see get_compiled_forest)
+_COMPILED = weakref.WeakKeyDictionary()
+
+# Cascade first stage trained with each loaded model (see get_cascade)
+_CASCADES = weakref.WeakKeyDictionary()
+
+# Rows scored with early exit and the trees they took (see _predict_forest)
+_EARLY_EXIT = {'rows': 0, 'trees': 0}
 
 def get_model():
     """
@@ -48,10 +250,308 @@ def get_model():
     Returns:
         The loaded emotion recognition model and scaler
     """
-    global MODEL, SCALER
-    if MODEL is None or SCALER is None:
-        MODEL, SCALER = load_model()
-    return MODEL, SCALER
+    loaded = _LOADED
+    if loaded is None:
+        with _MODEL_LOCK:
+            # Concurrent first requests wait for a single load
+            if _LOADED is None:
+                files = model_files()
+                mtimes = _model_file_mtimes(files)
+                error = None
+                cascade = None
+                tag = None
+                try:
+                    model, scaler = _read_model_files(files)
+                    tag = load_model_tag(files['tag'])
+                    # A model of another feature set would score the wrong features
+                    check_feature_set(tag)
+                    cascade = load_cascade(files['cascade'])
+                except Exception as e:
+                    logger.error(f"Failed to load model or scaler: {str(e)}")
+                    error = str(e)
+                    model, scaler = _fallback_model()
+                _install_model(model, scaler, tag, files, mtimes, error, cascade)
+            loaded = _LOADED
+    return loaded
+
+def _install_model(model, scaler, tag, files, mtimes, error=None, cascade=None):
+    """Make a loaded model current; the caller holds _MODEL_LOCK"""
+    global MODEL, SCALER, MODEL_TAG, _LOADED, _LOADED_MTIMES, _PENDING_MTIMES, _GENERATION
+    MODEL_TAG = tag
+    MODEL, SCALER = model, scaler
+    # Set before the model is published, so no reader sees it without its cascade
+    if cascade is not None:
+        _CASCADES[model] = cascade
+    else:
+        _CASCADES.pop(model, None)
+    _GENERATION += 1
+    _LOADED = (model, scaler)
+    clear_prediction_cache()
+    _LOADED_MTIMES = mtimes
+    _PENDING_MTIMES = None
+    _LOAD_STATUS.update(loaded_at=time.time(), error=error, version=files['version'],
+                        variant=files.get('variant'), model_path=files['model'])
+
+def _model_file_mtimes(files=None):
+    """Modification times of the registry pointer and the model, scaler, tag and cascade files (None when missing)"""
+    files = files or model_files()
+    mtimes = []
+    for path in (REGISTRY.active_path, files['model'], files['scaler'], files['tag'], files['cascade']):
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+def warm_up_model():
+    """
+    Load the model and run one prediction, so the first request pays neither
+    the unpickling nor the first-call costs (compilation, lazy imports)
+    
+    Returns:
+        The loaded model and scaler
+    """
+    model, scaler = get_model()
+    _warm_up(model, scaler)
+    return model, scaler
+
+def _warm_up(model, scaler):
+    try:
+        if isinstance(model, CompiledForest):
+            model.predict_proba(np.zeros((1, model.n_features)))
+            return
+        features = np.zeros((1, model.n_features_in_))
+        compiled = get_compiled_forest(model, scaler)
+        if compiled is not None:
+            compiled.predict_proba(features)
+        model.predict_proba(scaler.transform(features))
+    except Exception as e:
+        logger.warning(f"Model warm-up prediction failed: {str(e)}")
+
+def reload_model_if_changed():
+    """
+    Swap in the model files on disk when they changed since they were loaded
+    
+    Files must have stopped changing for one call (they are written one after
+    the other), and a model that fails to load or was trained on another
+    feature set leaves the current one in place.
+    Nothing happens before the first load.
+    
+    Returns:
+        True when a new model was swapped in
+    """
+    global _PENDING_MTIMES
+    if _LOADED is None:
+        return False
+    files = model_files()
+    mtimes = _model_file_mtimes(files)
+    if mtimes == _LOADED_MTIMES:
+        _PENDING_MTIMES = None
+        return False
+    if mtimes != _PENDING_MTIMES:
+        _PENDING_MTIMES = mtimes
+        return False
+    
+    try:
+        model, scaler = _read_model_files(files)
+        tag = load_model_tag(files['tag'])
+        check_feature_set(tag)
+        cascade = load_cascade(files['cascade'])
+    except Exception as e:
+        logger.error(f"Model files changed but could not be loaded, keeping the current model: {str(e)}")
+        return False
+    # Warm the new model before it receives traffic
+    _warm_up(model, scaler)
+    with _MODEL_LOCK:
+        _install_model(model, scaler, tag, files, mtimes, cascade=cascade)
+        _LOAD_STATUS['reloads'] += 1
+    logger.info(f"Reloaded model from {files['model']}")
+    return True
+
+def start_model_watcher(interval):
+    """
+    Poll the model files every `interval` seconds in a daemon thread and hot
+    reload them when they change (see reload_model_if_changed); one per process
+    """
+    global _WATCHER
+    if _WATCHER is not None:
+        return _WATCHER
+    
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                reload_model_if_changed()
+            except Exception:
+                logger.exception("Model watcher error")
+    
+    _WATCHER = threading.Thread(target=watch, name='model-watcher', daemon=True)
+    _WATCHER.start()
+    return _WATCHER
+
+def model_status():
+    """
+    Status of the served model, for the readiness probe (which only publishes
+    'ready', 'generation' and 'version') and the signed-in diagnostics endpoint
+    
+    Returns:
+        Dictionary with 'ready' (a fitted model is loaded), the model
+        generation, load time, reload count and the load error, if any
+    """
+    loaded = _LOADED
+    cascade = get_cascade(loaded[0]) if loaded is not None else None
+    return {
+        'ready': loaded is not None and _LOAD_STATUS['error'] is None,
+        'loaded': loaded is not None,
+        'generation': _GENERATION,
+        'model_type': loaded[0].__class__.__name__ if loaded is not None else None,
+        'loaded_at': _LOAD_STATUS['loaded_at'],
+        'reloads': _LOAD_STATUS['reloads'],
+        'error': _LOAD_STATUS['error'],
+        'version': _LOAD_STATUS['version'],
+        'variant': _LOAD_STATUS['variant'],
+        'model_path': _LOAD_STATUS['model_path'],
+        'shadow': _SHADOW.report() if _SHADOW is not None else None,
+        'prediction_cache': get_prediction_cache().stats() if get_prediction_cache() is not None else None,
+        'cascade': cascade.stats() if cascade is not None else None,
+        'early_exit_mean_trees': round(_EARLY_EXIT['trees'] / _EARLY_EXIT['rows'], 2) if _EARLY_EXIT['rows'] else None,
+    }
+
+def get_batcher():
+    """
+    Micro-batching dispatcher for predict_emotion, when settings.MODEL_MICROBATCH is set
+    
+    Returns:
+        MicroBatcher flushing at MODEL_MICROBATCH_MAX_SIZE rows or after
+        MODEL_MICROBATCH_MAX_WAIT_MS, or None
+    """
+    global _BATCHER
+    if not get_setting('MODEL_MICROBATCH', False):
+        return None
+    if _BATCHER is None:
+        with _MODEL_LOCK:
+            if _BATCHER is None:
+                _BATCHER = MicroBatcher(
+                    lambda features: _predict_proba(*get_model(), features),
+                    max_batch_size=get_setting('MODEL_MICROBATCH_MAX_SIZE', 32),
+                    max_wait_ms=get_setting('MODEL_MICROBATCH_MAX_WAIT_MS', 2.0),
+                )
+    return _BATCHER
+
+def get_shadow_evaluator():
+    """
+    Shadow evaluator of settings.MODEL_SHADOW_VERSION, scoring a
+    settings.MODEL_SHADOW_SAMPLE_RATE share of predictions in the background
+    
+    Returns:
+        ShadowEvaluator, or None when no shadow version is configured
+    """
+    global _SHADOW
+    version = get_setting('MODEL_SHADOW_VERSION', None)
+    if version is None:
+        return None
+    if _SHADOW is None or _SHADOW.version != version:
+        with _MODEL_LOCK:
+            if _SHADOW is None or _SHADOW.version != version:
+                _SHADOW = ShadowEvaluator(REGISTRY, version, get_setting('MODEL_SHADOW_SAMPLE_RATE', 0.1))
+    return _SHADOW
+
+def get_feature_columns():
+    """
+    Columns of the extracted feature vector the loaded model was trained on
+    
+    Returns:
+        Index array into the active feature vector, or None when the model
+        uses the active layout as is
+        
+    Raises:
+        ValueError: the model needs features the active feature families do
+            not compute, or was trained on another feature set (see check_feature_set)
+    """
+    from .audio_processor import FEATURES, canonical_sample_rate, vad_enabled
+    
+    tag = MODEL_TAG
+    active = FEATURES.feature_names()
+    key = (tuple(active), canonical_sample_rate(), vad_enabled())
+    cached = _FEATURE_COLUMNS.get(key)
+    if cached is not None and cached[0] is tag:
+        return cached[1]
+    
+    expected = check_feature_set(tag)
+    columns = None if expected == active else np.array([active.index(name) for name in expected])
+    _FEATURE_COLUMNS[key] = (tag, columns)
+    return columns
+
+def check_feature_set(tag):
+    """
+    Make sure the server extracts the features a model was trained on
+    
+    The model's feature-set version must equal the version of the same
+    families as extracted now (sample rate, voice activity gating, family
+    implementations). Untagged models were trained on the legacy feature set.
+    
+    Args:
+        tag: model tag (None for untagged models)
+    
+    Returns:
+        Names of the model's features, in the order it expects them
+    
+    Raises:
+        ValueError: the active feature families lack some of the model's
+            features, or they are extracted differently
+    """
+    from .audio_processor import FEATURES, feature_set_version, legacy_feature_set_version
+    
+    if tag is not None:
+        expected, version = tag['feature_names'], tag.get('feature_set_version')
+    else:
+        expected, version = FEATURES.feature_names(FEATURES.all_families()), legacy_feature_set_version()
+    active = FEATURES.feature_names()
+    missing = [name for name in expected if name not in active]
+    if missing:
+        raise ValueError(f"Model needs features the active feature set does not compute: {', '.join(missing)}")
+    
+    names = set(expected)
+    families = [family for family in FEATURES.all_families() if FEATURES.feature_names([family])[0] in names]
+    if version != feature_set_version(families):
+        raise ValueError(f"Model was trained on feature set {version}, the server extracts "
+                         f"{feature_set_version(families)}; retrain it with the current settings")
+    return expected
+
+def get_compiled_forest(model, scaler):
+    """
+    Flat-array compilation of a forest and its scaler, built once per model
+    (see compiled_forest.py)
+    
+    Returns:
+        CompiledForest, or None when compiled inference is disabled or the
+        model cannot be compiled (predictions then go through sklearn)
+    """
+    if not get_setting('MODEL_COMPILED_INFERENCE', False):
+        return None
+    try:
+        return _COMPILED[model]
+    except KeyError:
+        pass
+    compiled = None
+    try:
+        compiled = compile_forest(model, scaler)
+    except Exception as e:
+        logger.warning(f"Cannot compile the model, using sklearn inference: {str(e)}")
+    _COMPILED[model] = compiled
+    return compiled
+
+def get_cascade(model):
+    """
+    Cascade first stage of a loaded model
+    
+    Returns:
+        Cascade, or None when settings.MODEL_CASCADE is off or the model was
+        trained without one
+    """
+    if not get_setting('MODEL_CASCADE', False):
+        return None
+    return _CASCADES.get(model)
 
 def predict_emotion(features):
     """
@@ -65,21 +565,26 @@ def predict_emotion(features):
     """
     try:
         # Get the model and scaler
-        model, scaler = get_model()
-        
-        # Ensure features are in the right shape for the model
-        features = np.array(features).reshape(1, -1)
-        
-        # Normalize features using the scaler
-        features = scaler.transform(features)
+        with stage('model_load'):
+            model, scaler = get_model()
+            generation = _GENERATION
         
-        # Replace any NaN or Inf values
-        if np.isnan(features).any() or np.isinf(features).any():
-            logger.warning("Features contain NaN or Inf values, replacing with zeros")
-            features = np.nan_to_num(features)
+        # Repeated analyses of the same audio skip the model entirely
+        cache = get_prediction_cache()
+        key = cache.key(features, generation) if cache is not None else None
+        probabilities = cache.get(key) if cache is not None else None
         
-        # Get prediction probabilities
-        probabilities = model.predict_proba(features)[0]
+        if probabilities is None:
+            # Ensure features are in the right shape for the model; concurrent
+            # requests share one model call when micro-batching is enabled
+            batcher = get_batcher()
+            if batcher is not None:
+                with stage('model_batch'):
+                    probabilities = batcher.predict(features)
+            else:
+                probabilities = _predict_proba(model, scaler, np.asarray(features).reshape(1, -1))[0]
+            if cache is not None:
+                cache.put(key, probabilities)
         
         # Get the predicted class index and corresponding emotion
         predicted_class = np.argmax(probabilities)
@@ -107,6 +612,224 @@ def predict_emotion(features):
         
         return default_emotion, default_confidence, default_predictions
 
+def _predict_proba(model, scaler, features):
+    """
+    Class probabilities of a (samples, features) array of extracted feature
+    vectors, offered to the shadow model when one is configured
+    """
+    # CPU time of this thread, as profiling.stage measures it
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    probabilities = _predict_served(model, scaler, features)
+    shadow = get_shadow_evaluator()
+    if shadow is not None:
+        from .audio_processor import FEATURES
+        shadow.submit(FEATURES.feature_names(), features, probabilities, (time.perf_counter() - start) * 1000,
+                      (time.thread_time() - cpu_start) * 1000)
+    return probabilities
+
+def _predict_served(model, scaler, features):
+    """
+    Class probabilities of the served model.
+    No copy and no dtype change: float32 features stay float32 through the
+    scaler, and the forest evaluates in float32 anyway.
+    """
+    # A model trained on a subset of the active features sees only its own columns
+    columns = get_feature_columns()
+    if columns is not None:
+        features = features[:, columns]
+    
+    # Confident rows are answered by the linear first stage, the rest by the forest
+    cascade = get_cascade(model)
+    if cascade is not None:
+        with stage('model_cascade'):
+            return cascade.predict_proba(features, lambda rows: _predict_forest(model, scaler, rows))
+    return _predict_forest(model, scaler, features)
+
+def _predict_forest(model, scaler, features):
+    """Class probabilities of the forest for features in the model's column layout"""
+    # The compiled forest has the scaler folded in and gives the same
+    # probabilities (NaN features included, infinities raise like the scaler)
+    if isinstance(model, CompiledForest):
+        compiled = model
+    else:
+        compiled = get_compiled_forest(model, scaler)
+    if compiled is not None:
+        if np.isnan(features).any():
+            logger.warning("Features contain NaN values, replacing with zeros")
+        with stage('model'):
+            if not get_setting('MODEL_EARLY_EXIT', False):
+                return compiled.predict_proba(features)
+            # Stops per row once the top class is settled, see predict_proba_early_exit
+            probabilities, trees = compiled.predict_proba_early_exit(
+                features,
+                chunk_size=get_setting('MODEL_EARLY_EXIT_CHUNK', DEFAULT_EXIT_CHUNK),
+                confidence=get_setting('MODEL_EARLY_EXIT_CONFIDENCE', None),
+            )
+            _EARLY_EXIT['rows'] += len(trees)
+            _EARLY_EXIT['trees'] += int(trees.sum())
+            return probabilities
+    
+    # Normalize features using the scaler
+    with stage('scaler'):
+        features = scaler.transform(features)
+    
+    # Replace any NaN or Inf values
+    if np.isnan(features).any() or np.isinf(features).any():
+        logger.warning("Features contain NaN or Inf values, replacing with zeros")
+        features = np.nan_to_num(features)
+    
+    # Get prediction probabilities
+    with stage('model'):
+        return model.predict_proba(features)
+
+def predict_emotion_batch(features_matrix):
+    """
+    Predict emotions for many feature vectors with one scaler and one model call
+    
+    Args:
+        features_matrix: (samples, features) array of audio features; rows of
+            failed extractions must be left out (NaN values are zeroed)
+        
+    Returns:
+        Tuple of (labels, confidences, probabilities): arrays of length
+        samples, and a (samples, classes) array with columns in EMOTIONS order
+    """
+    with stage('model_load'):
+        model, scaler = get_model()
+        generation = _GENERATION
+    
+    features_matrix = np.asarray(features_matrix)
+    if len(features_matrix) == 0:
+        return np.array([], dtype=object), np.zeros(0), np.zeros((0, len(EMOTIONS)))
+    features_matrix = features_matrix.reshape(len(features_matrix), -1)
+    
+    cache = get_prediction_cache()
+    if cache is None:
+        probabilities = _predict_proba(model, scaler, features_matrix)
+    else:
+        # Only the rows missing from the cache go to the model
+        keys = [cache.key(row, generation) for row in features_matrix]
+        cached = [cache.get(key) for key in keys]
+        missing = [i for i, row in enumerate(cached) if row is None]
+        if missing:
+            computed = _predict_proba(model, scaler, features_matrix[missing])
+            for i, row in zip(missing, computed):
+                cached[i] = row
+                cache.put(keys[i], row)
+        probabilities = np.array(cached)
+    predicted = np.argmax(probabilities, axis=1)
+    labels = np.array(EMOTIONS, dtype=object)[predicted]
+    confidences = probabilities[np.arange(len(predicted)), predicted].astype(np.float64)
+    return labels, confidences, probabilities
+
+def predict_emotion_progressive(file_path, stats=None):
+    """
+    Predict the emotion of a recording from growing prefixes of it (see
+    audio_processor.extract_features_progressive), stopping once the last
+    settings.PROGRESSIVE_STABLE_STEPS predictions agree and the latest has at
+    least settings.PROGRESSIVE_MIN_CONFIDENCE
+    
+    Args:
+        file_path: Path to the audio file
+        stats: optional dictionary that receives 'audio_seconds' (audio
+            analysed), 'duration' (of the file; both None when unknown) and 'steps'
+        
+    Returns:
+        Tuple of (emotion_label, confidence_score, all_predictions) as predict_emotion
+    """
+    from .audio_processor import extract_features_progressive
+    
+    stable_steps = get_setting('PROGRESSIVE_STABLE_STEPS', 3)
+    min_confidence = get_setting('PROGRESSIVE_MIN_CONFIDENCE', 0.3)
+    start_seconds = get_setting('PROGRESSIVE_START_SECONDS', 2.0)
+    # A file no longer than the prefix that could first settle the prediction is analysed whole
+    steps = extract_features_progressive(file_path, start_seconds, min_seconds=start_seconds * 2 ** (stable_steps - 1))
+    labels = []
+    for step, (seconds, duration, features) in enumerate(steps, 1):
+        emotion, confidence, all_predictions = predict_emotion(features)
+        labels.append(emotion)
+        if stats is not None:
+            stats.update(audio_seconds=seconds, duration=duration, steps=step)
+        if len(labels) >= stable_steps and len(set(labels[-stable_steps:])) == 1 and confidence >= min_confidence:
+            break
+    steps.close()
+    
+    if duration and seconds < duration:
+        logger.info(f"Progressive prediction settled on {emotion} after {seconds:.1f}s of {duration:.1f}s")
+    return emotion, confidence, all_predictions
+
+def analyze_audio_file(file_path, stats=None):
+    """
+    Emotion of an uploaded recording, from growing prefixes when
+    settings.PROGRESSIVE_INFERENCE is set, else from the whole file
+    
+    Args:
+        file_path: Path to the audio file
+        stats: optional dictionary that receives 'audio_seconds' and
+            'duration' (see predict_emotion_progressive; both equal for whole files)
+        
+    Returns:
+        Tuple of (emotion_label, confidence_score, all_predictions) as predict_emotion
+    """
+    if get_setting('PROGRESSIVE_INFERENCE', False):
+        return predict_emotion_progressive(file_path, stats)
+    
+    from .audio_processor import process_audio_file
+    features = process_audio_file(file_path)
+    if stats is not None:
+        try:
+            import soundfile as sf
+            stats['audio_seconds'] = stats['duration'] = sf.info(file_path).duration
+        except Exception:
+            stats['audio_seconds'] = stats['duration'] = None
+    return predict_emotion(features)
+
+def predict_emotion_timeline(features, segments, voiced):
+    """
+    Predict the emotion of every window of a timeline in one batched call
+    
+    Args:
+        features: (windows, features) array from audio_processor.extract_timeline_features
+        segments: (windows, 2) array of window start/end times in seconds
+        voiced: boolean mask of the windows holding speech
+        
+    Returns:
+        List with one dictionary per window: 'start', 'end', 'emotion',
+        'confidence' and 'predictions' (emotion None and no predictions for
+        windows without speech)
+    """
+    labels, confidences, probabilities = predict_emotion_batch(np.asarray(features)[voiced])
+    
+    timeline = []
+    voiced_rows = iter(zip(labels, confidences, probabilities))
+    for (start, end), has_speech in zip(segments, voiced):
+        window = {'start': round(float(start), 3), 'end': round(float(end), 3),
+                  'emotion': None, 'confidence': None, 'predictions': None}
+        if has_speech:
+            label, confidence, row = next(voiced_rows)
+            window['emotion'] = label
+            window['confidence'] = float(confidence)
+            window['predictions'] = {emotion: float(prob) for emotion, prob in zip(EMOTIONS, row)}
+        timeline.append(window)
+    return timeline
+
+def summarize_timeline(timeline):
+    """
+    Overall prediction of a timeline: the mean probabilities of its windows with speech
+    
+    Returns:
+        Tuple of (emotion_label, confidence_score, all_predictions), as predict_emotion
+        
+    Raises:
+        ValueError: no window holds speech
+    """
+    windows = [window['predictions'] for window in timeline if window['predictions'] is not None]
+    if not windows:
+        raise ValueError("No speech found in the recording")
+    all_predictions = {emotion: float(np.mean([window[emotion] for window in windows])) for emotion in windows[0]}
+    emotion = max(all_predictions, key=all_predictions.get)
+    return emotion, all_predictions[emotion], all_predictions
+
 def create_new_model():
     """
     Create a new model for emotion recognition when loading fails
@@ -115,6 +838,7 @@ def create_new_model():
         Newly created model
     """
     logger.info("Creating new RandomForest model for emotion classification")
+    from sklearn.ensemble import RandomForestClassifier
     
     # Create a RandomForest model with better parameters for emotion classification
     model = RandomForestClassifier(
@@ -125,10 +849,17 @@ def create_new_model():
         random_state=42
     )
     
-    # Number of features we extract in audio_processor.py
-    # 2 stats (mean, std) for 7 audio features (ZCR, 13 MFCCs, RMS, centroid, bandwidth, rolloff, chroma)
-    # Total: 2 * (1 + 13 + 1 + 1 + 1 + 1 + 1) = 38 features
-    num_features = 38
+    # Layout of the active feature families (see audio_processor.FEATURES)
+    from .audio_processor import FEATURES
+    num_features = FEATURES.width()
+    columns = FEATURES.slices()
+    
+    def pattern(names, low, spread):
+        """Raise the features of the named families that are active"""
+        for name in names:
+            if name in columns:
+                width = columns[name].stop - columns[name].start
+                features[columns[name]] = low + np.random.rand(width) * spread
     
     # Generate diverse training examples to help with generalization
     X_dummy = np.zeros((700, num_features))
@@ -142,14 +873,14 @@ def create_new_model():
             
             # Add some emotion-specific patterns
             if emotion == 'angry':
-                features[0:2] = 0.7 + np.random.rand(2) * 0.3  # Higher ZCR
-                features[30:34] = 0.8 + np.random.rand(4) * 0.2  # Higher spectral features
+                pattern(['zcr'], 0.7, 0.3)  # Higher ZCR
+                pattern(['centroid', 'bandwidth'], 0.8, 0.2)  # Higher spectral features
             elif emotion == 'happy':
-                features[26:30] = 0.6 + np.random.rand(4) * 0.4  # Higher energy
-                features[4:8] = 0.7 + np.random.rand(4) * 0.3  # Higher mid MFCCs
+                pattern(['rms'], 0.6, 0.4)  # Higher energy
+                pattern(['mfcc'], 0.7, 0.3)  # Higher MFCCs
             elif emotion == 'sad':
-                features[26:30] = 0.1 + np.random.rand(4) * 0.3  # Lower energy
-                features[0:2] = 0.1 + np.random.rand(2) * 0.2  # Lower ZCR
+                pattern(['rms'], 0.1, 0.3)  # Lower energy
+                pattern(['zcr'], 0.1, 0.2)  # Lower ZCR
             # Add noise to make features realistic
             features += np.random.randn(num_features) * 0.05
             
@@ -170,6 +901,7 @@ def create_new_model():
     try:
         with open(MODEL_PATH, 'wb') as f:
             pickle.dump(model, f)
+        save_model_tag()
         logger.info(f"Saved new model to {MODEL_PATH}")
     except Exception as e:
         logger.error(f"Failed to save new model: {str(e)}")
@@ -184,6 +916,15 @@ def get_model_info():
         Dictionary with model information
     """
     model, _ = get_model()
+    tag = MODEL_TAG
+    
+    if tag is not None:
+        feature_names = tag['feature_names']
+        feature_set = tag.get('feature_set_version')
+    else:
+        from .audio_processor import FEATURES, legacy_feature_set_version
+        feature_names = FEATURES.feature_names(FEATURES.all_families())
+        feature_set = legacy_feature_set_version()
     
     if hasattr(model, 'n_estimators'):
         n_estimators = model.n_estimators
@@ -201,5 +942,8 @@ def get_model_info():
         'n_classes': len(EMOTIONS),
         'emotions': EMOTIONS,
         'feature_importances': feature_importances,
-        'model_path': MODEL_PATH
+        'feature_names': feature_names,
+        'feature_set_version': feature_set,
+        'version': _LOAD_STATUS['version'],
+        'model_path': _LOAD_STATUS['model_path'],
     }
\ No newline at end of file
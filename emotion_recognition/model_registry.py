@@ -0,0 +1,411 @@
+"""
+Versioned model bundles under settings.MODEL_DIR/registry.
+
+Every registered version is a directory holding the model and scaler pickles,
+the feature tag, the memory-mapped compiled artifact, an optional cascade
+first stage (see cascade.py), optional reduced variants (fewer trees and/or a
+depth cap) and a manifest with the feature-set version, training metrics,
+measured inference latency and each variant's accuracy, latency and size:
+
+    registry/
+        ACTIVE              name of the version being served
+        v0001/manifest.json, emotion_model.pkl, scaler.pkl, emotion_model.json, emotion_model.forest, cascade.json
+        v0001/variants/t50-d12.forest, ...
+        v0002/...
+
+Bundles are written to a temporary directory and renamed into place, and the
+ACTIVE pointer is replaced with os.replace, so readers never see a partial
+bundle or pointer. ml_model serves the active version (falling back to the
+fixed model files while nothing is active) and its hot reload watcher picks
+up pointer changes. With settings.MODEL_LATENCY_BUDGET_MS it serves the
+variant select_variant picks for the budget instead of the full forest.
+
+ShadowEvaluator scores a sampled share of live predictions with a second
+version in a background thread, to compare it with the served model before
+promotion.
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import random
+import pickle
+import shutil
+import logging
+import tempfile
+import threading
+import numpy as np
+
+from .compiled_forest import compile_forest, load_compiled, save_compiled, source_digest
+from .profiling import StageHistogram
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_FILE = 'ACTIVE'
+MANIFEST_FILE = 'manifest.json'
+
+# File names inside a version directory
+BUNDLE_FILES = {
+    'model': 'emotion_model.pkl',
+    'scaler': 'scaler.pkl',
+    'tag': 'emotion_model.json',
+    'artifact': 'emotion_model.forest',
+    'cascade': 'cascade.json',
+}
+
+VERSION_PATTERN = re.compile(r'^v(\d+)$')
+
+# Directory of the reduced variant artifacts inside a version directory
+VARIANTS_DIR = 'variants'
+
+# Timed single-row predictions when measuring a bundle's inference latency
+# (enough for a stable p99)
+LATENCY_RUNS = 200
+
+class ModelRegistry:
+    """
+    Model versions stored under one root directory
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    @property
+    def active_path(self):
+        return os.path.join(self.root, ACTIVE_FILE)
+
+    def versions(self):
+        """Registered version names, oldest first"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        versions = [name for name in names
+                    if VERSION_PATTERN.match(name) and os.path.isfile(os.path.join(self.root, name, MANIFEST_FILE))]
+        return sorted(versions, key=lambda name: int(VERSION_PATTERN.match(name).group(1)))
+
+    def paths(self, version):
+        """Dictionary of the bundle file paths of a version, plus 'version' itself"""
+        directory = os.path.join(self.root, version)
+        paths = {key: os.path.join(directory, name) for key, name in BUNDLE_FILES.items()}
+        paths['version'] = version
+        paths['variant'] = None
+        return paths
+
+    def variant_path(self, version, name):
+        """Artifact path of a reduced variant of a version"""
+        return os.path.join(self.root, version, VARIANTS_DIR, name + '.forest')
+
+    def manifest(self, version):
+        with open(os.path.join(self.root, version, MANIFEST_FILE)) as f:
+            return json.load(f)
+
+    def active_version(self):
+        """Name of the served version, or None when nothing was activated"""
+        try:
+            with open(self.active_path) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version or None
+
+    def activate(self, version):
+        """
+        Atomically make `version` the served version
+
+        Raises:
+            ValueError: the version is not registered
+        """
+        if version not in self.versions():
+            raise ValueError(f"Unknown model version: {version}")
+        os.makedirs(self.root, exist_ok=True)
+        _write_atomic(self.active_path, version + '\n')
+        logger.info(f"Activated model version {version}")
+
+    def register(self, model, scaler, tag=None, metrics=None, activate=False, variants=None, cascade=None):
+        """
+        Store a trained model and its scaler as a new version
+
+        Args:
+            model: fitted RandomForestClassifier
+            scaler: fitted StandardScaler the model was trained behind
+            tag: feature tag of the training features (audio_processor.feature_tag())
+            metrics: JSON-serialisable training/evaluation metrics
+            activate: make the new version the served one
+            variants: reduced variants to store next to the full forest, as
+                dictionaries with 'n_trees' and 'max_depth' (None for no limit)
+                plus any held-out metrics such as 'accuracy'
+            cascade: cascade.Cascade trained for the model, or None
+
+        Returns:
+            Name of the new version
+        """
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.root, prefix='.staging-')
+        try:
+            paths = {key: os.path.join(staging, name) for key, name in BUNDLE_FILES.items()}
+            with open(paths['model'], 'wb') as f:
+                pickle.dump(model, f)
+            with open(paths['scaler'], 'wb') as f:
+                pickle.dump(scaler, f)
+            if tag is not None:
+                with open(paths['tag'], 'w') as f:
+                    json.dump(tag, f, indent=2)
+            compiled = compile_forest(model, scaler)
+            save_compiled(compiled, paths['artifact'],
+                          metadata={'source': source_digest(paths['model'], paths['scaler'])})
+            manifest = {
+                'created_at': time.time(),
+                'model_type': model.__class__.__name__,
+                'n_estimators': getattr(model, 'n_estimators', None),
+                'feature_set_version': (tag or {}).get('feature_set_version'),
+                'metrics': metrics or {},
+                'latency': measure_latency(compiled),
+                'size_bytes': os.path.getsize(paths['artifact']),
+                'variants': [],
+                'cascade': None,
+            }
+            if cascade is not None:
+                cascade.save(paths['cascade'])
+                manifest['cascade'] = dict(cascade.metrics, threshold=cascade.threshold)
+            if variants:
+                os.makedirs(os.path.join(staging, VARIANTS_DIR))
+                source = source_digest(paths['model'], paths['scaler'])
+                for spec in variants:
+                    manifest['variants'].append(self._save_variant(staging, compiled, spec, source))
+            os.chmod(staging, 0o755)
+            version = self._publish(staging, manifest)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        logger.info(f"Registered model version {version}")
+        if activate:
+            self.activate(version)
+        return version
+
+    def _save_variant(self, directory, compiled, spec, source):
+        """Write one reduced variant into a (staged) version directory and describe it"""
+        reduced = compiled.reduced(spec.get('n_trees'), spec.get('max_depth'))
+        name = variant_name(spec.get('n_trees'), spec.get('max_depth'))
+        path = os.path.join(directory, VARIANTS_DIR, name + '.forest')
+        save_compiled(reduced, path, metadata={'source': source, 'variant': name})
+        description = dict(spec)
+        description.update(name=name, **measure_latency(reduced), size_bytes=os.path.getsize(path))
+        return description
+
+    def _publish(self, staging, manifest):
+        """Rename the staged bundle to the next free version name"""
+        existing = self.versions()
+        number = int(VERSION_PATTERN.match(existing[-1]).group(1)) if existing else 0
+        while True:
+            number += 1
+            version = f'v{number:04d}'
+            manifest['version'] = version
+            with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            try:
+                # Fails when a concurrent registration took the name first
+                os.rename(staging, os.path.join(self.root, version))
+                return version
+            except OSError:
+                if not os.path.exists(os.path.join(self.root, version)):
+                    raise
+
+def measure_latency(compiled, runs=LATENCY_RUNS):
+    """
+    Inference latency of a compiled forest on synthetic rows
+
+    Returns:
+        Dictionary with the p50 and p99 single-row latency and the per-row
+        latency of a batch of 100, in ms
+    """
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(runs, 1, compiled.n_features))
+    batch = rng.normal(size=(100, compiled.n_features))
+    compiled.predict_proba(rows[0])
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        compiled.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    compiled.predict_proba(batch)
+    batch_ms = (time.perf_counter() - start) * 1000 / len(batch)
+    p50, p99 = np.percentile(timings, [50, 99]) * 1000
+    return {'p50_ms': round(float(p50), 4), 'p99_ms': round(float(p99), 4), 'batch_ms_per_row': round(batch_ms, 4)}
+
+def variant_name(n_trees=None, max_depth=None):
+    """Name of a reduced variant, e.g. 't50-d12' (a missing part is unlimited)"""
+    parts = ([f't{n_trees}'] if n_trees else []) + ([f'd{max_depth}'] if max_depth else [])
+    return '-'.join(parts) or 'full'
+
+def select_variant(manifest, budget_ms):
+    """
+    Variant of a version to serve under a p99 single-row latency budget
+
+    The most accurate forest (the full one or a variant) whose p99 fits the
+    budget wins, the smallest among equally accurate ones; when none fits,
+    the fastest variant is served.
+
+    Args:
+        manifest: version manifest written by ModelRegistry.register
+        budget_ms: p99 latency budget in ms
+
+    Returns:
+        Variant description from the manifest, or None for the full forest
+    """
+    candidates = [dict(manifest.get('latency', {}), name=None, accuracy=manifest.get('metrics', {}).get('accuracy'),
+                       size_bytes=manifest.get('size_bytes'))]
+    candidates += manifest.get('variants', [])
+    fitting = [candidate for candidate in candidates
+               if candidate.get('p99_ms') is not None and candidate['p99_ms'] <= budget_ms]
+    if fitting:
+        best = max(fitting, key=lambda candidate: (candidate.get('accuracy') or 0.0, -(candidate.get('size_bytes') or 0)))
+    else:
+        timed = [candidate for candidate in candidates if candidate.get('p99_ms') is not None]
+        if not timed:
+            return None
+        best = min(timed, key=lambda candidate: candidate['p99_ms'])
+        logger.warning(f"No variant of {manifest.get('version')} meets the {budget_ms} ms budget, "
+                       f"serving the fastest ({best['name'] or 'full'}, p99 {best['p99_ms']} ms)")
+    return best if best['name'] is not None else None
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+class ShadowEvaluator:
+    """
+    Scores sampled live predictions with a shadow model version in a daemon
+    thread. The request thread only enqueues (dropping the sample when the
+    queue is full), so the user-facing response never waits for the shadow.
+    """
+
+    def __init__(self, registry, version, sample_rate, queue_size=256):
+        self.registry = registry
+        self.version = version
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._model = None
+        self._columns = {}
+        self.error = None
+        self.sampled = 0
+        self.dropped = 0
+        self.scored = 0
+        self.agreements = 0
+        self.abs_diff_total = 0.0
+        self.primary_latency = StageHistogram()
+        self.shadow_latency = StageHistogram()
+
+    def submit(self, feature_names, features, probabilities, primary_ms, primary_cpu_ms):
+        """
+        Offer one prediction to the shadow (sampled at sample_rate)
+
+        Args:
+            feature_names: names of the columns of features (the active layout)
+            features: (rows, features) array the served model scored
+            probabilities: (rows, classes) probabilities of the served model
+            primary_ms: wall time the served model took
+            primary_cpu_ms: CPU time of the request thread during it
+        """
+        if self.error is not None or random.random() >= self.sample_rate:
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((tuple(feature_names), np.array(features), np.array(probabilities),
+                                    primary_ms, primary_cpu_ms))
+            with self._lock:
+                self.sampled += 1
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def report(self):
+        """Agreement and latency of the shadow against the served model"""
+        with self._lock:
+            report = {
+                'version': self.version,
+                'sample_rate': self.sample_rate,
+                'sampled': self.sampled,
+                'dropped': self.dropped,
+                'scored': self.scored,
+                'error': self.error,
+            }
+            if self.scored:
+                report['agreement'] = round(self.agreements / self.scored, 4)
+                report['mean_abs_probability_diff'] = round(self.abs_diff_total / self.scored, 4)
+                report['primary_latency'] = self.primary_latency.summary()
+                report['shadow_latency'] = self.shadow_latency.summary()
+        return report
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='model-shadow', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        try:
+            self._load()
+        except Exception as e:
+            logger.error(f"Cannot load shadow model {self.version}: {str(e)}")
+            self.error = str(e)
+        while True:
+            sample = self._queue.get()
+            try:
+                if self.error is None:
+                    self._score(*sample)
+            except Exception as e:
+                logger.warning(f"Shadow model {self.version} failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Wait until every submitted sample was scored (for tests and benchmarks)"""
+        self._queue.join()
+
+    def _load(self):
+        paths = self.registry.paths(self.version)
+        try:
+            self._model = load_compiled(paths['artifact'])
+        except Exception:
+            with open(paths['model'], 'rb') as f:
+                model = pickle.load(f)
+            with open(paths['scaler'], 'rb') as f:
+                scaler = pickle.load(f)
+            self._model = compile_forest(model, scaler)
+        try:
+            with open(paths['tag']) as f:
+                self._feature_names = json.load(f)['feature_names']
+        except FileNotFoundError:
+            self._feature_names = None
+
+    def _score(self, feature_names, features, probabilities, primary_ms, primary_cpu_ms):
+        columns = self._columns.get(feature_names)
+        if columns is None:
+            expected = self._feature_names or list(feature_names)
+            columns = self._columns[feature_names] = np.array([feature_names.index(name) for name in expected])
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        shadow = self._model.predict_proba(features[:, columns])
+        shadow_ms = (time.perf_counter() - start) * 1000
+        shadow_cpu_ms = (time.thread_time() - cpu_start) * 1000
+        agree = int(np.sum(np.argmax(shadow, axis=1) == np.argmax(probabilities, axis=1)))
+        diff = float(np.abs(shadow - probabilities).sum(axis=1).mean()) if shadow.shape == probabilities.shape else 0.0
+        with self._lock:
+            self.scored += len(features)
+            self.agreements += agree
+            self.abs_diff_total += diff * len(features)
+            self.primary_latency.add(primary_ms, primary_cpu_ms)
+            self.shadow_latency.add(shadow_ms, shadow_cpu_ms)
@@ -0,0 +1,117 @@
+"""
+In-process LRU cache of model predictions.
+
+Re-analysing a sample or re-uploading a clip produces the same feature
+vector, so the class probabilities are cached under a hash of the vector's
+bytes (rounded, so float noise in the last bits still hits) and the model
+generation. ml_model bumps the generation and clears the cache whenever it
+installs a model, so entries never outlive the model that computed them.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .utils import get_setting
+
+# Defaults, overridable from Django settings
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_DECIMALS = 6
+
+class PredictionCache:
+    """
+    Bounded LRU mapping of feature vectors to class probabilities
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, decimals=DEFAULT_DECIMALS):
+        self.max_entries = max_entries
+        self.decimals = decimals
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, features, generation):
+        """
+        Cache key of one feature vector under a model generation
+
+        Args:
+            features: 1-D feature vector
+            generation: identifier of the loaded model
+        """
+        # Adding 0.0 turns -0.0 into 0.0 so both hash alike
+        rounded = np.round(np.asarray(features, dtype=np.float64), self.decimals) + 0.0
+        return (generation, hashlib.blake2b(rounded.tobytes(), digest_size=16).digest())
+
+    def get(self, key):
+        """Cached probabilities for key (read-only array), or None"""
+        with self._lock:
+            probabilities = self._entries.get(key)
+            if probabilities is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return probabilities
+
+    def put(self, key, probabilities):
+        """Store probabilities for key, evicting the least recently used entries"""
+        probabilities = np.array(probabilities, dtype=np.float64)
+        probabilities.setflags(write=False)
+        with self._lock:
+            self._entries[key] = probabilities
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+# Process-wide cache instance (lazy)
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_prediction_cache():
+    """
+    Get the process-wide prediction cache
+
+    Returns:
+        PredictionCache instance, or None when settings.PREDICTION_CACHE_ENABLED is off
+    """
+    global _CACHE
+    if not get_setting('PREDICTION_CACHE_ENABLED', False):
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = PredictionCache(
+                    get_setting('PREDICTION_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+                    get_setting('PREDICTION_CACHE_DECIMALS', DEFAULT_DECIMALS),
+                )
+    return _CACHE
+
+def clear_prediction_cache():
+    """Drop every cached prediction (the model changed)"""
+    if _CACHE is not None:
+        _CACHE.clear()
@@ -0,0 +1,165 @@
+"""
+Lightweight per-stage timing for the analysis pipeline.
+
+Code under measurement wraps each step in `with stage('decode'):`. Every
+stage records its wall time and the CPU time of the running thread into a
+process-wide histogram registry, and into the trace of the current request
+when one is active (see trace()). Views decorated with traced_view add the
+request trace and a registry summary to their JSON when the client sends
+the X-Debug-Timings header.
+"""
+
+import json
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.http import JsonResponse
+
+from .utils import get_setting
+
+# Request header (as found in request.META) that asks for timings in the JSON response
+DEBUG_HEADER = 'HTTP_X_DEBUG_TIMINGS'
+
+# Upper bounds of the histogram buckets in milliseconds (log spaced); slower
+# samples go to a final overflow bucket
+BUCKET_BOUNDS_MS = [0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+class StageHistogram:
+    """
+    Wall and CPU time distribution of one stage
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.wall_total = 0.0
+        self.cpu_total = 0.0
+        self.wall_max = 0.0
+
+    def add(self, wall_ms, cpu_ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, wall_ms)] += 1
+        self.count += 1
+        self.wall_total += wall_ms
+        self.cpu_total += cpu_ms
+        self.wall_max = max(self.wall_max, wall_ms)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile wall time (ms)"""
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKET_BOUNDS_MS + [self.wall_max], self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.wall_max)
+        return self.wall_max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'wall_mean_ms': round(self.wall_total / self.count, 3),
+            'cpu_mean_ms': round(self.cpu_total / self.count, 3),
+            'wall_p50_ms': self.percentile(50),
+            'wall_p95_ms': self.percentile(95),
+            'wall_p99_ms': self.percentile(99),
+            'wall_max_ms': round(self.wall_max, 3),
+        }
+
+class TimingRegistry:
+    """
+    Process-wide histograms keyed by stage name
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, wall_ms, cpu_ms):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = StageHistogram()
+            histogram.add(wall_ms, cpu_ms)
+
+    def snapshot(self):
+        """Summary statistics of every stage seen so far"""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self._histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+REGISTRY = TimingRegistry()
+
+# Stage timings of the request being handled, when it is traced
+_current_trace = ContextVar('analysis_trace', default=None)
+
+def profiling_enabled():
+    return get_setting('PROFILING_ENABLED', True)
+
+@contextmanager
+def stage(name):
+    """
+    Time the enclosed block as stage `name`
+
+    Args:
+        name: stage name; nested stages use dotted names (e.g. 'feature.mfcc')
+    """
+    if not profiling_enabled():
+        yield
+        return
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield
+    finally:
+        wall_ms = (time.perf_counter() - wall_start) * 1000
+        cpu_ms = (time.thread_time() - cpu_start) * 1000
+        REGISTRY.record(name, wall_ms, cpu_ms)
+        trace_list = _current_trace.get()
+        if trace_list is not None:
+            trace_list.append({'stage': name, 'wall_ms': round(wall_ms, 3), 'cpu_ms': round(cpu_ms, 3)})
+
+@contextmanager
+def trace():
+    """
+    Collect the stages timed in the enclosed block
+
+    Yields:
+        List that receives one {'stage', 'wall_ms', 'cpu_ms'} entry per finished stage
+    """
+    stages = []
+    token = _current_trace.set(stages)
+    try:
+        yield stages
+    finally:
+        _current_trace.reset(token)
+
+def debug_requested(request):
+    """Whether the client asked for timings in the response"""
+    return request.META.get(DEBUG_HEADER, '').lower() in ('1', 'true', 'yes')
+
+def timing_report(stages):
+    """JSON-serialisable timings of one request plus the registry summary"""
+    return {'request': stages, 'registry': REGISTRY.snapshot()}
+
+def traced_view(view):
+    """
+    Trace the stages of a view; when the debug header is set, add the timing
+    report to its JsonResponse under 'timings'
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with trace() as stages:
+            with stage('request'):
+                response = view(request, *args, **kwargs)
+        if debug_requested(request) and isinstance(response, JsonResponse):
+            data = json.loads(response.content)
+            data['timings'] = timing_report(stages)
+            response.content = json.dumps(data)
+        return response
+    return wrapper
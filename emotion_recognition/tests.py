@@ -1,9 +1,35 @@
-from django.test import TestCase
+from django.test import TestCase, SimpleTestCase, RequestFactory, override_settings
+from django.http import JsonResponse
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from .models import AudioRecord, EmotionResult
+from . import audio_processor, ml_model, prediction_cache
+from .audio_processor import (
+    HOP_LENGTH, compute_frame_features, compute_speech_frame_features, extract_features, extract_features_batch,
+    extract_features_streaming, extract_timeline_features, feature_set_version, feature_tag, get_feature_names,
+    process_audio_file, read_wav_mmap, resample_to_canonical, speech_frame_mask, summarize_features
+)
+from .batching import MicroBatcher
+from .cascade import Cascade, calibrate_threshold, top_margin, train_cascade
+from .compiled_forest import CompiledForest, compile_forest
+from .feature_cache import FeatureCache
+from .model_registry import ModelRegistry, ShadowEvaluator, select_variant
+from .ml_model import check_feature_set, get_feature_columns, get_model, predict_emotion, predict_emotion_batch
+from .profiling import stage, trace, traced_view
+import io
+import json
+import time
+import pickle
 import tempfile
+import threading
+import subprocess
+import sys
 import os
+from unittest import mock
+import librosa
+import numpy as np
+import soundfile as sf
 
 
 class EmotionRecognitionTests(TestCase):
@@ -61,3 +87,591 @@ class EmotionRecognitionTests(TestCase):
         self.client.login(username='testuser', password='testpassword')
         response = self.client.get(reverse('emotion_recognition:dashboard'))
         self.assertEqual(response.status_code, 200)
+    
+    def test_reanalyze_reports_failed_recordings(self):
+        # The test recording is an empty file
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('reanalyze_recordings', dry_run=True, stdout=stdout, stderr=stderr)
+        self.assertIn(f"Recording {self.audio_record.id} ", stderr.getvalue())
+        self.assertIn("1 could not be analysed", stdout.getvalue())
+    
+    def test_model_diagnostics_require_login(self):
+        # The public probe tells only whether a model is served, and which
+        response = self.client.get(reverse('emotion_recognition:readiness'))
+        self.assertEqual(set(response.json()), {'ready', 'generation', 'version'})
+        diagnostics = reverse('emotion_recognition:model_diagnostics')
+        self.assertEqual(self.client.get(diagnostics).status_code, 302)
+        self.client.login(username='testuser', password='testpassword')
+        self.assertIn('model_path', self.client.get(diagnostics).json())
+
+
+@override_settings(VISUALIZATION_CACHE='default')
+class VisualizationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', password='testpassword')
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp_dir.name, 'tone.wav')
+        sr = 16000
+        sf.write(path, 0.5 * np.sin(2 * np.pi * 220 * np.arange(3 * sr) / sr), sr)
+        self.record = AudioRecord.objects.create(user=self.user, file_path=path, source='upload')
+        self.client.login(username='viewer', password='testpassword')
+    
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+    
+    def _get(self, feature_type, **params):
+        url = reverse('emotion_recognition:audio_visualization', args=[self.record.id, feature_type])
+        return self.client.get(url, params)
+    
+    def test_compact_payloads_are_cached(self):
+        waveform = self._get('waveform', width=200).json()
+        self.assertEqual(len(waveform['min']), 200)
+        self.assertAlmostEqual(max(waveform['max']), 0.5, places=3)
+        with mock.patch.object(audio_processor, 'load_audio', wraps=audio_processor.load_audio) as loader:
+            mel = self._get('mel', width=50)
+            loader.assert_called_once()
+            loader.reset_mock()
+            binary = self._get('mel', width=50, format='binary')
+            loader.assert_not_called()
+        self.assertEqual(mel.json()['shape'], [128, 50])
+        self.assertEqual(binary['X-Shape'], '128,50')
+        self.assertEqual(len(binary.content), 128 * 50)
+
+
+# Exact-comparison tests run in double precision; float32 mode has its own tolerance test
+@override_settings(AUDIO_FEATURE_DTYPE='float64')
+class AudioFeatureTests(SimpleTestCase):
+    def setUp(self):
+        # Two seconds of a harmonic tone with a little noise
+        sr = 22050
+        t = np.arange(2 * sr) / sr
+        rng = np.random.default_rng(0)
+        self.sr = sr
+        self.y = 0.5 * np.sin(2 * np.pi * 220 * t) + 0.01 * rng.standard_normal(len(t))
+    
+    def test_feature_layout_matches_names(self):
+        features = extract_features(self.y, self.sr)
+        self.assertEqual(features.shape, (len(get_feature_names()),))
+        self.assertTrue(np.all(np.isfinite(features)))
+    
+    def test_feature_subset_selects_columns(self):
+        full = extract_features(self.y, self.sr)
+        full_names, full_version = get_feature_names(), feature_set_version()
+        families = ['zcr', 'mfcc', 'rms', 'centroid', 'bandwidth', 'rolloff']
+        with override_settings(AUDIO_FEATURE_FAMILIES=families):
+            subset = extract_features(self.y, self.sr)
+            names = get_feature_names()
+            self.assertNotEqual(feature_set_version(), full_version)
+            # Legacy (untagged) models need the chroma features the subset drops
+            with mock.patch('emotion_recognition.ml_model.MODEL_TAG', None), \
+                    mock.patch.dict('emotion_recognition.ml_model._FEATURE_COLUMNS', clear=True):
+                with self.assertRaises(ValueError):
+                    get_feature_columns()
+        self.assertEqual(len(names), len(full_names) - 2)
+        np.testing.assert_array_equal(subset, full[[full_names.index(name) for name in names]])
+    
+    def test_models_of_another_feature_set_are_refused(self):
+        # Untagged models were trained at the native rate without gating
+        self.assertEqual(check_feature_set(None), get_feature_names())
+        with override_settings(AUDIO_VAD_ENABLED=True):
+            with self.assertRaises(ValueError):
+                check_feature_set(None)
+            self.assertEqual(check_feature_set(feature_tag()), get_feature_names())
+        tag = feature_tag()
+        with override_settings(AUDIO_SAMPLE_RATE=16000):
+            with self.assertRaises(ValueError):
+                check_feature_set(tag)
+    
+    @override_settings(AUDIO_FEATURE_BACKEND='librosa')
+    def test_shared_stft_matches_librosa_calls(self):
+        # The single-STFT engine must reproduce the per-feature librosa calls
+        features = extract_features(self.y, self.sr)
+        mfccs = librosa.feature.mfcc(y=self.y, sr=self.sr, n_mfcc=13)
+        centroid = librosa.feature.spectral_centroid(y=self.y, sr=self.sr)
+        chroma = librosa.feature.chroma_stft(y=self.y, sr=self.sr)
+        names = get_feature_names()
+        # Cached filterbanks and the DCT matrix reorder float sums, hence rtol
+        np.testing.assert_allclose(features[names.index('mfcc1_mean')], np.mean(mfccs[0]), rtol=1e-6)
+        np.testing.assert_allclose(features[names.index('centroid_std')], np.std(centroid), rtol=1e-6)
+        np.testing.assert_allclose(features[names.index('chroma_mean')], np.mean(chroma), rtol=1e-6)
+    
+    def test_numpy_backend_matches_librosa(self):
+        y, sr = resample_to_canonical(self.y, self.sr)
+        with override_settings(AUDIO_FEATURE_BACKEND='librosa'):
+            expected = extract_features(y, sr)
+        with override_settings(AUDIO_FEATURE_BACKEND='numpy'):
+            features = extract_features(y, sr)
+        np.testing.assert_allclose(features, expected, rtol=1e-5, atol=1e-8)
+    
+    def test_float32_mode_within_tolerance(self):
+        y, sr = resample_to_canonical(self.y, self.sr)
+        expected = extract_features(y, sr)
+        with override_settings(AUDIO_FEATURE_DTYPE='float32'):
+            features = extract_features(y, sr)
+        self.assertEqual(features.dtype, np.float32)
+        np.testing.assert_allclose(features, expected, rtol=1e-3, atol=1e-4)
+    
+    @override_settings(AUDIO_VAD_ENABLED=True)
+    def test_vad_drops_silent_frames(self):
+        y, sr = resample_to_canonical(self.y, self.sr)
+        silence = np.zeros(sr // 2)
+        padded = np.concatenate([silence, y, silence])
+        stats = {}
+        frames = compute_speech_frame_features(padded, sr, stats)
+        speech = speech_frame_mask(padded)
+        self.assertEqual(stats['frames'], len(speech))
+        self.assertEqual(stats['frames_dropped'], len(speech) - np.count_nonzero(speech))
+        self.assertGreater(stats['frames_dropped'], 10)
+        # Kept frames are exactly the corresponding frames of the full analysis
+        full = compute_frame_features(padded, sr)
+        for name in ('zcr', 'rms', 'centroid', 'rolloff'):
+            np.testing.assert_allclose(frames[name], full[name][:, speech], rtol=1e-10)
+    
+    def test_batch_matches_single_and_flags_errors(self):
+        short = self.y[:int(1.5 * self.sr)]
+        items = [(self.y, self.sr), '/nonexistent/clip.wav', (short, self.sr)]
+        features, errors = extract_features_batch(items)
+        self.assertEqual(features.shape, (3, len(get_feature_names())))
+        self.assertEqual(errors.tolist(), [False, True, False])
+        self.assertTrue(np.all(np.isnan(features[1])))
+        # Batch items are resampled to the canonical rate first
+        np.testing.assert_allclose(features[0], extract_features(*resample_to_canonical(self.y, self.sr)), rtol=1e-9)
+        np.testing.assert_allclose(features[2], extract_features(*resample_to_canonical(short, self.sr)), rtol=1e-9)
+    
+    @mock.patch('emotion_recognition.audio_processor.get_feature_cache', return_value=None)
+    def test_batch_streams_long_files_like_process_audio_file(self, _):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'clip.wav')
+            sf.write(path, self.y, self.sr)
+            with mock.patch.object(audio_processor, 'STREAMING_THRESHOLD_SECONDS', 1), \
+                    mock.patch('emotion_recognition.audio_processor.load_audio', wraps=audio_processor.load_audio) as load:
+                features, errors = extract_features_batch([path])
+                load.assert_not_called()
+                expected = process_audio_file(path)
+        self.assertFalse(errors[0])
+        np.testing.assert_array_equal(features[0], expected)
+    
+    @override_settings(AUDIO_FEATURE_DTYPE='float64')
+    def test_timeline_windows_match_frame_statistics(self):
+        y, sr = resample_to_canonical(self.y, self.sr)
+        # Stored as float32, so compare against the samples the file holds
+        y = y.astype(np.float32).astype(np.float64)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'clip.wav')
+            sf.write(path, y, sr, subtype='FLOAT')
+            features, segments, voiced = extract_timeline_features(path, window_seconds=0.5, hop_seconds=0.25)
+        self.assertEqual(features.shape, (len(segments), len(get_feature_names())))
+        self.assertTrue(voiced.all())
+        # Each window's statistics equal summarising its slice of the whole-file frames
+        frames = compute_frame_features(y, sr)
+        for (start, end), row in zip(segments[[0, -1]], features[[0, -1]]):
+            window = slice(int(round(start * sr / HOP_LENGTH)), int(round(end * sr / HOP_LENGTH)))
+            expected = summarize_features({name: values[:, window] for name, values in frames.items()})
+            np.testing.assert_allclose(row, expected, rtol=1e-7, atol=1e-10)
+    
+    def test_streaming_matches_in_memory(self):
+        # Amplitude envelope so blocks differ; 0.7 s blocks force several block boundaries
+        y = self.y * np.linspace(0.2, 1.0, len(self.y))
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
+            path = f.name
+        try:
+            sf.write(path, y, self.sr, subtype='FLOAT')
+            streamed = extract_features_streaming(path, block_seconds=0.7)
+        finally:
+            os.unlink(path)
+        expected = extract_features(*resample_to_canonical(y, self.sr))
+        names = get_feature_names()
+        chroma = [names.index('chroma_mean'), names.index('chroma_std')]
+        exact = [i for i in range(len(names)) if i not in chroma]
+        np.testing.assert_allclose(streamed[exact], expected[exact], rtol=1e-5, atol=1e-6)
+        # Chroma tuning is estimated on the first block only
+        np.testing.assert_allclose(streamed[chroma], expected[chroma], rtol=0.05)
+
+
+class FeatureCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = FeatureCache(os.path.join(self.tmp_dir.name, 'features.sqlite3'), max_entries=2)
+    
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+    
+    def test_lru_eviction(self):
+        for i, key in enumerate(['a', 'b']):
+            self.cache.put(key, np.full(3, float(i)))
+        self.cache.get('a')  # 'b' becomes least recently used
+        self.cache.put('c', np.zeros(3))
+        self.assertIsNone(self.cache.get('b'))
+        np.testing.assert_array_equal(self.cache.get('a'), np.zeros(3))
+        self.assertEqual(len(self.cache), 2)
+    
+    def test_process_audio_file_uses_cache(self):
+        sr = 16000
+        y = 0.3 * np.sin(2 * np.pi * 300 * np.arange(sr) / sr)
+        path = os.path.join(self.tmp_dir.name, 'clip.wav')
+        sf.write(path, y, sr)
+        with mock.patch('emotion_recognition.audio_processor.get_feature_cache', return_value=self.cache):
+            first = process_audio_file(path)
+            with mock.patch('emotion_recognition.audio_processor.load_audio') as load_audio:
+                second = process_audio_file(path)
+                load_audio.assert_not_called()
+        np.testing.assert_array_equal(first, second)
+        # Progressive extraction answers from the cache without cutting prefixes
+        with mock.patch('emotion_recognition.audio_processor.get_feature_cache', return_value=self.cache), \
+                mock.patch('emotion_recognition.audio_processor.load_audio') as load_audio:
+            steps = list(audio_processor.extract_features_progressive(path, start_seconds=0.25))
+            load_audio.assert_not_called()
+        self.assertEqual(len(steps), 1)
+        np.testing.assert_array_equal(steps[0][2], first)
+
+
+class WavReaderTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(1)
+        self.stereo = rng.uniform(-0.5, 0.5, size=(4000, 2))
+    
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+    
+    def test_pcm16_matches_soundfile(self):
+        path = os.path.join(self.tmp_dir.name, 'stereo.wav')
+        sf.write(path, self.stereo, 24414, subtype='PCM_16')
+        y, sr = read_wav_mmap(path)
+        expected, _ = sf.read(path)
+        self.assertEqual(sr, 24414)
+        self.assertEqual(y.dtype, np.float32)
+        np.testing.assert_allclose(y, expected.mean(axis=1), atol=1e-6)
+    
+    def test_unsupported_encoding_falls_back(self):
+        path = os.path.join(self.tmp_dir.name, 'pcm24.wav')
+        sf.write(path, self.stereo, 16000, subtype='PCM_24')
+        self.assertIsNone(read_wav_mmap(path))
+    
+    def test_max_frames_reads_a_prefix(self):
+        path = os.path.join(self.tmp_dir.name, 'stereo.wav')
+        sf.write(path, self.stereo, 16000, subtype='PCM_16')
+        full, _ = read_wav_mmap(path)
+        prefix, _ = read_wav_mmap(path, max_frames=1000)
+        np.testing.assert_array_equal(prefix, full[:1000])
+        sf.write(path, self.stereo, 16000, subtype='PCM_24')
+        y, _ = audio_processor.load_audio(path, max_frames=1000)
+        self.assertEqual(len(y), 1000)
+
+
+class PredictionTests(SimpleTestCase):
+    def test_batch_matches_single_predictions(self):
+        features = np.random.default_rng(2).normal(size=(5, len(get_feature_names())))
+        labels, confidences, probabilities = predict_emotion_batch(features)
+        self.assertEqual(probabilities.shape[0], 5)
+        for row, label, confidence in zip(features, labels, confidences):
+            emotion, single_confidence, _ = predict_emotion(row)
+            self.assertEqual(label, emotion)
+            self.assertAlmostEqual(confidence, single_confidence)
+    
+    def test_compiled_forest_matches_sklearn(self):
+        model, scaler = ml_model._read_model_pickles()
+        compiled = compile_forest(model, scaler)
+        rng = np.random.default_rng(3)
+        X = rng.normal(size=(200, model.n_features_in_)) * scaler.scale_ + scaler.mean_
+        # Values exactly at, and one step either side of, every folded threshold
+        splits = np.flatnonzero(np.isfinite(compiled.thresholds[np.float64]))[:100]
+        edges = np.tile(scaler.mean_, (3 * len(splits), 1))
+        for k, direction in enumerate((0.0, np.inf, -np.inf)):
+            values = compiled.thresholds[np.float64][splits]
+            if direction:
+                values = np.nextafter(values, direction)
+            edges[k * len(splits) + np.arange(len(splits)), compiled.feature[splits]] = values
+        X = np.vstack([X, edges])
+        # NaNs behave as ml_model's zeroing after the scaler
+        X[rng.random(X.shape) < 0.05] = np.nan
+        for dtype in (np.float32, np.float64):
+            Xd = X.astype(dtype)
+            expected = model.predict_proba(np.nan_to_num(scaler.transform(Xd)))
+            np.testing.assert_array_equal(compiled.predict_proba(Xd), expected)
+    
+    def test_model_artifact_is_mapped_when_current(self):
+        model, scaler = ml_model._read_model_pickles()
+        X = np.random.default_rng(4).normal(size=(20, model.n_features_in_)) * scaler.scale_ + scaler.mean_
+        with tempfile.TemporaryDirectory() as model_dir:
+            artifact = os.path.join(model_dir, 'emotion_model.forest')
+            with override_settings(MODEL_ARTIFACT_MMAP=True), \
+                    mock.patch.object(ml_model, 'MODEL_ARTIFACT_PATH', artifact):
+                ml_model.export_model_artifact()
+                loaded, no_scaler = ml_model._read_model_files()
+                self.assertIsInstance(loaded, CompiledForest)
+                self.assertIsNone(no_scaler)
+                self.assertFalse(loaded.leaf_values.flags.writeable)
+                np.testing.assert_array_equal(loaded.predict_proba(X), model.predict_proba(scaler.transform(X)))
+                # An artifact exported from other pickles is rebuilt, a missing one built
+                with mock.patch.object(ml_model, '_model_source_digest', return_value='other'):
+                    self.assertIsInstance(ml_model._read_model_files()[0], CompiledForest)
+                    self.assertEqual(ml_model.read_artifact_metadata(artifact)['source'], 'other')
+                os.unlink(artifact)
+                self.assertIsInstance(ml_model._read_model_files()[0], CompiledForest)
+                self.assertTrue(os.path.exists(artifact))
+            with override_settings(MODEL_ARTIFACT_MMAP=False), \
+                    mock.patch.object(ml_model, 'MODEL_ARTIFACT_PATH', artifact):
+                self.assertIsNot(type(ml_model._read_model_files()[0]), CompiledForest)
+    
+    @override_settings(PREDICTION_CACHE_ENABLED=True, PREDICTION_CACHE_MAX_ENTRIES=2, MODEL_MICROBATCH=False)
+    def test_prediction_cache_skips_model_until_reload(self):
+        rows = np.random.default_rng(6).normal(size=(3, len(get_feature_names())))
+        with mock.patch.object(prediction_cache, '_CACHE', None), \
+                mock.patch.object(ml_model, '_predict_proba', wraps=ml_model._predict_proba) as model_call:
+            first = predict_emotion(rows[0])
+            # Float noise below the rounding still hits
+            self.assertEqual(predict_emotion(rows[0] + 1e-9), first)
+            self.assertEqual(model_call.call_count, 1)
+            
+            # Only the uncached rows of a batch reach the model
+            predict_emotion_batch(rows[:2])
+            self.assertEqual(len(model_call.call_args.args[2]), 1)
+            predict_emotion(rows[2])
+            stats = prediction_cache.get_prediction_cache().stats()
+            self.assertEqual((stats['hits'], stats['evictions'], stats['entries']), (2, 1, 2))
+            
+            # Installing a model drops every entry
+            with mock.patch.object(ml_model, '_LOAD_STATUS', dict(ml_model._LOAD_STATUS)):
+                ml_model._install_model(*get_model(), ml_model.MODEL_TAG, ml_model.model_files(), ml_model._LOADED_MTIMES)
+            self.assertEqual(len(prediction_cache.get_prediction_cache()), 0)
+    
+    def test_micro_batcher_returns_each_caller_its_row(self):
+        calls = []
+        def predict_batch(X):
+            calls.append(len(X))
+            if len(calls) == 1:
+                # The other callers queue up while the first batch is scored
+                time.sleep(0.05)
+            if np.isinf(X).any():
+                raise ValueError("Input contains infinity")
+            return X * 2
+        batcher = MicroBatcher(predict_batch, max_batch_size=8, max_wait_ms=200)
+        rows = [np.full(3, float(i)) for i in range(8)]
+        rows[5][0] = np.inf
+        results = {}
+        def call(i):
+            try:
+                results[i] = batcher.predict(rows[i], timeout=10)
+            except ValueError as e:
+                results[i] = e
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The failing row is isolated; every other caller gets its own result
+        self.assertIsInstance(results[5], ValueError)
+        for i in range(8):
+            if i != 5:
+                np.testing.assert_array_equal(results[i], rows[i] * 2)
+        self.assertLess(batcher.stats()['batches'], 8)
+        self.assertGreater(max(calls), 1)
+    
+    def test_registry_serves_active_version_and_shadow_scores(self):
+        model, scaler = ml_model._read_model_pickles()
+        X = np.random.default_rng(5).normal(size=(8, model.n_features_in_)) * scaler.scale_ + scaler.mean_
+        with tempfile.TemporaryDirectory() as root:
+            registry = ModelRegistry(root)
+            first = registry.register(model, scaler, metrics={'accuracy': 0.5})
+            second = registry.register(model, scaler)
+            self.assertEqual(registry.versions(), [first, second])
+            self.assertIsNone(registry.active_version())
+            self.assertIn('p99_ms', registry.manifest(first)['latency'])
+            
+            with mock.patch.object(ml_model, 'REGISTRY', registry):
+                self.assertIsNone(ml_model.model_files()['version'])
+                registry.activate(second)
+                files = ml_model.model_files()
+                self.assertEqual(files['version'], second)
+                with override_settings(MODEL_ARTIFACT_MMAP=True):
+                    served, _ = ml_model._read_model_files(files)
+                self.assertIsInstance(served, CompiledForest)
+            with self.assertRaises(ValueError):
+                registry.activate('v9999')
+            
+            shadow = ShadowEvaluator(registry, first, sample_rate=1.0)
+            probabilities = model.predict_proba(scaler.transform(X))
+            shadow.submit(get_feature_names(), X, probabilities, 1.0, 0.5)
+            shadow.join()
+            report = shadow.report()
+            self.assertEqual(report['scored'], len(X))
+            self.assertEqual(report['agreement'], 1.0)
+            self.assertEqual(report['primary_latency']['cpu_mean_ms'], 0.5)
+    
+    def test_early_exit_keeps_full_forest_label(self):
+        model, scaler = ml_model._read_model_pickles()
+        X = np.random.default_rng(8).normal(size=(300, model.n_features_in_)) * 2 * scaler.scale_ + scaler.mean_
+        compiled = compile_forest(model, scaler)
+        full = compiled.predict_proba(X)
+        probabilities, trees = compiled.predict_proba_early_exit(X, chunk_size=10)
+        np.testing.assert_array_equal(np.argmax(probabilities, axis=1), np.argmax(full, axis=1))
+        self.assertLess(trees.mean(), compiled.n_trees)
+        # Rows that needed every tree get the exact probabilities
+        np.testing.assert_array_equal(probabilities[trees == compiled.n_trees], full[trees == compiled.n_trees])
+        _, bounded = compiled.predict_proba_early_exit(X, chunk_size=10, confidence=0.9)
+        self.assertTrue(np.all(bounded <= trees))
+    
+    def test_latency_budget_selects_reduced_variant(self):
+        model, scaler = ml_model._read_model_pickles()
+        X = np.random.default_rng(6).normal(size=(50, model.n_features_in_)) * scaler.scale_ + scaler.mean_
+        compiled = compile_forest(model, scaler)
+        # First 10 trees of sklearn's forest, each cut to depth 4
+        reduced = compiled.reduced(10, 4)
+        self.assertEqual(reduced.n_trees, 10)
+        self.assertEqual(reduced.node_depths().max(), 4)
+        np.testing.assert_array_equal(compiled.reduced().predict_proba(X), compiled.predict_proba(X))
+        
+        with tempfile.TemporaryDirectory() as root:
+            registry = ModelRegistry(root)
+            version = registry.register(model, scaler, metrics={'accuracy': 0.9}, activate=True, variants=[
+                {'n_trees': 10, 'max_depth': 4, 'accuracy': 0.8},
+                {'n_trees': 50, 'accuracy': 0.85},
+            ])
+            manifest = registry.manifest(version)
+            self.assertEqual([variant['name'] for variant in manifest['variants']], ['t10-d4', 't50'])
+            self.assertLess(manifest['variants'][0]['size_bytes'], manifest['size_bytes'])
+            
+            # Pretend only the smallest variant is fast enough
+            manifest['latency']['p99_ms'] = manifest['variants'][1]['p99_ms'] = 10.0
+            manifest['variants'][0]['p99_ms'] = 1.0
+            self.assertEqual(select_variant(manifest, 5.0)['name'], 't10-d4')
+            self.assertIsNone(select_variant(manifest, 20.0))
+            with mock.patch.object(ml_model, 'REGISTRY', registry), \
+                 mock.patch.object(registry, 'manifest', return_value=manifest), \
+                 override_settings(MODEL_LATENCY_BUDGET_MS=5.0, MODEL_ARTIFACT_MMAP=False):
+                files = ml_model.model_files()
+                self.assertEqual(files['variant'], 't10-d4')
+                served, _ = ml_model._read_model_files(files)
+            np.testing.assert_array_equal(served.predict_proba(X), reduced.predict_proba(X))
+    
+    def test_cascade_answers_confident_rows_with_first_stage(self):
+        # Margins 0.8, 0.6, 0.2, 0.0; the first stage is wrong on the third row
+        first = np.array([[0.9, 0.1], [0.2, 0.8], [0.6, 0.4], [0.5, 0.5]])
+        forest = np.array([[0.7, 0.3], [0.3, 0.7], [0.2, 0.8], [0.4, 0.6]])
+        y = np.array([0, 1, 1, 1])
+        threshold, metrics = calibrate_threshold(first, forest, y, np.array([0, 1]), tolerance=0.0)
+        self.assertAlmostEqual(threshold, 0.6)
+        self.assertEqual(metrics['first_stage_rate'], 0.5)
+        self.assertEqual(metrics['cascade_accuracy'], 1.0)
+        
+        model, scaler = ml_model._read_model_pickles()
+        # Labelled by the forest itself, spread wide enough to cover every class
+        X = np.random.default_rng(7).normal(size=(600, model.n_features_in_)) * 2 * scaler.scale_ + scaler.mean_
+        X_scaled = scaler.transform(X)
+        y = model.predict(X_scaled)
+        cascade = train_cascade(X_scaled[:400], y[:400], X_scaled[400:], y[400:],
+                                model.predict_proba(X_scaled[400:]), model.classes_, scaler=scaler, tolerance=0.05)
+        self.assertGreaterEqual(cascade.metrics['cascade_accuracy'], cascade.metrics['forest_accuracy'] - 0.05)
+        with tempfile.TemporaryDirectory() as directory:
+            cascade.save(os.path.join(directory, 'cascade.json'))
+            cascade = Cascade.load(os.path.join(directory, 'cascade.json'))
+        
+        with override_settings(MODEL_CASCADE=True, MODEL_COMPILED_INFERENCE=False):
+            ml_model._CASCADES[model] = cascade
+            served = ml_model._predict_served(model, scaler, X)
+        first = cascade.first_stage.predict_proba(X)
+        confident = top_margin(first) >= cascade.threshold
+        np.testing.assert_allclose(served[confident], first[confident])
+        np.testing.assert_array_equal(served[~confident], model.predict_proba(X_scaled[~confident]))
+        self.assertEqual(cascade.stats()['answered'], confident.sum())
+    
+    @mock.patch('emotion_recognition.audio_processor.get_feature_cache', return_value=None)
+    def test_progressive_prediction_stops_when_stable(self, _):
+        sr = 16000
+        y = 0.5 * np.sin(2 * np.pi * 220 * np.arange(10 * sr) / sr) * np.linspace(0.2, 1.0, 10 * sr)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'clip.wav')
+            sf.write(path, y, sr, subtype='FLOAT')
+            steps = list(audio_processor.extract_features_progressive(path, start_seconds=2.0))
+            # Prefixes of 2, 4 and 8 s, then the whole file
+            self.assertEqual([(seconds, duration) for seconds, duration, _ in steps],
+                             [(2.0, 10.0), (4.0, 10.0), (8.0, 10.0), (10.0, 10.0)])
+            np.testing.assert_allclose(steps[0][2], extract_features(*resample_to_canonical(y[:2 * sr], sr)), rtol=1e-6)
+            
+            stats = {}
+            with override_settings(PROGRESSIVE_STABLE_STEPS=2, PROGRESSIVE_MIN_CONFIDENCE=0.5), \
+                    mock.patch.object(ml_model, 'predict_emotion', return_value=('sad', 0.8, {})):
+                self.assertEqual(ml_model.predict_emotion_progressive(path, stats)[0], 'sad')
+            self.assertEqual(stats, {'audio_seconds': 4.0, 'duration': 10.0, 'steps': 2})
+            # Never confident enough: the whole file is analysed
+            with override_settings(PROGRESSIVE_STABLE_STEPS=2, PROGRESSIVE_MIN_CONFIDENCE=0.5), \
+                    mock.patch.object(ml_model, 'predict_emotion', return_value=('sad', 0.3, {})):
+                ml_model.predict_emotion_progressive(path, stats)
+            self.assertEqual(stats, {'audio_seconds': 10.0, 'duration': 10.0, 'steps': 4})
+    
+    def test_hot_reload_swaps_changed_model_files(self):
+        model, scaler = get_model()
+        with tempfile.TemporaryDirectory() as model_dir:
+            paths = {name: os.path.join(model_dir, name)
+                     for name in ('model.pkl', 'scaler.pkl', 'model.json', 'model.forest')}
+            for name, obj in (('model.pkl', model), ('scaler.pkl', scaler)):
+                with open(paths[name], 'wb') as f:
+                    pickle.dump(obj, f)
+            with mock.patch.multiple(ml_model, MODEL_PATH=paths['model.pkl'], SCALER_PATH=paths['scaler.pkl'],
+                                     MODEL_TAG_PATH=paths['model.json'], MODEL_ARTIFACT_PATH=paths['model.forest'],
+                                     REGISTRY=ModelRegistry(model_dir), MODEL=model, SCALER=scaler, MODEL_TAG=None,
+                                     _LOADED=(model, scaler), _PENDING_MTIMES=None), \
+                    mock.patch.dict(ml_model._LOAD_STATUS, reloads=0):
+                ml_model._LOADED_MTIMES = ml_model._model_file_mtimes()
+                self.assertFalse(ml_model.reload_model_if_changed())
+                
+                # A half-written file is retried on later checks and never replaces the model
+                with open(paths['model.pkl'], 'wb') as f:
+                    f.write(b'not a pickle')
+                self.assertFalse(ml_model.reload_model_if_changed())
+                self.assertFalse(ml_model.reload_model_if_changed())
+                self.assertIs(get_model()[0], model)
+                
+                with open(paths['model.pkl'], 'wb') as f:
+                    pickle.dump(model, f)
+                os.utime(paths['model.pkl'], ns=(0, 10**18))
+                self.assertFalse(ml_model.reload_model_if_changed())
+                self.assertTrue(ml_model.reload_model_if_changed())
+                self.assertIsNot(get_model()[0], model)
+                
+                self.assertEqual(ml_model.model_status()['reloads'], 1)
+                response = self.client.get(reverse('emotion_recognition:readiness'))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['generation'], ml_model._GENERATION)
+
+
+class ProfilingTests(SimpleTestCase):
+    def test_trace_collects_pipeline_stages(self):
+        sr = 16000
+        y = 0.3 * np.sin(2 * np.pi * 300 * np.arange(sr) / sr)
+        with trace() as stages:
+            extract_features(y, sr)
+        names = [entry['stage'] for entry in stages]
+        self.assertIn('stft', names)
+        self.assertIn('feature.mfcc', names)
+    
+    def test_debug_header_adds_timings(self):
+        @traced_view
+        def view(request):
+            with stage('work'):
+                return JsonResponse({'success': True})
+        factory = RequestFactory()
+        plain = json.loads(view(factory.post('/')).content)
+        self.assertNotIn('timings', plain)
+        debug = json.loads(view(factory.post('/', HTTP_X_DEBUG_TIMINGS='1')).content)
+        self.assertEqual([entry['stage'] for entry in debug['timings']['request']], ['work', 'request'])
+        self.assertIn('work', debug['timings']['registry'])
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_url_import_skips_analysis_stack(self):
+        # A fresh interpreter: the test process has already imported everything
+        script = (
+            "import os, sys, django\n"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'speech_emotion_recognition.settings')\n"
+            "import threading\n"
+            "django.setup()\n"
+            "import speech_emotion_recognition.urls\n"
+            "print(sorted(m for m in ('sklearn', 'librosa', 'scipy', 'emotion_recognition.audio_processor') if m in sys.modules))\n"
+            "print([t.name for t in threading.enumerate() if t.name == 'model-watcher'])\n"
+        )
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-c', script], cwd=base_dir, capture_output=True, text=True, check=True)
+        # The project settings preload the model and watch its files, but only serving processes do that
+        self.assertEqual(result.stdout.split(), ['[]', '[]'])
@@ -51,6 +51,11 @@ urlpatterns = [
     path('datasets/<int:dataset_id>/audio/<str:file_name>/', login_required(dataset_views.sample_audio), name='sample_audio'),
     # API endpoints
     path('api/process-audio/', login_required(views.process_audio), name='process_audio'),
+    path('api/process-audio-timeline/', login_required(views.process_audio_timeline), name='process_audio_timeline'),
+    path('api/records/<int:record_id>/visualization/<str:feature_type>/', login_required(views.audio_visualization),
+         name='audio_visualization'),
+    path('api/ready/', views.readiness, name='readiness'),
+    path('api/model-status/', login_required(views.model_diagnostics), name='model_diagnostics'),
     path('api/save-recording/', login_required(views.save_recording), name='save_recording'),
     path('api/analyze-sample/', login_required(dataset_views.analyze_sample), name='analyze_sample'),
 ]
@@ -11,6 +11,16 @@ import logging
 # Configure logging
 logger = logging.getLogger(__name__)
 
+def get_setting(name, default):
+    """
+    Read a Django setting, falling back to default when settings are not
+    configured (standalone scripts such as create_model.py)
+    """
+    try:
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
 def base64_to_wav(base64_data, user_id=None):
     """
     Convert base64 audio data to WAV file
@@ -4,7 +4,7 @@ import uuid
 import logging
 from datetime import datetime
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.urls import reverse
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import logout as auth_logout
@@ -18,8 +18,7 @@ from django.core.files.storage import default_storage
 
 from .forms import SignUpForm, AudioUploadForm
 from .models import AudioRecord, EmotionResult
-from .audio_processor import process_audio_file
-from .ml_model import predict_emotion
+from .profiling import stage, traced_view
 
 logger = logging.getLogger(__name__)
 
@@ -135,8 +134,9 @@ def record_audio(request):
             
             # Process the audio and predict emotion
             try:
-                features = process_audio_file(audio_record.file_path)
-                emotion, confidence, all_predictions = predict_emotion(features)
+                # The DSP and ML stack is imported on the first analysis, not at worker start
+                from .ml_model import analyze_audio_file
+                emotion, confidence, all_predictions = analyze_audio_file(audio_record.file_path)
                 
                 # Save the emotion result
                 emotion_result = EmotionResult.objects.create(
@@ -192,6 +192,7 @@ def profile(request):
 
 @require_POST
 @csrf_exempt
+@traced_view
 def process_audio(request):
     """API endpoint to process uploaded audio files."""
     if request.FILES.get('audio_file'):
@@ -201,22 +202,25 @@ def process_audio(request):
             # Save the uploaded file
             file_name = f"recording_{uuid.uuid4()}.wav"
             file_path = os.path.join('audio_uploads', datetime.now().strftime('%Y/%m/%d'), file_name)
-            saved_path = default_storage.save(file_path, file)
+            with stage('save'):
+                saved_path = default_storage.save(file_path, file)
             full_path = os.path.join(settings.MEDIA_ROOT, saved_path)
             
             # Create audio record in database (set both audio_file and file_path)
-            audio_record = AudioRecord.objects.create(
-                user=request.user,
-                audio_file=saved_path,  # relative path for Django FileField
-                file_path=full_path,    # absolute path for processing
-                source='upload'
-            )
+            with stage('db_write'):
+                audio_record = AudioRecord.objects.create(
+                    user=request.user,
+                    audio_file=saved_path,  # relative path for Django FileField
+                    file_path=full_path,    # absolute path for processing
+                    source='upload'
+                )
             
             # Process the audio file with enhanced error handling
             try:
                 logger.info(f"Starting audio analysis for file: {full_path}")
-                features = process_audio_file(full_path)
-                emotion, confidence, all_predictions = predict_emotion(features)
+                from .ml_model import analyze_audio_file
+                analysis = {}
+                emotion, confidence, all_predictions = analyze_audio_file(full_path, analysis)
                 logger.info(f"Audio analysis complete. Detected emotion: {emotion}, confidence: {confidence:.2f}")
             except Exception as e:
                 logger.error(f"Error during audio analysis: {str(e)}")
@@ -227,12 +231,13 @@ def process_audio(request):
                 }, status=400)
             
             # Save the emotion result
-            emotion_result = EmotionResult.objects.create(
-                audio_record=audio_record,
-                emotion=emotion,
-                confidence=confidence,
-                full_results=all_predictions
-            )
+            with stage('db_write'):
+                emotion_result = EmotionResult.objects.create(
+                    audio_record=audio_record,
+                    emotion=emotion,
+                    confidence=confidence,
+                    full_results=all_predictions
+                )
             
             # Return the result
             return JsonResponse({
@@ -240,6 +245,9 @@ def process_audio(request):
                 'result_id': emotion_result.id,
                 'emotion': emotion,
                 'confidence': confidence,
+                # Audio actually analysed (less than the duration when progressive inference stopped early)
+                'audio_seconds': analysis.get('audio_seconds'),
+                'audio_duration': analysis.get('duration'),
                 'result_url': reverse('emotion_recognition:result', args=[emotion_result.id])
             })
             
@@ -252,8 +260,140 @@ def process_audio(request):
     
     return JsonResponse({'success': False, 'error': 'No audio file provided'}, status=400)
 
+def audio_visualization(request, record_id, feature_type):
+    """API endpoint returning a compact waveform, mel or chroma view of one of the user's recordings."""
+    from .visualization import (
+        DEFAULT_WIDTH, MIN_WIDTH, MAX_WIDTH, VISUALIZATION_TYPES, decode_matrix, get_record_visualization
+    )
+    audio_record = get_object_or_404(AudioRecord, id=record_id, user=request.user)
+    if feature_type not in VISUALIZATION_TYPES:
+        return JsonResponse({'success': False, 'error': f"Unknown visualization type: {feature_type}"}, status=400)
+    try:
+        width = int(request.GET.get('width', DEFAULT_WIDTH))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Width must be an integer'}, status=400)
+    width = min(max(width, MIN_WIDTH), MAX_WIDTH)
+    
+    try:
+        payload = get_record_visualization(audio_record, feature_type, width)
+    except Exception as e:
+        logger.error(f"Error visualizing audio record {record_id}: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    # Spectrograms can also be fetched as raw uint8 bytes (row-major, shape in the headers)
+    if request.GET.get('format') == 'binary' and feature_type != 'waveform':
+        response = HttpResponse(decode_matrix(payload).tobytes(), content_type='application/octet-stream')
+        response['X-Shape'] = ','.join(str(n) for n in payload['shape'])
+        response['X-Range'] = ','.join(str(v) for v in payload['range'])
+        return response
+    return JsonResponse({'success': True, **payload})
+
+# Fields of the model status the unauthenticated readiness probe returns
+READINESS_FIELDS = ('ready', 'generation', 'version')
+
+def readiness(request):
+    """
+    Readiness probe: 200 once a fitted model is loaded, 503 before that (or when loading failed).
+    Only readiness, model generation and version are public; paths, errors
+    and the shadow report are in model_diagnostics and the logs.
+    """
+    from .ml_model import model_status
+    status = model_status()
+    return JsonResponse({field: status[field] for field in READINESS_FIELDS}, status=200 if status['ready'] else 503)
+
+def model_diagnostics(request):
+    """Full model status for signed-in users: load error, file path, caches, cascade and shadow report."""
+    from .ml_model import model_status
+    return JsonResponse(model_status())
+
+# Accepted window and hop lengths (seconds) for timeline analysis
+TIMELINE_MIN_SECONDS = 0.25
+TIMELINE_MAX_SECONDS = 60.0
+
+@require_POST
+@csrf_exempt
+@traced_view
+def process_audio_timeline(request):
+    """API endpoint returning the emotion of overlapping windows of an uploaded file."""
+    if not request.FILES.get('audio_file'):
+        return JsonResponse({'success': False, 'error': 'No audio file provided'}, status=400)
+    
+    from .audio_processor import TIMELINE_WINDOW_SECONDS, TIMELINE_HOP_SECONDS
+    try:
+        window_seconds = float(request.POST.get('window_seconds', TIMELINE_WINDOW_SECONDS))
+        hop_seconds = float(request.POST.get('hop_seconds', TIMELINE_HOP_SECONDS))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Window and hop lengths must be numbers'}, status=400)
+    if not all(TIMELINE_MIN_SECONDS <= value <= TIMELINE_MAX_SECONDS for value in (window_seconds, hop_seconds)):
+        return JsonResponse({
+            'success': False,
+            'error': f"Window and hop lengths must be between {TIMELINE_MIN_SECONDS} and {TIMELINE_MAX_SECONDS} seconds"
+        }, status=400)
+    
+    try:
+        file = request.FILES['audio_file']
+        
+        # Save the uploaded file
+        file_name = f"recording_{uuid.uuid4()}.wav"
+        file_path = os.path.join('audio_uploads', datetime.now().strftime('%Y/%m/%d'), file_name)
+        with stage('save'):
+            saved_path = default_storage.save(file_path, file)
+        full_path = os.path.join(settings.MEDIA_ROOT, saved_path)
+        
+        with stage('db_write'):
+            audio_record = AudioRecord.objects.create(
+                user=request.user,
+                audio_file=saved_path,
+                file_path=full_path,
+                source='upload'
+            )
+        
+        try:
+            logger.info(f"Starting timeline analysis for file: {full_path}")
+            from .audio_processor import extract_timeline_features
+            from .ml_model import predict_emotion_timeline, summarize_timeline
+            features, segments, voiced = extract_timeline_features(full_path, window_seconds, hop_seconds)
+            timeline = predict_emotion_timeline(features, segments, voiced)
+            emotion, confidence, all_predictions = summarize_timeline(timeline)
+            logger.info(f"Timeline analysis complete: {len(timeline)} windows, overall emotion: {emotion}")
+        except Exception as e:
+            logger.error(f"Error during timeline analysis: {str(e)}")
+            logger.exception("Stack trace:")
+            return JsonResponse({
+                'success': False,
+                'error': f"An error occurred during analysis: {str(e)}"
+            }, status=400)
+        
+        # The overall result is stored like a single-label analysis
+        with stage('db_write'):
+            emotion_result = EmotionResult.objects.create(
+                audio_record=audio_record,
+                emotion=emotion,
+                confidence=confidence,
+                full_results=all_predictions
+            )
+        
+        return JsonResponse({
+            'success': True,
+            'result_id': emotion_result.id,
+            'emotion': emotion,
+            'confidence': confidence,
+            'window_seconds': window_seconds,
+            'hop_seconds': hop_seconds,
+            'timeline': timeline,
+            'result_url': reverse('emotion_recognition:result', args=[emotion_result.id])
+        })
+    
+    except Exception as e:
+        logger.error(f"Error processing audio timeline: {str(e)}")
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
 @require_POST
 @csrf_exempt
+@traced_view
 def save_recording(request):
     """API endpoint to save recorded audio from browser."""
     if request.body:
@@ -264,22 +404,25 @@ def save_recording(request):
             # Save the recording
             file_name = f"recording_{uuid.uuid4()}.wav"
             file_path = os.path.join('audio_uploads', datetime.now().strftime('%Y/%m/%d'), file_name)
-            saved_path = default_storage.save(file_path, ContentFile(audio_data))
+            with stage('save'):
+                saved_path = default_storage.save(file_path, ContentFile(audio_data))
             full_path = os.path.join(settings.MEDIA_ROOT, saved_path)
             
             # Create audio record in database (set both audio_file and file_path)
-            audio_record = AudioRecord.objects.create(
-                user=request.user,
-                audio_file=saved_path,  # relative path for Django FileField
-                file_path=full_path,    # absolute path for processing
-                source='record'
-            )
+            with stage('db_write'):
+                audio_record = AudioRecord.objects.create(
+                    user=request.user,
+                    audio_file=saved_path,  # relative path for Django FileField
+                    file_path=full_path,    # absolute path for processing
+                    source='record'
+                )
             
             # Process the audio file with enhanced error handling
             try:
                 logger.info(f"Starting audio analysis for recording: {full_path}")
-                features = process_audio_file(full_path)
-                emotion, confidence, all_predictions = predict_emotion(features)
+                from .ml_model import analyze_audio_file
+                analysis = {}
+                emotion, confidence, all_predictions = analyze_audio_file(full_path, analysis)
                 logger.info(f"Audio analysis complete. Detected emotion: {emotion}, confidence: {confidence:.2f}")
             except Exception as e:
                 logger.error(f"Error during audio analysis: {str(e)}")
@@ -290,12 +433,13 @@ def save_recording(request):
                 }, status=400)
             
             # Save the emotion result
-            emotion_result = EmotionResult.objects.create(
-                audio_record=audio_record,
-                emotion=emotion,
-                confidence=confidence,
-                full_results=all_predictions
-            )
+            with stage('db_write'):
+                emotion_result = EmotionResult.objects.create(
+                    audio_record=audio_record,
+                    emotion=emotion,
+                    confidence=confidence,
+                    full_results=all_predictions
+                )
             
             # Return the result
             return JsonResponse({
@@ -303,6 +447,9 @@ def save_recording(request):
                 'result_id': emotion_result.id,
                 'emotion': emotion,
                 'confidence': confidence,
+                # Audio actually analysed (less than the duration when progressive inference stopped early)
+                'audio_seconds': analysis.get('audio_seconds'),
+                'audio_duration': analysis.get('duration'),
                 'result_url': reverse('emotion_recognition:result', args=[emotion_result.id])
             })
             
@@ -0,0 +1,113 @@
+"""
+Compact visualization payloads for audio records.
+
+Waveforms are reduced to a min/max envelope with one pair per pixel column,
+and spectrograms are pooled to the target width and quantized to uint8 (sent
+base64 encoded in JSON, or as raw bytes). Payloads are cached per audio
+record in the Django cache named by settings.VISUALIZATION_CACHE, so a result
+page never ships the raw signal or recomputes the mel transform.
+"""
+
+import base64
+import logging
+import numpy as np
+
+from .utils import get_setting
+
+logger = logging.getLogger(__name__)
+
+VISUALIZATION_TYPES = ('waveform', 'mel', 'chroma')
+
+# Payload width in pixel columns (override per request within the limits)
+DEFAULT_WIDTH = 800
+MIN_WIDTH = 16
+MAX_WIDTH = 4000
+
+# Mel spectrograms are shown in dB relative to their peak, down to this floor
+MEL_DB_RANGE = 80.0
+
+def waveform_envelope(y, width=DEFAULT_WIDTH):
+    """
+    Min/max envelope of a signal, one pair per pixel column
+
+    Args:
+        y: audio time series
+        width: number of columns (fewer for signals shorter than width samples)
+
+    Returns:
+        Tuple of (mins, maxs) arrays
+    """
+    if len(y) == 0:
+        return np.zeros(0), np.zeros(0)
+    width = max(1, min(width, len(y)))
+    edges = np.linspace(0, len(y), width + 1).astype(np.intp)
+    # reduceat over the bucket starts: every bucket holds at least one sample
+    return np.minimum.reduceat(y, edges[:-1]), np.maximum.reduceat(y, edges[:-1])
+
+def pool_columns(matrix, width=DEFAULT_WIDTH):
+    """Average neighbouring columns of a (rows, frames) matrix down to at most width columns"""
+    if matrix.shape[1] <= width:
+        return matrix
+    edges = np.linspace(0, matrix.shape[1], width + 1).astype(np.intp)
+    counts = np.diff(edges)
+    return np.add.reduceat(matrix, edges[:-1], axis=1) / counts
+
+def quantize(matrix, low, high):
+    """Map values in [low, high] to uint8 (values outside are clipped)"""
+    scaled = (np.asarray(matrix, dtype=np.float64) - low) * (255.0 / (high - low))
+    return np.clip(np.rint(scaled), 0, 255).astype(np.uint8)
+
+def encode_matrix(matrix, low, high, width=DEFAULT_WIDTH):
+    """
+    Quantized, width-limited payload of a (rows, frames) matrix
+
+    Returns:
+        Dictionary with 'shape' [rows, columns], 'range' [low, high] and
+        'data': base64 of the row-major uint8 values (value = low + q / 255 * (high - low))
+    """
+    quantized = quantize(pool_columns(matrix, width), low, high)
+    return {
+        'shape': list(quantized.shape),
+        'range': [float(low), float(high)],
+        'encoding': 'base64',
+        'data': base64.b64encode(np.ascontiguousarray(quantized).tobytes()).decode('ascii'),
+    }
+
+def decode_matrix(payload):
+    """uint8 matrix of a payload built by encode_matrix"""
+    return np.frombuffer(base64.b64decode(payload['data']), dtype=np.uint8).reshape(payload['shape'])
+
+def _get_cache():
+    from django.core.cache import caches
+    return caches[get_setting('VISUALIZATION_CACHE', 'default')]
+
+def get_record_visualization(audio_record, feature_type, width=DEFAULT_WIDTH):
+    """
+    Visualization payload of an audio record, computed once and then served from the cache
+
+    Args:
+        audio_record: AudioRecord whose file is visualized
+        feature_type: one of VISUALIZATION_TYPES
+        width: payload width in pixel columns
+
+    Returns:
+        Payload dictionary, as audio_processor.visualize_audio
+    """
+    if feature_type not in VISUALIZATION_TYPES:
+        raise ValueError(f"Unknown visualization type: {feature_type}")
+
+    # Primary keys can be reused after deletes, the creation time cannot
+    key = f"visualization:{audio_record.pk}:{audio_record.created_at.timestamp():.6f}:{feature_type}:{width}"
+    cache = _get_cache()
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+
+    from .audio_processor import load_audio, resample_to_canonical, visualize_audio
+    y, sr = resample_to_canonical(*load_audio(audio_record.file_path))
+    payload = visualize_audio(y, sr, feature_type, width=width)
+    if 'error' in payload:
+        raise ValueError(payload['error'])
+    cache.set(key, payload, timeout=None)
+    logger.info(f"Cached {feature_type} visualization for audio record {audio_record.pk}")
+    return payload
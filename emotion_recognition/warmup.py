@@ -0,0 +1,69 @@
+"""
+Optional warm-up of the analysis stack.
+
+Views import audio_processor and ml_model on the first analysis request, so
+worker start-up, login and static pages never pay for them. Deployments that
+would rather pay that cost before serving traffic set ANALYSIS_WARMUP = True
+(or MODEL_PRELOAD = True for the model alone); the WSGI and ASGI entry points
+call start_serving() once per process, so management commands, tests and
+scripts that set up Django never load the model or start the file watcher.
+"""
+
+import time
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+def warm_up():
+    """
+    Import the DSP and ML modules, build the DSP caches and load the model
+
+    Returns:
+        Dictionary mapping each warm-up step to its duration in seconds
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    import numpy as np
+    from . import audio_processor, ml_model
+    timings['imports'] = time.perf_counter() - start
+
+    # One second of quiet noise at the canonical rate builds the filterbanks
+    # (and JIT-compiles librosa's kernels when that backend is selected)
+    start = time.perf_counter()
+    sr = audio_processor.canonical_sample_rate() or 22050
+    audio_processor.extract_features(np.random.default_rng(0).uniform(-0.1, 0.1, sr), sr)
+    timings['features'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ml_model.warm_up_model()
+    timings['model'] = time.perf_counter() - start
+
+    logger.info("Analysis warm-up finished: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items()))
+    return timings
+
+def start_serving():
+    """
+    Start-up of a serving process, called by wsgi.py and asgi.py once the
+    application is built: the warm-up or model preload the settings ask
+    for, and the model file watcher when MODEL_RELOAD_INTERVAL is set
+    """
+    if getattr(settings, 'ANALYSIS_WARMUP', False):
+        try:
+            warm_up()
+        except Exception:
+            # A failed warm-up only costs latency: the first analysis imports it again
+            logger.exception("Analysis warm-up failed")
+    elif getattr(settings, 'MODEL_PRELOAD', False):
+        from .ml_model import warm_up_model
+        try:
+            warm_up_model()
+        except Exception:
+            logger.exception("Model preload failed")
+
+    interval = getattr(settings, 'MODEL_RELOAD_INTERVAL', None)
+    if interval:
+        from .ml_model import start_model_watcher
+        start_model_watcher(interval)
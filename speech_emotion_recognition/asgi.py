@@ -9,3 +9,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'speech_emotion_recognition.settings')
 
 application = get_asgi_application()
+
+# Serving processes only: model preload and the model file watcher
+from emotion_recognition.warmup import start_serving  # noqa: E402
+start_serving()
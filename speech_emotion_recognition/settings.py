@@ -120,6 +120,129 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 # Model directory
 MODEL_DIR = os.path.join(BASE_DIR, 'model')
 
+# Persistent feature cache (content-addressed, LRU-bounded SQLite file)
+FEATURE_CACHE_ENABLED = True
+FEATURE_CACHE_PATH = os.path.join(BASE_DIR, 'cache', 'features.sqlite3')
+FEATURE_CACHE_MAX_ENTRIES = 20000
+
+# Visualization payloads are cached per audio record in a file-based cache
+# shared by all workers (see emotion_recognition/visualization.py)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'visualizations': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'visualizations'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+VISUALIZATION_CACHE = 'visualizations'
+
+# Audio front end: every signal is resampled to this rate before feature
+# extraction (None keeps the native rate). Native: the bundled model was
+# trained on native-rate features; set 16000 together with a model retrained
+# at that rate
+AUDIO_SAMPLE_RATE = None
+
+# DSP backend for feature extraction: 'librosa', or 'numpy' for the NumPy-only
+# implementation (same features within float rounding, no librosa import)
+AUDIO_FEATURE_BACKEND = 'numpy'
+
+# Precision of the audio and feature pipeline: 'float32' halves memory traffic,
+# features stay within the tolerance documented in audio_processor.feature_dtype
+AUDIO_FEATURE_DTYPE = 'float32'
+
+# Drop silent frames (leading/trailing silence, zero padding) before feature
+# extraction; thresholds are the VAD_* constants in audio_processor. Off: the
+# bundled model was trained on ungated features; enable it together with a
+# model trained with VAD
+AUDIO_VAD_ENABLED = False
+
+# Feature families to extract (see emotion_recognition/feature_registry.py);
+# None extracts all of them. Subsets (e.g. without 'chroma') need a model
+# trained on that subset: the model tag lists the features it was trained on
+AUDIO_FEATURE_FAMILIES = None
+
+# Import the analysis stack and load the model when a serving process starts
+# instead of on the first analysis request (see emotion_recognition/warmup.py)
+ANALYSIS_WARMUP = False
+
+# Load and warm the model (only) when a serving process starts (wsgi.py and
+# asgi.py call emotion_recognition.warmup.start_serving), so the first analysis
+# after a worker start does not unpickle it; implied by ANALYSIS_WARMUP
+MODEL_PRELOAD = True
+
+# Seconds between checks of the model files in serving processes; changed files
+# are loaded and swapped in without a restart (None disables the watcher)
+MODEL_RELOAD_INTERVAL = 10
+
+# Record per-stage wall/CPU timings of the analysis pipeline; analysis views add
+# them to their JSON when the request carries an X-Debug-Timings: 1 header
+PROFILING_ENABLED = True
+
+# Predict with the flat-array compilation of the RandomForest and scaler
+# (emotion_recognition/compiled_forest.py): same probabilities, a fraction of
+# sklearn's per-call overhead
+MODEL_COMPILED_INFERENCE = True
+
+# Serve the model from the memory-mapped artifact model/emotion_model.forest
+# (written by create_model.py or `manage.py export_model_artifact` at deploy
+# time, else built from the pickles on the first load; not committed): workers
+# share its pages instead of each unpickling the model, and never import sklearn
+MODEL_ARTIFACT_MMAP = True
+
+# Registry version (see `manage.py model_registry list`) scoring this share of
+# live predictions in a background thread, reported by api/ready/ for
+# comparison before promotion; None disables shadow evaluation
+MODEL_SHADOW_VERSION = None
+MODEL_SHADOW_SAMPLE_RATE = 0.1
+
+# p99 single-row latency budget (ms): serve the most accurate reduced variant
+# of the active registry version that meets it (versions trained with
+# `create_model.py --variants`); None always serves the full forest
+MODEL_LATENCY_BUDGET_MS = 5.0
+
+# Answer confident requests with the linear first stage trained alongside the
+# forest (cascade.json of the served version), the others with the forest
+MODEL_CASCADE = True
+
+# Stop evaluating the compiled forest for a row once the remaining trees
+# cannot change its top class (checked every CHUNK trees). The label always
+# matches the full forest; probabilities are the mean of the trees evaluated.
+# CONFIDENCE (e.g. 0.99) stops sooner on a statistical bound instead, giving
+# up that guarantee; None keeps the exact rule. Off: the bundled forest's
+# trees disagree too often for the exact rule to stop before ~190 of 200
+# trees, which does not pay for the extra chunked passes
+# (`python emotion_recognition/benchmark.py early_exit`)
+MODEL_EARLY_EXIT = False
+MODEL_EARLY_EXIT_CHUNK = 25
+MODEL_EARLY_EXIT_CONFIDENCE = None
+
+# Analyse uploads from growing prefixes (START_SECONDS, doubled every step)
+# and stop once STABLE_STEPS predictions agree with at least MIN_CONFIDENCE;
+# the API responses report the audio analysed. Off: the bundled model rarely
+# reaches the confidence, so most uploads pay for the prefixes and the whole
+# file (`python emotion_recognition/benchmark.py progressive`)
+PROGRESSIVE_INFERENCE = False
+PROGRESSIVE_START_SECONDS = 2.0
+PROGRESSIVE_STABLE_STEPS = 3
+PROGRESSIVE_MIN_CONFIDENCE = 0.3
+
+# Batch predict_emotion calls of concurrent request threads into one model
+# call, flushed at MAX_SIZE rows or MAX_WAIT_MS after the first row (the
+# latency a lone request pays); see emotion_recognition/batching.py
+MODEL_MICROBATCH = True
+MODEL_MICROBATCH_MAX_SIZE = 32
+MODEL_MICROBATCH_MAX_WAIT_MS = 2.0
+
+# Cache class probabilities per feature vector (rounded to DECIMALS) in each
+# process, so re-analysed samples and re-uploaded clips skip the model; the
+# cache is cleared whenever a model is (re)loaded
+PREDICTION_CACHE_ENABLED = True
+PREDICTION_CACHE_MAX_ENTRIES = 4096
+PREDICTION_CACHE_DECIMALS = 6
+
 # ---
 # IMPORTANT: To send email from Gmail, you MUST use an App Password, not your main password.
 # 1. Go to https://myaccount.google.com/security > App Passwords.